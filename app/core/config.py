@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Optional
 
 from pydantic import Field, field_validator
 from pydantic_settings import BaseSettings
@@ -19,6 +20,247 @@ class Settings(BaseSettings):
         ..., description="Cloudinary Folder, where media is stored"
     )
 
+    # LLM client settings (optional, with defaults)
+    LLM_MAX_CONNECTIONS: int = Field(
+        default=20, description="Pooled keep-alive connections to the LLM API"
+    )
+    LLM_KEEPALIVE_SECONDS: float = Field(
+        default=120.0, description="How long idle LLM connections are kept open"
+    )
+    LLM_CONNECT_TIMEOUT_SECONDS: float = Field(
+        default=10.0, description="Timeout for opening a connection to the LLM API"
+    )
+    LLM_TIMEOUT_SECONDS: float = Field(
+        default=300.0, description="Read/write timeout for LLM API calls"
+    )
+    LLM_WARMUP: bool = Field(
+        default=True, description="Open an LLM API connection at worker startup"
+    )
+    LLM_MAX_TOKENS: Optional[int] = Field(
+        default=8192, description="Cap on tokens per generation, reasoning included"
+    )
+    LLM_STOP_SEQUENCES: Optional[list[str]] = Field(
+        default=None,
+        description="Stop sequences; unset derives them from the scaffold, [] disables",
+    )
+    LLM_REASONING_EFFORT: Optional[str] = Field(
+        default=None, description="Provider reasoning effort: 'low', 'medium', 'high'"
+    )
+    LLM_REASONING_MAX_TOKENS: Optional[int] = Field(
+        default=None, description="Provider cap on reasoning tokens"
+    )
+    LLM_REASONING_EXCLUDE: bool = Field(
+        default=False, description="Ask the provider to leave reasoning out"
+    )
+
+    # Retrieval settings (optional, with defaults)
+    EMBEDDING_PROVIDER: str = Field(
+        default="gemini",
+        description="'gemini', 'hashing', 'sentence-transformers' or 'onnx'",
+    )
+    EMBEDDING_MODEL: str = Field(
+        default="models/embedding-001", description="Gemini embedding model id"
+    )
+    LOCAL_EMBEDDING_MODEL: str = Field(
+        default="sentence-transformers/all-MiniLM-L6-v2",
+        description="Model for the sentence-transformers/onnx providers",
+    )
+    HASHING_EMBEDDING_DIM: int = Field(
+        default=1024, description="Dimension of the hashed TF-IDF provider"
+    )
+    EMBEDDING_BATCH_SIZE: int = Field(
+        default=100, description="Texts per batched embedding request"
+    )
+    EMBEDDING_ASYNC_MODE: str = Field(
+        default="http",
+        description="Request-path embedding: 'http' (async client) or 'thread'",
+    )
+    EMBEDDING_TIMEOUT_SECONDS: float = Field(
+        default=10.0, description="Timeout for one query embedding call"
+    )
+    EMBEDDING_MAX_CONNECTIONS: int = Field(
+        default=20, description="Pooled connections to the embedding API"
+    )
+    EMBEDDING_THREADS: int = Field(
+        default=4, description="Threads for offloaded embedding calls"
+    )
+    VECTOR_STORE_BACKEND: str = Field(
+        default="numpy",
+        description="Retrieval backend: 'numpy', 'quantized' or 'faiss'",
+    )
+    FAISS_NPROBE: int | None = Field(
+        default=None, description="IVF lists probed per FAISS query"
+    )
+    FAISS_EF_SEARCH: int | None = Field(
+        default=None, description="HNSW efSearch for FAISS queries"
+    )
+    QUANTIZED_DTYPE: str = Field(
+        default="int8", description="Code type of the quantized backend: int8/float16"
+    )
+    QUANTIZED_PCA_DIM: int | None = Field(
+        default=None, description="PCA dimensions kept by the quantized backend"
+    )
+    QUANTIZED_RERANK_FACTOR: int = Field(
+        default=4, description="Shortlist size per result for exact re-ranking"
+    )
+    SHARED_CORPUS_DIR: str | None = Field(
+        default="/dev/shm/manimato-corpus",
+        description="Shared-memory dir for the corpus segment; empty disables it",
+    )
+    QUERY_CACHE_SIZE: int = Field(
+        default=4096, description="Max cached query embeddings per worker"
+    )
+    QUERY_CACHE_TTL_SECONDS: float = Field(
+        default=86400, description="Lifetime of a cached query embedding"
+    )
+    QUERY_CACHE_PATH: str | None = Field(
+        default=None, description="File to persist query embeddings to (optional)"
+    )
+    STREAM_QUEUE_SIZE: int = Field(
+        default=256, description="LLM tokens buffered per stream before backpressure"
+    )
+    SSE_COALESCE_MS: float = Field(
+        default=20.0,
+        description="Window for merging code chunks into one SSE frame (0 disables)",
+    )
+    SSE_COALESCE_BYTES: int = Field(
+        default=512, description="Merged code chunk size that flushes a frame early"
+    )
+    STREAM_REPLAY_MAX_STREAM_BYTES: int = Field(
+        default=512 * 1024, description="Replay buffer cap per code stream"
+    )
+    STREAM_REPLAY_MAX_TOTAL_BYTES: int = Field(
+        default=32 * 1024 * 1024, description="Replay buffer cap per worker"
+    )
+    STREAM_REPLAY_TTL_SECONDS: float = Field(
+        default=120.0, description="How long finished streams stay resumable"
+    )
+    STREAM_RESUME_GRACE_SECONDS: float = Field(
+        default=30.0,
+        description="How long a generation runs on with no client attached",
+    )
+    CODE_VALIDATION_ENABLED: bool = Field(
+        default=True,
+        description="Abort code streams as soon as they break the template rules",
+    )
+    CODE_ALLOWED_IMPORTS: list[str] = Field(
+        default=["manim", "math"], description="Modules generated code may import"
+    )
+    LLM_CASCADE_MODELS: list[str] = Field(
+        default=[],
+        description="Faster models tried, in order, before OPENAI_LLM",
+    )
+    LLM_CASCADE_DRY_RUN: bool = Field(
+        default=False,
+        description="Also dry-run cascade code with manim before accepting it",
+    )
+    LLM_CASCADE_DRY_RUN_TIMEOUT_SECONDS: float = Field(
+        default=30.0, description="Time limit of a cascade dry run"
+    )
+    PARALLEL_CANDIDATES: list[str] = Field(
+        default=[],
+        description=(
+            "Candidates raced per prompt, as model or model@temperature; "
+            "empty disables racing"
+        ),
+    )
+    PARALLEL_CANDIDATES_DRY_RUN: bool = Field(
+        default=True, description="Dry-run candidates with manim before a win"
+    )
+    PARALLEL_CANDIDATES_DRY_RUN_TIMEOUT_SECONDS: float = Field(
+        default=30.0, description="Time limit of a candidate dry run"
+    )
+    PARALLEL_CANDIDATES_MAX_CONCURRENCY: int = Field(
+        default=16, description="Candidate LLM calls in flight per worker"
+    )
+    EDIT_MODE_ENABLED: bool = Field(
+        default=False,
+        description="Follow-up messages patch the chat's latest code",
+    )
+    EDIT_MODE_TIMEOUT_SECONDS: float = Field(
+        default=60.0,
+        description="Time allowed for a patch before regenerating instead",
+    )
+    RENDER_REPAIR_MAX_ATTEMPTS: int = Field(
+        default=2,
+        description="LLM repairs of a script manim rejects; 0 disables repair",
+    )
+    RENDER_REPAIR_DEADLINE_SECONDS: float = Field(
+        default=180.0,
+        description="Time allowed for repairs after the first render fails",
+    )
+    SINGLE_FLIGHT_ENABLED: bool = Field(
+        default=True,
+        description="Identical concurrent generations share one LLM call",
+    )
+    RESPONSE_CACHE_ENABLED: bool = Field(
+        default=True, description="Serve repeated prompts from a code cache"
+    )
+    RESPONSE_CACHE_SIZE: int = Field(
+        default=1024, description="Max cached generations per worker"
+    )
+    RESPONSE_CACHE_TTL_SECONDS: float = Field(
+        default=86400, description="Lifetime of a cached generation"
+    )
+    RESPONSE_CACHE_SEMANTIC_THRESHOLD: float | None = Field(
+        default=None,
+        description=(
+            "Prompt similarity for a semantic cache hit, e.g. 0.97; unset keeps "
+            "exact matches only"
+        ),
+    )
+    RETRIEVAL_MODE: str = Field(
+        default="hybrid",
+        description="Retrieval: 'hybrid' (vector + BM25), 'vector' or 'lexical'",
+    )
+    RETRIEVAL_EMBED_TIMEOUT_SECONDS: float = Field(
+        default=1.5,
+        description="Query embedding budget before falling back to BM25 retrieval",
+    )
+    RETRIEVAL_RRF_K: int = Field(
+        default=60, description="Rank constant for reciprocal rank fusion"
+    )
+    RETRIEVAL_LATENCY_BUDGET_SECONDS: float = Field(
+        default=2.0,
+        description="Deadline for the whole retrieval step, embedding included",
+    )
+    DOCS_CORPUS_ENABLED: bool = Field(
+        default=True, description="Also retrieve from the Manim documentation corpus"
+    )
+    DOCS_MAX_RESULTS: int = Field(
+        default=2, description="Maximum documentation snippets packed into the prompt"
+    )
+    CORPUS_RELOAD_POLL_SECONDS: float = Field(
+        default=5.0,
+        description="How often workers check for reloads triggered elsewhere (0 = off)",
+    )
+    CORPUS_GROWTH_ENABLED: bool = Field(
+        default=True,
+        description="Append successfully rendered generations to the examples",
+    )
+    CORPUS_GROWTH_MAX_ENTRIES: int = Field(
+        default=2000, description="Cap on generated examples; least used are evicted"
+    )
+    CORPUS_GROWTH_BATCH_SIZE: int = Field(
+        default=16, description="Generated examples embedded per batch"
+    )
+    CORPUS_GROWTH_FLUSH_SECONDS: float = Field(
+        default=30.0, description="Longest wait for a batch of generated examples"
+    )
+    CONTEXT_TOKEN_BUDGET: int = Field(
+        default=1500, description="Maximum prompt tokens spent on retrieved examples"
+    )
+    CONTEXT_MAX_EXAMPLES: int = Field(
+        default=4, description="Maximum number of examples packed into the prompt"
+    )
+    CONTEXT_DEDUP_THRESHOLD: float = Field(
+        default=0.85,
+        description="Shingle similarity above which an example counts as a duplicate",
+    )
+    CONTEXT_TOKENIZER: str = Field(
+        default="cl100k_base", description="tiktoken encoding used to count tokens"
+    )
+
     # Fixed project paths - these are computed properties, not from env vars
     @property
     def PROJECT_ROOT(self) -> Path:
@@ -32,6 +274,38 @@ class Settings(BaseSettings):
     def MEDIA_DIR(self) -> Path:
         return self.PROJECT_ROOT / "media"
 
+    @property
+    def INDEX_MAPPING_PATH(self) -> Path:
+        return self.PROJECT_ROOT / "cleaned_index_mapping.json"
+
+    @property
+    def EMBEDDING_INDEX_DIR(self) -> Path:
+        return self.PROJECT_ROOT / "embedding_index"
+
+    @property
+    def FAISS_INDEX_PATH(self) -> Path:
+        return self.PROJECT_ROOT / "cleaned_manim_faiss.index"
+
+    @property
+    def CORPUS_RELOAD_MARKER_PATH(self) -> Path:
+        return self.EMBEDDING_INDEX_DIR / "reload.json"
+
+    @property
+    def GENERATED_EXAMPLES_PATH(self) -> Path:
+        return self.EMBEDDING_INDEX_DIR / "generated_examples.jsonl"
+
+    @property
+    def DOCS_MAPPING_PATH(self) -> Path:
+        return self.PROJECT_ROOT / "cleaned_manim_doc_mapping.json"
+
+    @property
+    def DOCS_EMBEDDING_INDEX_DIR(self) -> Path:
+        return self.EMBEDDING_INDEX_DIR / "docs"
+
+    @property
+    def DOCS_FAISS_INDEX_PATH(self) -> Path:
+        return self.PROJECT_ROOT / "cleaned_manim_doc_faiss.index"
+
     @field_validator(
         "DATABASE_URL",
         "PYTHONPATH",
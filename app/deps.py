@@ -2,8 +2,11 @@
 
 from functools import lru_cache
 
+from core.config import config
+
 # from app.services.chat_service import ChatService
 from app.services.chain_manager import ChainManager
+from app.services.stream_replay import StreamReplayRegistry
 
 # @lru_cache()
 # def get_chat_service() -> ChatService:
@@ -15,3 +18,14 @@ from app.services.chain_manager import ChainManager
 def get_chain_manager() -> ChainManager:
     """Get chain manager instance."""
     return ChainManager()
+
+
+@lru_cache()
+def get_stream_replay() -> StreamReplayRegistry:
+    """Get the per-process replay buffers of code streams."""
+    return StreamReplayRegistry(
+        max_stream_bytes=config.STREAM_REPLAY_MAX_STREAM_BYTES,
+        max_total_bytes=config.STREAM_REPLAY_MAX_TOTAL_BYTES,
+        ttl_seconds=config.STREAM_REPLAY_TTL_SECONDS,
+        grace_seconds=config.STREAM_RESUME_GRACE_SECONDS,
+    )
@@ -1,4 +1,5 @@
 import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from core.config import config
@@ -6,9 +7,11 @@ from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 
+from app.deps import get_chain_manager
 from app.middlewares.cors import add_cors_middleware
 from app.middlewares.request_logger import add_request_logger_middleware
 from app.routers.v1.router import router as v1_router
+from app.utils.loop_monitor import loop_monitor
 
 env_path = Path(__file__).parent.parent / ".env"
 load_dotenv(env_path, override=True)
@@ -20,10 +23,21 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start per-worker background services and release them on shutdown"""
+    loop_monitor.start()
+    get_chain_manager().start_background_tasks()
+    yield
+    await loop_monitor.stop()
+    await get_chain_manager().aclose()
+
+
 app = FastAPI(
     title="Manim Code Generator API",
     description="API for generating Manim animations from natural language prompts",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Add CORS middleware
@@ -9,4 +9,6 @@ def add_cors_middleware(app):
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        # Let browser clients read which corpus version served a response
+        expose_headers=["X-Corpus-Version"],
     )
@@ -0,0 +1,34 @@
+"""Administrative operations on the running service."""
+
+from fastapi import APIRouter, Depends, status
+from fastapi.responses import JSONResponse
+
+from app.deps import get_chain_manager
+from app.routers.v1.auth.signin import require_admin
+from app.services.chain_manager import ChainManager
+
+router = APIRouter(
+    prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)]
+)
+
+
+@router.get("/corpus")
+async def get_corpus_status(chain_manager: ChainManager = Depends(get_chain_manager)):
+    """Active corpus version and reload state of this worker"""
+    return chain_manager.reload_status()
+
+
+@router.post("/corpus/reload")
+async def reload_corpus(chain_manager: ChainManager = Depends(get_chain_manager)):
+    """
+    Rebuild the RAG corpus from the mapping file in the background and swap it
+    in when ready. Other workers follow within CORPUS_RELOAD_POLL_SECONDS.
+    """
+    started = chain_manager.reload_corpus()
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={
+            "status": "started" if started else "already_running",
+            **chain_manager.reload_status(),
+        },
+    )
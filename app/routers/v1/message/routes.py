@@ -1,28 +1,35 @@
-import json
 import logging
-from typing import AsyncGenerator
+from contextlib import aclosing
+from typing import AsyncGenerator, Optional
 
-from database.session import get_db
-from fastapi import APIRouter, Depends, HTTPException
+from core.config import config
+from database.session import SessionLocal, get_db
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
 from fastapi.responses import StreamingResponse
 from services.cloud_service import CloudStorage
 from sqlalchemy.orm import Session
 
+from app.deps import get_chain_manager, get_stream_replay
 from app.schemas.stream import MessageResponse, PromptRequest, StreamEvent
-from app.services.chain_manager import ChainManager
 from app.services.message_service import MessageService
+from app.services.retrieval import CorpusSnapshot
+from app.services.stream_replay import ResumeError
 from app.services.stream_service import StreamService
+from app.utils.disconnect import until_disconnected
+from app.utils.sse import coalesce_code_chunks
 
 logger = logging.getLogger(__name__)
 
 
 router = APIRouter(prefix="/messages", tags=["messages"])
 
-chain_manager = ChainManager()
+# Shared with the dependency-injected routes so each process embeds once
+chain_manager = get_chain_manager()
 message_service = MessageService()
 # TODO: implement this
 cloud_storage = CloudStorage("cloudinary")
 stream_service = StreamService(chain_manager, cloud_storage)
+stream_replay = get_stream_replay()
 
 
 @router.post("/create", response_model=MessageResponse)
@@ -38,39 +45,81 @@ async def create_message(request: PromptRequest, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail="Failed to create message")
 
 
-@router.post("/{message_id}/stream-code")
-async def stream_ai_response(message_id: int, db: Session = Depends(get_db)):
-    """Stream AI response for a message"""
+async def _generate_events(
+    message_id: int, prompt_text: str, snapshot: CorpusSnapshot
+) -> AsyncGenerator[StreamEvent, None]:
+    """A message's generation, independent of any one client connection"""
+    # The request's session closes with its response, which this may outlive
+    db = SessionLocal()
+    try:
+        events = stream_service.process_message_stream(
+            message_id, prompt_text, db, snapshot
+        )
+        # Merge per-token chunks into fewer, larger frames
+        merged = coalesce_code_chunks(
+            events, config.SSE_COALESCE_MS / 1000, config.SSE_COALESCE_BYTES
+        )
+        async with aclosing(events), aclosing(merged):
+            async for event in merged:
+                if event.type in ["completed", "error"]:
+                    logger.info(f"message {message_id}-{event.type}:{event.data}")
+                yield event
+    finally:
+        db.close()
 
+
+@router.post("/{message_id}/stream-code")
+async def stream_ai_response(
+    message_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    last_event_id: Optional[int] = Header(default=None, alias="Last-Event-ID"),
+):
+    """
+    Stream AI response for a message.
+
+    With ``Last-Event-ID``, the message's generation (in progress or
+    recently finished) continues after that frame; 409 means the frames
+    after it are gone. Without the header, a generation still in progress
+    is attached to from its first frame if that is still buffered; in any
+    other case the message is generated anew.
+    """
     try:
-        message = message_service.get_message_with_prompt(db, message_id)
-        prompt_text = message.prompt.content
-
-        logger.info(f"Starting stream for message {message_id}")
-
-        async def event_stream() -> AsyncGenerator[str, None]:
-            try:
-                async for event in stream_service.process_message_stream(
-                    message_id, prompt_text, db
-                ):
-                    event_data = event.model_dump()
-                    yield f"data: {json.dumps(event_data)}\n\n"
-
-                    if event.type in ["completed", "error"]:
-                        logger.info(f"message {message_id}-{event.type}:{event.data}")
-            except Exception as e:
-                logger.error(f"Stream error for message {message_id}:{str(e)}")
-                error_event = StreamEvent(
-                    type="error", data="Internal Server Error", message_id=message_id
-                ).model_dump()
-                yield f"data: {json.dumps(error_event)}\n\n"
+        replay = stream_replay.attach(message_id, last_event_id)
+    except ResumeError:
+        raise HTTPException(status_code=409, detail="Stream can no longer be resumed")
+    after_id = last_event_id or 0
 
+    try:
+        if replay is None:
+            message = message_service.get_message_with_prompt(db, message_id)
+            prompt_text = message.prompt.content
+
+            # Pin the corpus now so the reported version is the one used even
+            # if a reload swaps corpora while the response streams
+            snapshot = chain_manager.snapshot
+            logger.info(
+                f"Starting stream for message {message_id} "
+                f"(corpus {snapshot.corpus_version})"
+            )
+            replay = stream_replay.start(
+                message_id,
+                _generate_events(message_id, prompt_text, snapshot),
+                snapshot.corpus_version,
+            )
+        else:
+            logger.info(f"Resuming stream for message {message_id} after {after_id}")
+
+        # Generation continues without this client for a grace period, so a
+        # reconnect can resume it; after that it is cancelled
+        frames = until_disconnected(request, stream_replay.subscribe(replay, after_id))
         return StreamingResponse(
-            event_stream(),
+            frames,
             media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
                 "Connection": "keep-alive",
+                "X-Corpus-Version": replay.corpus_version or "",
             },
         )
 
@@ -0,0 +1,24 @@
+"""Per-worker service metrics."""
+
+import os
+
+from fastapi import APIRouter, Depends
+
+from app.deps import get_chain_manager, get_stream_replay
+from app.services.chain_manager import ChainManager
+from app.utils.loop_monitor import loop_monitor
+from app.utils.memory import get_memory_usage
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("")
+async def get_metrics(chain_manager: ChainManager = Depends(get_chain_manager)):
+    """Return metrics for the worker process that served this request"""
+    return {
+        "pid": os.getpid(),
+        "memory": get_memory_usage(),
+        "event_loop": loop_monitor.snapshot(),
+        **chain_manager.get_metrics(),
+        "stream_replay": get_stream_replay().stats(),
+    }
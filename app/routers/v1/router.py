@@ -1,8 +1,10 @@
 from fastapi import APIRouter
 
+from app.routers.v1.admin import routes as admin_routes
 from app.routers.v1.auth import signin as signin_routes
 from app.routers.v1.auth import signup as signup_routes
 from app.routers.v1.message import routes as message_router
+from app.routers.v1.metrics import routes as metrics_routes
 from app.routers.v1.videos import routes as video_routes
 
 router = APIRouter(prefix="/v1")
@@ -11,3 +13,5 @@ router.include_router(video_routes.router)
 router.include_router(signin_routes.router, tags=["auth"])
 router.include_router(signup_routes.router, tags=["auth"])
 router.include_router(message_router.router)
+router.include_router(metrics_routes.router)
+router.include_router(admin_routes.router)
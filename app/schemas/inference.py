@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseModel
 
 
@@ -7,6 +9,12 @@ class InferenceRequest(BaseModel):
 
 class InferenceResponse(BaseModel):
     result: str
+    prompt_tokens: Optional[int] = None
+    corpus_version: Optional[str] = None
+    # Cascade tier that generated the code; None when served from the cache
+    model: Optional[str] = None
+    # "exact" or "semantic" when served from the response cache
+    cache: Optional[str] = None
 
 
 # Removed redundant Prompt model since InferenceRequest is used instead.
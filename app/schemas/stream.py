@@ -18,6 +18,8 @@ class StreamEvent(BaseModel):
     ]
     data: Optional[str] = None
     message_id: Optional[int] = None
+    # Position in the message's stream, for resuming with Last-Event-ID
+    id: Optional[int] = None
 
     class Config:
         json_encoders = {
@@ -66,6 +68,9 @@ class ErrorMessages:
     INVALID_INPUT = (
         "I'm having trouble understanding your request. Please try rephrasing."
     )
+    INVALID_CODE = (
+        "The generated animation code was invalid and was discarded. Please try again."
+    )
     SYSTEM_ERROR = (
         "I'm currently unable to process your request. Please try again later."
     )
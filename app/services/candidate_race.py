@@ -0,0 +1,203 @@
+"""
+Parallel candidate generation.
+
+For latency-sensitive deployments, a prompt goes to several candidate
+slots at once, each a model and optionally a temperature. The first
+candidate whose code passes validation and a manim dry run wins; the
+others are cancelled right away, which closes their connections and stops
+their billing. More tokens are spent per prompt, but a bad answer no
+longer costs a full retry.
+
+All races in a worker share a budget of concurrent candidate LLM calls.
+A request's first slot always waits for room in it, while the other slots
+only start if there is room already, so under load a race narrows to
+fewer candidates instead of queueing behind other requests. Room is taken
+before a candidate's task is created, so slots of the same race see each
+other's share.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional
+
+from app.services.llm_client import LLMClient
+from app.services.model_cascade import check_candidate, response_text
+from app.utils.metrics import LatencyRecorder
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Candidate:
+    model: str
+    # None uses the client's default temperature
+    temperature: Optional[float] = None
+
+    @classmethod
+    def parse(cls, spec: str) -> "Candidate":
+        """A candidate from ``model`` or ``model@temperature``"""
+        model, sep, temperature = spec.rpartition("@")
+        if not sep:
+            return cls(spec)
+        return cls(model, float(temperature))
+
+    def __str__(self) -> str:
+        if self.temperature is None:
+            return self.model
+        return f"{self.model}@{self.temperature:g}"
+
+
+@dataclass
+class RaceResult:
+    code: str
+    model: str
+    slot: int
+    valid: bool
+
+
+class CandidateRace:
+    """Race candidate generations; the first valid one wins"""
+
+    def __init__(
+        self,
+        llm: LLMClient,
+        candidates: Iterable[Candidate],
+        allowed_imports: Iterable[str],
+        dry_run: bool = True,
+        dry_run_timeout: float = 30.0,
+        max_concurrency: int = 16,
+    ):
+        self.llm = llm
+        self.candidates = list(candidates)
+        self.allowed_imports = list(allowed_imports)
+        self.dry_run_timeout = dry_run_timeout if dry_run else None
+        self.max_concurrency = max_concurrency
+        self._budget = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+
+        self.counts = {"races": 0, "narrowed": 0, "no_valid_candidate": 0}
+        self.slots = [
+            {
+                "launched": 0,
+                "skipped": 0,
+                "wins": 0,
+                "invalid": 0,
+                "errors": 0,
+                "cancelled": 0,
+            }
+            for _ in self.candidates
+        ]
+        self.time_to_winner = LatencyRecorder()
+
+    async def run(self, prompt: str) -> RaceResult:
+        """
+        The first candidate for ``prompt`` that passes the checks. If none
+        does, the lowest slot that produced code is returned, marked
+        invalid; if every candidate failed, the last error is raised.
+        """
+        started = time.perf_counter()
+        self.counts["races"] += 1
+        tasks: dict[asyncio.Task, int] = {}
+        for slot, candidate in enumerate(self.candidates):
+            if slot > 0 and self._budget.locked():
+                self.slots[slot]["skipped"] += 1
+                continue
+            # Returns at once when there is room, so the next slot's check
+            # already sees this one
+            release = await self._reserve()
+            self.slots[slot]["launched"] += 1
+            task = asyncio.create_task(self._generate(candidate, prompt, release))
+            # Also frees the room of a task cancelled before it started
+            task.add_done_callback(release)
+            tasks[task] = slot
+        if len(tasks) < len(self.candidates):
+            self.counts["narrowed"] += 1
+
+        fallback: Optional[RaceResult] = None
+        error: Optional[BaseException] = None
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in sorted(done, key=tasks.get):
+                    slot = tasks[task]
+                    model = self.candidates[slot].model
+                    try:
+                        code, rule = task.result()
+                    except Exception as e:
+                        logger.warning(f"Candidate {slot} ({model}) failed: {e}")
+                        self.slots[slot]["errors"] += 1
+                        error = e
+                        continue
+                    if rule is None:
+                        self.slots[slot]["wins"] += 1
+                        self.time_to_winner.record(time.perf_counter() - started)
+                        return RaceResult(code, model, slot, True)
+                    self.slots[slot]["invalid"] += 1
+                    if fallback is None or slot < fallback.slot:
+                        fallback = RaceResult(code, model, slot, False)
+        finally:
+            # Losers stop now rather than finish unread
+            for task in pending:
+                self.slots[tasks[task]]["cancelled"] += 1
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        self.counts["no_valid_candidate"] += 1
+        if fallback is not None:
+            return fallback
+        raise error if error is not None else RuntimeError("No candidates to race")
+
+    async def _reserve(self) -> Callable[..., None]:
+        """Take room in the budget; the returned callable frees it once"""
+        await self._budget.acquire()
+        self.in_flight += 1
+        released = False
+
+        def release(*_) -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self.in_flight -= 1
+                self._budget.release()
+
+        return release
+
+    async def _generate(
+        self, candidate: Candidate, prompt: str, release: Callable[..., None]
+    ) -> tuple[str, Optional[str]]:
+        """A candidate's code and the rule it breaks, if any"""
+        try:
+            response = await self.llm.ainvoke(
+                prompt, model=candidate.model, temperature=candidate.temperature
+            )
+        finally:
+            # The budget is for LLM calls; the checks below do not hold it
+            release()
+        code = response_text(response)
+        rule = await check_candidate(code, self.allowed_imports, self.dry_run_timeout)
+        return code, rule
+
+    def stats(self) -> dict:
+        return {
+            **self.counts,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "time_to_winner": self.time_to_winner.snapshot(),
+            "slots": [
+                {
+                    "candidate": str(candidate),
+                    **counts,
+                    "win_rate": (
+                        round(counts["wins"] / self.counts["races"], 3)
+                        if self.counts["races"]
+                        else None
+                    ),
+                }
+                for candidate, counts in zip(self.candidates, self.slots)
+            ],
+        }
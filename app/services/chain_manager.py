@@ -1,38 +1,103 @@
 import asyncio
+import atexit
+import dataclasses
 import json
 import logging
 import os
-from typing import AsyncGenerator
+import re
+import time
+from contextlib import aclosing
+from pathlib import Path
+from typing import AsyncGenerator, Optional, Sequence
 
 import numpy as np
 from core.config import config
-from google import generativeai as genai
 from langchain.callbacks.base import AsyncCallbackHandler
 from langchain.prompts import PromptTemplate
 from langchain_core.documents import Document
-from langchain_openai import ChatOpenAI
-from pydantic.v1 import SecretStr  # This is from Pydantic v1 compat mode
 from schemas.stream import StreamMarkers
 
 from app.schemas.inference import InferenceRequest, InferenceResponse
-from app.services.render_service import render_manim_script
+from app.services.candidate_race import Candidate, CandidateRace
+from app.services.code_edit import CodeEditor
+from app.services.code_validator import CodeValidationStats, validate_code
+from app.services.context_packer import ContextPacker, TokenCounter
+from app.services.corpus_growth import CorpusGrowth, normalize_code
+from app.services.embedding_cache import QueryEmbeddingCache, normalize_prompt
+from app.services.embedding_index import (
+    EmbeddingIndex,
+    EmbeddingIndexError,
+    compute_corpus_version,
+    content_hash,
+    load_corpus,
+    load_index,
+    save_index,
+    sync_index,
+)
+from app.services.embedding_provider import (
+    EmbeddingError,
+    EmbeddingProvider,
+    HashingEmbeddingProvider,
+    create_embedding_provider,
+)
+from app.services.lexical_index import BM25Index
+from app.services.llm_client import create_llm_client
+from app.services.model_cascade import ModelCascade
+from app.services.reasoning_filter import ReasoningFilter
+from app.services.render_repair import RenderRepairer
+from app.services.response_cache import ResponseCache
+from app.services.retrieval import (
+    RETRIEVAL_MODES,
+    AppendedDocuments,
+    CorpusSnapshot,
+    RetrievalCorpus,
+    ScoredDocument,
+    merge_by_quota,
+)
+from app.services.shared_corpus import SharedCorpus, SharedDocuments
+from app.services.single_flight import SingleFlight
+from app.services.vector_store import (
+    SegmentedVectorStore,
+    VectorStoreInterface,
+    create_vector_store,
+    normalize_rows,
+)
+from app.utils.metrics import LatencyRecorder, ValueRecorder
 
 
 class CodeStreamCallback(AsyncCallbackHandler):
     """Callback handler for streaming code generation"""
 
-    def __init__(self):
-        self.queue = asyncio.Queue()
+    def __init__(self, maxsize: int = 0):
+        # Bounded, so a slow reader applies backpressure to the LLM stream
+        self.queue = asyncio.Queue(maxsize)
         self.error_occurred = False
+        # Reasoning is dropped here, before it reaches the code or the client
+        self.reasoning_filter = ReasoningFilter()
+        self.code_tokens = 0
+        self.reasoning_tokens = 0
+        self.first_code_at: Optional[float] = None
 
     async def on_llm_new_token(self, token: str, **kwargs) -> None:
         """Handle new token from LLM"""
-        await self.queue.put(token)
+        await self._put(*self.reasoning_filter.feed(token))
 
     async def on_llm_end(self, response, **kwargs) -> None:
         """Handle LLM completion"""
+        await self._put(*self.reasoning_filter.flush())
         await self.queue.put(StreamMarkers.STREAM_END)
 
+    async def _put(self, code: str, reasoning: str) -> None:
+        # Tokens the filter still holds back count once it has decided
+        if not code:
+            if reasoning:
+                self.reasoning_tokens += 1
+            return
+        self.code_tokens += 1
+        if self.first_code_at is None:
+            self.first_code_at = time.perf_counter()
+        await self.queue.put(code)
+
     async def on_llm_error(self, error, **kwargs) -> None:
         """Handle LLM error"""
 
@@ -53,155 +118,1105 @@ class CodeStreamCallback(AsyncCallbackHandler):
             yield token
 
 
-# pyright: reportPrivateImportUsage=false
-# Configure Gemini embedding model
-genai.configure(api_key=config.GEMINI_API_KEY)
 logger = logging.getLogger(__name__)
 
 
+def _read_reload_marker() -> Optional[dict]:
+    try:
+        with open(config.CORPUS_RELOAD_MARKER_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _write_reload_marker(corpus_version: str) -> None:
+    """Tell the other workers that the corpus changed (see _watch_reloads)"""
+    path = config.CORPUS_RELOAD_MARKER_PATH
+    path.parent.mkdir(parents=True, exist_ok=True)
+    marker = {"corpus_version": corpus_version, "pid": os.getpid(), "at": time.time()}
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(marker, f)
+    os.replace(tmp_path, path)
+
+
 class ChainManager:
-    def __init__(self):
-        self.embedding_model = genai.get_model("models/embedding-001")
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        mapping_path = os.path.join(base_dir, "..", "..", "cleaned_index_mapping.json")
+    def __init__(self, embedding_provider: Optional[EmbeddingProvider] = None):
+        doc_data = self._load_mapping()
+        texts = [d["content"] for d in doc_data]
+
+        # Query vectors must come from the provider that built the index.
+        # Hashing weights are learned once: documents added by a reload are
+        # embedded with the same weights, so existing vectors stay valid.
+        self.embedding_provider = embedding_provider or create_embedding_provider()
+        if isinstance(self.embedding_provider, HashingEmbeddingProvider):
+            self.embedding_provider.fit(texts)
+
+        self.retrieval_mode = config.RETRIEVAL_MODE.lower()
+        if self.retrieval_mode not in RETRIEVAL_MODES:
+            raise RuntimeError(f"Unknown retrieval mode: {config.RETRIEVAL_MODE}")
+
+        # Everything derived from the corpus lives in one snapshot that a
+        # reload replaces with a single assignment
+        self._snapshot = self._build_snapshot(doc_data, generation=1)
+        self._corpus_lock = asyncio.Lock()
+        self._reload_task: Optional[asyncio.Task] = None
+        self._reload_watcher: Optional[asyncio.Task] = None
+
+        # Successfully rendered generations appended to the examples
+        self.growth: Optional[CorpusGrowth] = None
+        self._growth_task: Optional[asyncio.Task] = None
+        if config.CORPUS_GROWTH_ENABLED:
+            self.growth = CorpusGrowth(
+                max_entries=config.CORPUS_GROWTH_MAX_ENTRIES,
+                provider_identity=self.embedding_provider.identity,
+                batch_size=config.CORPUS_GROWTH_BATCH_SIZE,
+                log_path=config.GENERATED_EXAMPLES_PATH,
+            )
+        self.reload_stats = {
+            "reloads": 0,
+            "failures": 0,
+            "last_error": None,
+            "last_duration_ms": None,
+        }
+
+        self.retrieval_counts = {
+            "hybrid": 0,
+            "vector": 0,
+            "lexical": 0,
+            "lexical_fallback": 0,
+        }
+        self.retrieval_latency = LatencyRecorder()
+        self.embed_latency = LatencyRecorder()
+
+        self.prompt_template = self._get_prompt_template()
+        self.token_counter = TokenCounter(config.CONTEXT_TOKENIZER)
+        self.context_packer = ContextPacker(
+            self.token_counter,
+            budget_tokens=config.CONTEXT_TOKEN_BUDGET,
+            dedup_threshold=config.CONTEXT_DEDUP_THRESHOLD,
+        )
+        self.prompt_tokens = ValueRecorder()
+        self.context_tokens = ValueRecorder()
+        self.context_counts = {"duplicates": 0, "over_budget": 0, "truncated": 0}
+
+        self.query_cache = QueryEmbeddingCache(
+            max_entries=config.QUERY_CACHE_SIZE,
+            ttl_seconds=config.QUERY_CACHE_TTL_SECONDS,
+            persist_path=config.QUERY_CACHE_PATH,
+        )
+        if config.QUERY_CACHE_PATH:
+            atexit.register(self.query_cache.save)
+
+        # One pooled LLM client per worker, shared by every request
+        self.llm = create_llm_client()
+        self._warmup_task: Optional[asyncio.Task] = None
+        # Cheaper models answer first; OPENAI_LLM only gets what they fail
+        self.cascade = ModelCascade(
+            self.llm,
+            [*config.LLM_CASCADE_MODELS, config.OPENAI_LLM],
+            allowed_imports=config.CODE_ALLOWED_IMPORTS,
+            dry_run=config.LLM_CASCADE_DRY_RUN,
+            dry_run_timeout=config.LLM_CASCADE_DRY_RUN_TIMEOUT_SECONDS,
+        )
+        # Follow-ups in a chat patch the chat's script instead of regenerating
+        self.code_editor = CodeEditor(
+            self.llm, self.token_counter, allowed_imports=config.CODE_ALLOWED_IMPORTS
+        )
+        # Latency-sensitive mode: race candidates instead of cascading
+        self.race: Optional[CandidateRace] = None
+        if config.PARALLEL_CANDIDATES:
+            self.race = CandidateRace(
+                self.llm,
+                [Candidate.parse(spec) for spec in config.PARALLEL_CANDIDATES],
+                allowed_imports=config.CODE_ALLOWED_IMPORTS,
+                dry_run=config.PARALLEL_CANDIDATES_DRY_RUN,
+                dry_run_timeout=config.PARALLEL_CANDIDATES_DRY_RUN_TIMEOUT_SECONDS,
+                max_concurrency=config.PARALLEL_CANDIDATES_MAX_CONCURRENCY,
+            )
+
+        self.stream_counts = {
+            "completed": 0,
+            "abandoned": 0,
+            "wasted_tokens": 0,
+            "code_tokens": 0,
+            "reasoning_tokens": 0,
+        }
+        # From the start of a generation (retrieval included) to its first code
+        self.time_to_first_code_token = LatencyRecorder()
+        self.code_validation = CodeValidationStats()
+        self.render_repair = RenderRepairer(
+            self.llm,
+            self.token_counter,
+            max_attempts=config.RENDER_REPAIR_MAX_ATTEMPTS,
+            deadline_seconds=config.RENDER_REPAIR_DEADLINE_SECONDS,
+            allowed_imports=(
+                config.CODE_ALLOWED_IMPORTS if config.CODE_VALIDATION_ENABLED else None
+            ),
+            validation=self.code_validation,
+        )
+        self.generations: Optional[SingleFlight] = None
+        if config.SINGLE_FLIGHT_ENABLED:
+            self.generations = SingleFlight()
+
+        self.response_cache: Optional[ResponseCache] = None
+        if config.RESPONSE_CACHE_ENABLED:
+            self.response_cache = ResponseCache(
+                max_entries=config.RESPONSE_CACHE_SIZE,
+                ttl_seconds=config.RESPONSE_CACHE_TTL_SECONDS,
+                semantic_threshold=config.RESPONSE_CACHE_SEMANTIC_THRESHOLD,
+            )
 
+    @property
+    def snapshot(self) -> CorpusSnapshot:
+        """
+        The active corpus. Requests read it once and keep using that object,
+        so a reload never changes the corpus under a request in flight.
+        """
+        return self._snapshot
+
+    @property
+    def corpus_version(self) -> str:
+        return self._snapshot.corpus_version
+
+    # Single-corpus views of the active snapshot, used by offline helpers
+    @property
+    def examples(self) -> RetrievalCorpus:
+        return self._snapshot.examples
+
+    @property
+    def documents(self) -> Sequence[Document]:
+        return self._snapshot.examples.documents
+
+    @property
+    def vector_store(self) -> VectorStoreInterface:
+        return self._snapshot.examples.vector_store
+
+    @property
+    def lexical_index(self) -> BM25Index:
+        return self._snapshot.examples.lexical_index
+
+    @staticmethod
+    def _load_mapping() -> list[dict]:
         try:
-            with open(mapping_path, "r", encoding="utf-8") as f:
-                doc_data = json.load(f)
-            self.documents = [Document(page_content=d["content"]) for d in doc_data]
-            self.doc_embeddings = [
-                self._embed_with_gemini(doc.page_content) for doc in self.documents
-            ]
+            return load_corpus(config.INDEX_MAPPING_PATH)
         except (FileNotFoundError, json.JSONDecodeError) as e:
             raise RuntimeError(f"Failed to load document mapping: {e}")
 
-    def _embed_with_gemini(self, text: str) -> np.ndarray:
+    def _build_snapshot(
+        self, doc_data: list[dict], generation: int, persist: bool = False
+    ) -> CorpusSnapshot:
+        """
+        Open every corpus. With ``persist``, newly embedded entries are saved
+        to the embedding index so other workers reloading the same mapping
+        reuse them instead of embedding again.
+        """
+        examples = self._open_corpus(
+            "examples",
+            doc_data,
+            index_dir=config.EMBEDDING_INDEX_DIR,
+            faiss_index_path=config.FAISS_INDEX_PATH,
+            persist=persist,
+        )
+        # Corpora queried per request, with the most results each may add
+        corpora = {"examples": examples}
+        quotas = {"examples": config.CONTEXT_MAX_EXAMPLES}
+        docs = (
+            self._open_docs_corpus(persist=persist)
+            if config.DOCS_CORPUS_ENABLED
+            else None
+        )
+        if docs is not None:
+            corpora["docs"] = docs
+            quotas["docs"] = config.DOCS_MAX_RESULTS
+
+        texts = [d["content"] for d in doc_data]
+        return CorpusSnapshot(
+            generation=generation,
+            corpus_version=compute_corpus_version([content_hash(t) for t in texts]),
+            corpora=corpora,
+            quotas=quotas,
+            base_examples=examples,
+            example_hashes=frozenset(content_hash(normalize_code(t)) for t in texts),
+        )
+
+    def reload_corpus(self) -> bool:
+        """
+        Start rebuilding the corpus from the mapping file in the background.
+        Returns False if a reload is already running.
+        """
+        if self._reload_task is not None and not self._reload_task.done():
+            return False
+        self._reload_task = asyncio.create_task(self._reload())
+        return True
+
+    @property
+    def reloading(self) -> bool:
+        return self._reload_task is not None and not self._reload_task.done()
+
+    async def _reload(self, announce: bool = True) -> None:
+        # Serialized with generated-example appends, which also swap snapshots
+        async with self._corpus_lock:
+            start = time.perf_counter()
+            previous = self._snapshot
+            try:
+                doc_data = await asyncio.to_thread(self._load_mapping)
+                # Embedding and index building run off the event loop, so
+                # requests and streams keep being served on the old snapshot
+                snapshot = await asyncio.to_thread(
+                    self._build_snapshot,
+                    doc_data,
+                    previous.generation + 1,
+                    True,
+                )
+                if self.growth is not None and len(self.growth):
+                    self.growth.retain(snapshot.example_hashes)
+                    snapshot = await asyncio.to_thread(
+                        self._grow, snapshot, snapshot.generation
+                    )
+            except Exception as e:
+                self.reload_stats["failures"] += 1
+                self.reload_stats["last_error"] = str(e)
+                logger.error(f"Corpus reload failed, keeping {previous.label}: {e}")
+                return
+
+            self._snapshot = snapshot
+        duration = time.perf_counter() - start
+        self.reload_stats["reloads"] += 1
+        self.reload_stats["last_error"] = None
+        self.reload_stats["last_duration_ms"] = round(duration * 1000, 1)
+        logger.info(
+            f"Corpus reloaded in {duration:.2f}s: {previous.label} -> "
+            f"{snapshot.label} ({len(snapshot.examples)} examples)"
+        )
+        if announce:
+            await asyncio.to_thread(_write_reload_marker, snapshot.corpus_version)
+
+    def start_background_tasks(self) -> None:
+        """Called from the app lifespan once the event loop runs"""
+        self.start_reload_watcher()
+        if config.LLM_WARMUP:
+            self._warmup_task = asyncio.create_task(self.llm.warm_up())
+        if self.growth is not None and self._growth_task is None:
+            self._growth_task = asyncio.create_task(self._restore_growth())
+
+    def start_reload_watcher(self) -> None:
+        """
+        Follow reloads triggered in other worker processes: the worker that
+        handled the admin request writes a marker, and every other worker
+        reloads when it sees a corpus version different from its own. A
+        marker with the same version announces grown examples instead,
+        which the other workers load from the growth log.
+        """
+        if config.CORPUS_RELOAD_POLL_SECONDS <= 0:
+            return
+        if self._reload_watcher is None or self._reload_watcher.done():
+            self._reload_watcher = asyncio.create_task(self._watch_reloads())
+
+    async def _watch_reloads(self) -> None:
+        # A recycled worker is forked with the corpus the master loaded, so
+        # a marker that already exists may still be news to it
+        seen: Optional[dict] = None
+        while True:
+            await asyncio.sleep(config.CORPUS_RELOAD_POLL_SECONDS)
+            marker = await asyncio.to_thread(_read_reload_marker)
+            if marker == seen or marker is None:
+                continue
+            seen = marker
+            if marker["corpus_version"] != self.corpus_version:
+                if not self.reloading:
+                    logger.info(f"Reload requested by pid {marker['pid']}")
+                    self._reload_task = asyncio.create_task(
+                        self._reload(announce=False)
+                    )
+            elif self.growth is not None and marker["pid"] != os.getpid():
+                if self._growth_task is None or self._growth_task.done():
+                    self._growth_task = asyncio.create_task(self._restore_growth())
+
+    def add_generated_example(self, prompt: str, code: str) -> bool:
+        """
+        Offer a generation that rendered successfully as a retrieval example.
+        It is embedded and appended to the live index in the background;
+        returns False if growth is disabled or the code is a duplicate.
+        """
+        if self.growth is None:
+            return False
+        if not self.growth.submit(prompt, code, self._snapshot.example_hashes):
+            return False
+        if self._growth_task is None or self._growth_task.done():
+            self._growth_task = asyncio.create_task(self._run_growth())
+        return True
+
+    async def _run_growth(self) -> None:
+        """Embed and append queued generations until the queue is empty"""
+        while self.growth.pending:
+            if len(self.growth.pending) < self.growth.batch_size:
+                # Wait for a fuller batch; one embedding call serves them all
+                await asyncio.sleep(config.CORPUS_GROWTH_FLUSH_SECONDS)
+            batch = self.growth.take_batch()
+            if batch:
+                await self._append_examples(batch)
+
+    async def _restore_growth(self) -> None:
+        """Load examples grown by earlier runs and other workers"""
         try:
-            res = self.embedding_model.embed_content(
-                content=text,
-                task_type="retrieval_document",
-                title="RAG chunk",
+            ready, stale = await asyncio.to_thread(self.growth.load)
+        except OSError as e:
+            logger.warning(f"Failed to load generated examples: {e}")
+            return
+        known = self._snapshot.example_hashes | {e.hash for e in self.growth.entries}
+        known |= {e.hash for e in self.growth.pending}
+        ready = [e for e in ready if e.hash not in known]
+        if ready:
+            await self._append_examples(ready, log=False)
+        # Entries embedded by another provider are embedded again
+        self.growth.pending.extend(e for e in stale if e.hash not in known)
+        await self._run_growth()
+
+    async def _append_examples(self, batch: list, log: bool = True) -> None:
+        async with self._corpus_lock:
+            try:
+                missing = [e for e in batch if e.embedding is None]
+                if missing:
+                    embeddings = await asyncio.to_thread(
+                        self.embedding_provider.embed_documents,
+                        [e.content for e in missing],
+                    )
+                    for entry, embedding in zip(missing, embeddings):
+                        entry.embedding = np.asarray(embedding, dtype=np.float32)
+                # Logging writes files and may compact the log under a lock
+                evicted = await asyncio.to_thread(self.growth.commit, batch, log)
+                snapshot = self._snapshot
+                self._snapshot = await asyncio.to_thread(
+                    self._grow, snapshot, snapshot.generation + 1
+                )
+            except Exception as e:
+                self.growth.stats["failures"] += 1
+                logger.error(f"Failed to append {len(batch)} generated examples: {e}")
+                return
+        logger.info(
+            f"Appended {len(batch)} generated examples, evicted {len(evicted)} "
+            f"({len(self.growth)} generated examples live)"
+        )
+        if log and self.growth.log_path is not None:
+            # Other workers pick the new entries up from the log
+            try:
+                await asyncio.to_thread(
+                    _write_reload_marker, self._snapshot.corpus_version
+                )
+            except OSError as e:
+                logger.warning(f"Failed to announce generated examples: {e}")
+
+    def _grow(self, snapshot: CorpusSnapshot, generation: int) -> CorpusSnapshot:
+        """
+        ``snapshot`` with the live generated examples appended to its base
+        examples. The base vector store is reused as is (and stays shared);
+        only the BM25 index, which is cheap to build, is rebuilt.
+        """
+        base = snapshot.base_examples
+        entries = list(self.growth.entries)
+        if not entries:
+            examples = base
+        else:
+            extra_docs = [e.document for e in entries]
+            documents = AppendedDocuments(base.documents, extra_docs)
+            vector_store = SegmentedVectorStore(
+                base.vector_store, np.vstack([e.embedding for e in entries])
             )
-            return np.array(res["embedding"], dtype=np.float32)
-        except Exception:
-            return np.zeros(3072, dtype=np.float32)  # Safe fallback
+            texts = [d.page_content for d in documents]
+            titles = [d.metadata.get("title", "") for d in documents]
+            examples = RetrievalCorpus(
+                "examples",
+                documents,
+                vector_store,
+                BM25Index(texts, titles),
+                mode=self.retrieval_mode,
+                rrf_k=config.RETRIEVAL_RRF_K,
+            )
+        # Keep accumulating the per-corpus metrics across appends
+        current = snapshot.examples
+        examples.search_latency = current.search_latency
+        examples.timeouts = current.timeouts
+        return dataclasses.replace(
+            snapshot,
+            generation=generation,
+            corpora={**snapshot.corpora, "examples": examples},
+        )
+
+    def reload_status(self) -> dict:
+        return {
+            "corpus_version": self._snapshot.corpus_version,
+            "generation": self._snapshot.generation,
+            "loaded_at": self._snapshot.loaded_at,
+            "corpora": {
+                name: len(corpus) for name, corpus in self._snapshot.corpora.items()
+            },
+            "reloading": self.reloading,
+            **self.reload_stats,
+        }
+
+    def _open_corpus(
+        self,
+        name: str,
+        entries: list[dict],
+        index_dir: Path,
+        faiss_index_path: Path,
+        persist: bool = False,
+    ) -> RetrievalCorpus:
+        """Build the documents, vector store and BM25 index of a corpus"""
+        texts = [e["content"] for e in entries]
+        titles = [e.get("title", "") for e in entries]
+        version = compute_corpus_version([content_hash(t) for t in texts])
+
+        shared = self._open_shared_corpus(
+            name, version, texts, titles, index_dir, persist
+        )
+        if shared is not None:
+            documents = SharedDocuments(shared)
+        else:
+            documents = [
+                Document(page_content=t, metadata={"title": title})
+                for t, title in zip(texts, titles)
+            ]
+
+        vector_store = self._create_vector_store(
+            texts, shared, index_dir, faiss_index_path, persist
+        )
+        try:
+            return RetrievalCorpus(
+                name,
+                documents,
+                vector_store,
+                BM25Index(texts, titles),
+                mode=self.retrieval_mode,
+                rrf_k=config.RETRIEVAL_RRF_K,
+            )
+        except ValueError as e:
+            raise RuntimeError(str(e))
+
+    def _open_docs_corpus(self, persist: bool = False) -> Optional[RetrievalCorpus]:
+        """
+        The Manim documentation corpus is optional: without its mapping file
+        (the text behind cleaned_manim_doc_faiss.index) only examples are used.
+        """
+        try:
+            entries = load_corpus(config.DOCS_MAPPING_PATH)
+        except FileNotFoundError:
+            logger.warning(
+                f"Docs corpus disabled: no mapping at {config.DOCS_MAPPING_PATH}"
+            )
+            return None
+        except json.JSONDecodeError as e:
+            logger.error(f"Docs corpus disabled: invalid mapping: {e}")
+            return None
+
+        try:
+            return self._open_corpus(
+                "docs",
+                entries,
+                index_dir=config.DOCS_EMBEDDING_INDEX_DIR,
+                faiss_index_path=config.DOCS_FAISS_INDEX_PATH,
+                persist=persist,
+            )
+        except RuntimeError as e:
+            logger.error(f"Docs corpus disabled: {e}")
+            return None
+
+    def _open_shared_corpus(
+        self,
+        name: str,
+        version: str,
+        texts: list[str],
+        titles: list[str],
+        index_dir: Path,
+        persist: bool = False,
+    ) -> Optional[SharedCorpus]:
+        """
+        Attach to the shared-memory segment for this corpus version, exporting
+        it first if no process has yet. Under gunicorn with preload_app this
+        runs once in the master and workers inherit the maps.
+        """
+        if not config.SHARED_CORPUS_DIR:
+            return None
+
+        parent = Path(config.SHARED_CORPUS_DIR) / name
+        with_matrix = config.VECTOR_STORE_BACKEND.lower() in ("numpy", "quantized")
+        if with_matrix:
+            slug = re.sub(r"[^A-Za-z0-9.-]+", "_", self.embedding_provider.identity)
+            directory = parent / f"{version}-{slug}"
+        else:
+            directory = parent / f"{version}-text"
+
+        try:
+            shared = SharedCorpus.attach(directory)
+            if shared is None:
+                embeddings = (
+                    normalize_rows(
+                        self._load_doc_index(texts, index_dir, persist).embeddings
+                    )
+                    if with_matrix
+                    else None
+                )
+                shared = SharedCorpus.export(
+                    directory, {"content": texts, "title": titles}, embeddings
+                )
+                SharedCorpus.remove_stale(parent, keep=directory)
+        except OSError as e:
+            logger.warning(f"Shared corpus unavailable, using process memory: {e}")
+            return None
+        return shared
 
-    def _cosine_similarity(self, a: np.ndarray, b: np.ndarray) -> float:
-        denom = np.linalg.norm(a) * np.linalg.norm(b)
-        if denom == 0:
-            return 0.0
-        return np.clip(np.dot(a, b) / denom, -1.0, 1.0)
+    def _create_vector_store(
+        self,
+        texts: list[str],
+        shared: Optional[SharedCorpus],
+        index_dir: Path,
+        faiss_index_path: Path,
+        persist: bool = False,
+    ) -> VectorStoreInterface:
+        """Open the configured retrieval backend over a corpus"""
+        backend = config.VECTOR_STORE_BACKEND.lower()
+        if backend == "faiss":
+            store = create_vector_store(
+                backend,
+                index_path=faiss_index_path,
+                nprobe=config.FAISS_NPROBE,
+                ef_search=config.FAISS_EF_SEARCH,
+            )
+        elif backend == "quantized":
+            # Exact re-ranking reads shortlist rows from the shared memory map;
+            # without one the full matrix stays in process memory
+            if shared is not None and shared.embeddings is not None:
+                exact = shared.embeddings
+            else:
+                index = self._load_doc_index(texts, index_dir, persist)
+                exact = normalize_rows(index.embeddings)
+            store = create_vector_store(
+                backend,
+                embeddings=exact,
+                normalized=True,
+                dtype=config.QUANTIZED_DTYPE,
+                pca_dim=config.QUANTIZED_PCA_DIM,
+                rerank_factor=config.QUANTIZED_RERANK_FACTOR,
+                rerank_source=exact,
+            )
+        elif shared is not None and shared.embeddings is not None:
+            # Zero-copy: search the shared, already normalized matrix in place
+            store = create_vector_store(
+                backend, embeddings=shared.embeddings, normalized=True
+            )
+        else:
+            index = self._load_doc_index(texts, index_dir, persist)
+            store = create_vector_store(backend, embeddings=index.embeddings)
+
+        if store.dim != self.embedding_provider.dim:
+            raise RuntimeError(
+                f"Vector store dimension {store.dim} does not match embedding "
+                f"provider {self.embedding_provider.identity} "
+                f"(dimension {self.embedding_provider.dim})"
+            )
+        return store
+
+    def _load_doc_index(
+        self, texts: list[str], index_dir: Path, persist: bool = False
+    ) -> EmbeddingIndex:
+        """
+        Load the prebuilt embedding artifact and re-embed only the entries whose
+        content changed since it was built
+        """
+        try:
+            previous = load_index(index_dir)
+        except EmbeddingIndexError as e:
+            logger.warning(f"Ignoring embedding index: {e}")
+            previous = None
+
+        if previous is None:
+            logger.warning(
+                f"No embedding index found in {index_dir}, embedding the full "
+                "corpus. Run `python -m app.services.embedding_index build` to "
+                "avoid this."
+            )
+
+        try:
+            index, embedded = sync_index(texts, previous, self.embedding_provider)
+        except Exception as e:
+            raise RuntimeError(f"Failed to embed documents: {e}")
+
+        if embedded and persist:
+            save_index(index, index_dir)
+            logger.info(f"Embedded {embedded} changed documents into {index_dir}")
+        elif embedded:
+            logger.warning(
+                f"Re-embedded {embedded} changed documents; rebuild the embedding "
+                "index to persist them"
+            )
+        logger.info(
+            f"Loaded embedding index {index.corpus_version} ({len(index)} documents)"
+        )
+        return index
+
+    def _embed_query(self, text: str) -> np.ndarray:
+        """Embed a query, serving repeated prompts from the query cache"""
+        key = self.embedding_provider.identity
+        cached = self.query_cache.get(text, key)
+        if cached is not None:
+            return cached
+
+        embedding = self.embedding_provider.embed_query(text)
+        self.query_cache.put(text, key, embedding)
+        return embedding
+
+    async def _aembed_query(self, text: str) -> np.ndarray:
+        """Async version of _embed_query used by the request handlers"""
+        key = self.embedding_provider.identity
+        cached = self.query_cache.get(text, key)
+        if cached is not None:
+            return cached
+
+        embedding = await self.embedding_provider.aembed_query(text)
+        self.query_cache.put(text, key, embedding)
+        return embedding
+
+    def _embed_queries(self, texts: list[str]) -> np.ndarray:
+        """Batch version of _embed_query; only cache misses are embedded"""
+        key = self.embedding_provider.identity
+        cached = [self.query_cache.get(t, key) for t in texts]
+        missing = [i for i, emb in enumerate(cached) if emb is None]
+        if missing:
+            fresh = self.embedding_provider.embed_queries([texts[i] for i in missing])
+            for i, embedding in zip(missing, fresh):
+                self.query_cache.put(texts[i], key, embedding)
+                cached[i] = embedding
+        return np.vstack(cached)
+
+    def get_metrics(self) -> dict:
+        """Per-worker retrieval metrics"""
+        return {
+            "query_embedding_cache": self.query_cache.stats(),
+            "corpus_growth": (
+                self.growth.snapshot() if self.growth is not None else None
+            ),
+            "llm": self.llm.stats(),
+            "model_cascade": self.cascade.stats(),
+            "candidate_race": self.race.stats() if self.race is not None else None,
+            "streams": {
+                **self.stream_counts,
+                "time_to_first_code_token": self.time_to_first_code_token.snapshot(),
+            },
+            "code_validation": self.code_validation.stats(),
+            "render_repair": self.render_repair.stats(),
+            "edit_mode": self.code_editor.stats(),
+            "single_flight": (
+                self.generations.stats() if self.generations is not None else None
+            ),
+            "response_cache": (
+                self.response_cache.stats() if self.response_cache is not None else None
+            ),
+            "retrieval": {
+                "mode": self.retrieval_mode,
+                **self.retrieval_counts,
+                "latency": self.retrieval_latency.snapshot(),
+                "embed_latency": self.embed_latency.snapshot(),
+                "corpora": {
+                    name: corpus.stats()
+                    for name, corpus in self.snapshot.corpora.items()
+                },
+            },
+            "prompt": {
+                "tokenizer": self.token_counter.encoding_name,
+                "exact_token_counts": self.token_counter.exact,
+                "prompt_tokens": self.prompt_tokens.snapshot(),
+                "context_tokens": self.context_tokens.snapshot(),
+                "examples_dropped": dict(self.context_counts),
+            },
+        }
+
+    async def aclose(self) -> None:
+        """Release pooled connections; called from the app lifespan"""
+        tasks = (
+            self._reload_watcher,
+            self._reload_task,
+            self._growth_task,
+            self._warmup_task,
+        )
+        for task in tasks:
+            if task is not None:
+                task.cancel()
+        await self.embedding_provider.aclose()
+        await self.llm.aclose()
+
+    def _record_retrieval(self, query_emb: Optional[np.ndarray]) -> None:
+        if self.retrieval_mode == "lexical":
+            self.retrieval_counts["lexical"] += 1
+        elif query_emb is None:
+            self.retrieval_counts["lexical_fallback"] += 1
+        else:
+            self.retrieval_counts[self.retrieval_mode] += 1
 
     def _retrieve_top_k(
         self, query: str, documents: list[Document], k: int = 10
     ) -> list[Document]:
-        query_emb = self._embed_with_gemini(query)
-        similarities = [
-            self._cosine_similarity(query_emb, doc_emb)
-            for doc_emb in self.doc_embeddings
+        query_emb = None
+        if self.retrieval_mode != "lexical":
+            query_emb = self._embed_query(query)
+        self._record_retrieval(query_emb)
+        return [documents[i] for i, _ in self.examples.rank(query, query_emb, k)]
+
+    async def _aembed_for_retrieval(
+        self, query: str, timeout: float
+    ) -> Optional[np.ndarray]:
+        """
+        Query embedding within ``timeout`` seconds, or None when it fails or
+        runs late, in which case BM25 over the titles and text answers alone
+        instead of delaying generation
+        """
+        if self.retrieval_mode == "lexical":
+            return None
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(self._aembed_query(query), timeout=timeout)
+        except (EmbeddingError, asyncio.TimeoutError) as e:
+            logger.warning(
+                f"Query embedding unavailable, using lexical retrieval: "
+                f"{str(e) or 'timed out'}"
+            )
+            return None
+        finally:
+            self.embed_latency.record(time.perf_counter() - start)
+
+    async def _aretrieve_top_k(
+        self, query: str, documents: list[Document], k: int = 10
+    ) -> list[Document]:
+        """Example retrieval for the request path; never blocks the event loop"""
+        query_emb = await self._aembed_for_retrieval(
+            query, config.RETRIEVAL_EMBED_TIMEOUT_SECONDS
+        )
+        self._record_retrieval(query_emb)
+        return [documents[i] for i, _ in self.examples.rank(query, query_emb, k)]
+
+    async def _aretrieve_context(
+        self, query: str, snapshot: CorpusSnapshot
+    ) -> list[Document]:
+        """
+        Query every corpus of ``snapshot`` in parallel and merge the results
+        under the per-corpus quotas. The whole step, embedding included, is bounded by
+        RETRIEVAL_LATENCY_BUDGET_SECONDS; corpora that miss the deadline
+        contribute nothing to this request.
+        """
+        start = time.perf_counter()
+        budget = config.RETRIEVAL_LATENCY_BUDGET_SECONDS
+        query_emb = await self._aembed_for_retrieval(
+            query, min(config.RETRIEVAL_EMBED_TIMEOUT_SECONDS, budget)
+        )
+        self._record_retrieval(query_emb)
+
+        async def search(corpus: RetrievalCorpus) -> list[ScoredDocument]:
+            t0 = time.perf_counter()
+            # Spare candidates so dropped duplicates can be replaced
+            k = 2 * snapshot.quotas[corpus.name]
+            result = await asyncio.to_thread(corpus.search, query, query_emb, k)
+            corpus.search_latency.record(time.perf_counter() - t0)
+            return result
+
+        tasks = {
+            name: asyncio.create_task(search(corpus))
+            for name, corpus in snapshot.corpora.items()
+        }
+        remaining = max(0.0, budget - (time.perf_counter() - start))
+        done, _ = await asyncio.wait(tasks.values(), timeout=remaining)
+
+        results: dict[str, list[ScoredDocument]] = {}
+        for name, task in tasks.items():
+            if task not in done:
+                task.cancel()
+                snapshot.corpora[name].timeouts += 1
+                logger.warning(f"Retrieval from {name} exceeded the latency budget")
+            elif task.exception() is not None:
+                logger.error(f"Retrieval from {name} failed: {task.exception()}")
+            else:
+                results[name] = task.result()
+
+        self.retrieval_latency.record(time.perf_counter() - start)
+        return [s.document for s in merge_by_quota(results, snapshot.quotas)]
+
+    def retrieve_top_k_batch(
+        self, queries: list[str], k: int = 10
+    ) -> list[list[Document]]:
+        """
+        Retrieve the top-k examples for many prompts at once. Queries are
+        embedded in batched requests and scored against the corpus in a
+        single matmul, which is intended for offline jobs (evaluation,
+        cache warming).
+        """
+        if not queries:
+            return []
+        embeddings = None
+        if self.retrieval_mode != "lexical":
+            embeddings = self._embed_queries(queries)
+        for i in range(len(queries)):
+            self._record_retrieval(None if embeddings is None else embeddings[i])
+        examples = self.snapshot.examples
+        return [
+            [examples.documents[i] for i, _ in ranked]
+            for ranked in examples.rank_batch(queries, embeddings, k)
         ]
-        top_indices = np.argsort(similarities)[-k:][::-1]
-        return [documents[i] for i in top_indices]
 
-    async def run_inference(self, request: InferenceRequest) -> InferenceResponse:
-        query = request.prompt
+    async def _build_prompt(
+        self, query: str, snapshot: CorpusSnapshot
+    ) -> tuple[str, int]:
+        """
+        Retrieve context for ``query``, pack it within the context token
+        budget and render the final prompt. Returns (prompt, prompt tokens).
+        """
+        candidates = await self._aretrieve_context(query, snapshot)
+        packed = self.context_packer.pack(
+            candidates, max_documents=sum(snapshot.quotas.values())
+        )
+        if self.growth is not None:
+            self.growth.record_hits(
+                [
+                    doc.metadata["hash"]
+                    for doc in packed.documents
+                    if doc.metadata.get("source") == "generated"
+                ]
+            )
 
-        # Load LLM from .env
+        final_prompt = self.prompt_template.format(question=query, context=packed.text)
+        prompt_tokens = self.token_counter.count(final_prompt)
 
-        llm = ChatOpenAI(
-            model=os.getenv("OPENAI_LLM", "deepseek/deepseek-r1-0528:free"),
-            temperature=0.1,
-            api_key=SecretStr(os.getenv("OPENAI_API_KEY", "dummy")),
-            base_url=os.getenv("OPENAI_API_BASE", "https://openrouter.ai/api/v1"),
+        self.prompt_tokens.record(prompt_tokens)
+        self.context_tokens.record(packed.tokens)
+        self.context_counts["duplicates"] += packed.duplicates
+        self.context_counts["over_budget"] += packed.over_budget
+        self.context_counts["truncated"] += int(packed.truncated)
+        logger.info(
+            f"Prompt: {prompt_tokens} tokens ({len(packed.documents)} examples, "
+            f"{packed.tokens} context tokens, {packed.duplicates} duplicates and "
+            f"{packed.over_budget} over-budget examples dropped)"
         )
+        return final_prompt, prompt_tokens
 
-        # Retrieve top-k docs
-        top_k_docs = self._retrieve_top_k(query, self.documents, k=4)
-        context = "\n\n".join(doc.page_content for doc in top_k_docs)
+    async def _lookup_response(
+        self, query: str, snapshot: CorpusSnapshot
+    ) -> tuple[Optional[str], Optional[str], Optional[np.ndarray]]:
+        """
+        Cached code for ``query`` as (code, "exact" | "semantic", query
+        embedding). The embedding is only computed when the exact tier
+        misses; it lands in the query cache, so retrieval reuses it.
+        """
+        if self.response_cache is None:
+            return None, None, None
+        model, version = self.llm.model, snapshot.corpus_version
+        code = self.response_cache.get(query, model, version)
+        if code is not None:
+            return code, "exact", None
 
-        # Prompt template
-        prompt_template = self._get_prompt_template()
-        final_prompt = prompt_template.format(question=query, context=context)
+        query_emb = None
+        if self.response_cache.semantic_threshold is not None:
+            query_emb = await self._aembed_for_retrieval(
+                query, config.RETRIEVAL_EMBED_TIMEOUT_SECONDS
+            )
+        code = self.response_cache.get_similar(query, model, version, query_emb)
+        return code, "semantic" if code is not None else None, query_emb
 
-        response = llm.invoke(final_prompt)
+    def _store_response(
+        self,
+        query: str,
+        snapshot: CorpusSnapshot,
+        code: str,
+        query_emb: Optional[np.ndarray],
+    ) -> None:
+        if self.response_cache is None or not code.strip():
+            return
+        if (
+            config.CODE_VALIDATION_ENABLED
+            and validate_code(code, config.CODE_ALLOWED_IMPORTS) is not None
+        ):
+            # It would only be rejected again on every replay
+            return
+        self.response_cache.put(
+            query, self.llm.model, snapshot.corpus_version, code, query_emb
+        )
+
+    async def run_inference(
+        self, request: InferenceRequest, snapshot: Optional[CorpusSnapshot] = None
+    ) -> InferenceResponse:
+        started = time.perf_counter()
+        query = request.prompt
+        snapshot = snapshot or self.snapshot
+
+        cached, tier, query_emb = await self._lookup_response(query, snapshot)
+        if cached is not None:
+            return InferenceResponse(
+                result=cached, corpus_version=snapshot.corpus_version, cache=tier
+            )
+
+        # Retrieve and pack examples into the prompt
+        final_prompt, prompt_tokens = await self._build_prompt(query, snapshot)
 
-        # Force extract a string from whatever comes out
-        if hasattr(response, "content"):
-            result_str = response.content
-        elif isinstance(response, str):
-            result_str = response
-        elif isinstance(response, list):
-            result_str = str(response[0]) if response else ""
+        if self.race is not None:
+            generated = await self.race.run(final_prompt)
         else:
-            result_str = str(response)
+            generated = await self.cascade.generate(final_prompt, started)
 
-        # Now Pylance will chill because it's strictly a str
-        return InferenceResponse(result=str(result_str))
+        self._store_response(query, snapshot, generated.code, query_emb)
+
+        return InferenceResponse(
+            result=generated.code,
+            prompt_tokens=prompt_tokens,
+            corpus_version=snapshot.corpus_version,
+            model=generated.model,
+        )
 
     async def run_inference_stream(
-        self, request: InferenceRequest
+        self, request: InferenceRequest, snapshot: Optional[CorpusSnapshot] = None
     ) -> AsyncGenerator[str, None]:
         """
         Streaming inference that yields code chunks
 
-        This method now properly handles streaming and error cases
+        This method now properly handles streaming and error cases. Pass the
+        ``snapshot`` whose version was reported to the client to retrieve from
+        exactly that corpus.
         """
         query = request.prompt
+        snapshot = snapshot or self.snapshot
 
         try:
-            # Retrieve top-k docs
-            top_k_docs = self._retrieve_top_k(query, self.documents, k=4)
-            context = "\n\n".join(doc.page_content for doc in top_k_docs)
-
-            # Prompt template
-            prompt_template = self._get_prompt_template()
-            final_prompt = prompt_template.format(question=query, context=context)
-
-            # Create callback for streaming
-            callback = CodeStreamCallback()
-
-            # Load LLM from config
-            llm = ChatOpenAI(
-                model=config.OPENAI_LLM,
-                temperature=0.1,
-                api_key=SecretStr(config.OPENAI_API_KEY),
-                base_url=config.OPENAI_API_BASE,
-                streaming=True,
-                callbacks=[callback],
-            )
-
-            # Start the LLM inference in a background task
-            async def _run_inference():
-                try:
-                    await llm.ainvoke(final_prompt)
-                except Exception as e:
-                    logger.error(f"LLM inference error: {str(e)}")
-                    await callback.put_custom_error(str(e))
-                finally:
-                    await callback.queue.put("__END__")
-
-            # Start the inference task
-            asyncio.create_task(_run_inference())
-
-            # Stream the results
-            async for token in callback.astream():
-                yield token
+            cached, tier, query_emb = await self._lookup_response(query, snapshot)
+            if cached is not None:
+                logger.info(f"Replaying {tier} cache hit for {query!r}")
+                # Same chunk events as a live generation, without the wait
+                for line in cached.splitlines(keepends=True):
+                    yield line
+                return
+
+            generate = self._generate_stream
+            if self.race is not None:
+                generate = self._race_stream
+            if self.generations is None:
+                stream = generate(query, snapshot, query_emb)
+            else:
+                # Identical requests in flight share one upstream generation
+                key = (self.llm.model, snapshot.corpus_version, normalize_prompt(query))
+                stream = self.generations.join(
+                    key, lambda: generate(query, snapshot, query_emb)
+                )
+            # Closing this stream (client gone) closes the generation under it
+            async with aclosing(stream):
+                async for token in stream:
+                    yield token
         except Exception as e:
             logger.error(f"Stream setup error: {str(e)}")
             yield f"{StreamMarkers.STREAM_ERROR} Stream setup error: {str(e)}"
             yield StreamMarkers.STREAM_END
 
+    async def _generate_stream(
+        self,
+        query: str,
+        snapshot: CorpusSnapshot,
+        query_emb: Optional[np.ndarray],
+    ) -> AsyncGenerator[str, None]:
+        """
+        One upstream LLM generation, streamed token by token. Closing the
+        generator before the end cancels the LLM call.
+        """
+        started = time.perf_counter()
+        # Retrieve and pack examples into the prompt
+        final_prompt, _ = await self._build_prompt(query, snapshot)
+
+        # Create callback for streaming
+        callback = CodeStreamCallback(maxsize=config.STREAM_QUEUE_SIZE)
+
+        # Start the LLM inference in a background task
+        async def _run_inference():
+            try:
+                await self.llm.ainvoke(
+                    final_prompt, callbacks=[callback], streaming=True
+                )
+            except Exception as e:
+                logger.error(f"LLM inference error: {str(e)}")
+                await callback.put_custom_error(str(e))
+
+        # Start the inference task
+        task = asyncio.create_task(_run_inference())
+
+        # Stream the results
+        chunks: list[str] = []
+        failed = False
+        finished = False
+        try:
+            async for token in callback.astream():
+                failed = failed or token.startswith(StreamMarkers.STREAM_ERROR)
+                chunks.append(token)
+                yield token
+            finished = True
+        finally:
+            self.stream_counts["code_tokens"] += callback.code_tokens
+            self.stream_counts["reasoning_tokens"] += callback.reasoning_tokens
+            if callback.first_code_at is not None:
+                self.time_to_first_code_token.record(callback.first_code_at - started)
+            if not finished:
+                task.cancel()
+                # Every chunk the provider sent so far is billed but unused
+                wasted = len(chunks) + callback.queue.qsize()
+                self.stream_counts["abandoned"] += 1
+                self.stream_counts["wasted_tokens"] += wasted
+                logger.info(f"Stream abandoned, cancelled LLM call ({wasted} tokens)")
+        self.stream_counts["completed"] += 1
+        if not failed:
+            self._store_response(query, snapshot, "".join(chunks), query_emb)
+
+    async def _race_stream(
+        self,
+        query: str,
+        snapshot: CorpusSnapshot,
+        query_emb: Optional[np.ndarray],
+    ) -> AsyncGenerator[str, None]:
+        """
+        The winning candidate of a race, streamed line by line once it is
+        chosen. Closing the generator cancels every candidate still running.
+        """
+        final_prompt, _ = await self._build_prompt(query, snapshot)
+        try:
+            winner = await self.race.run(final_prompt)
+        except Exception as e:
+            logger.error(f"Candidate race failed: {str(e)}")
+            yield f"{StreamMarkers.STREAM_ERROR} {str(e)}"
+            return
+        self._store_response(query, snapshot, winner.code, query_emb)
+        for line in winner.code.splitlines(keepends=True):
+            yield line
+
     async def generate_video_from_prompt(self, prompt: str) -> str:
+        started = time.perf_counter()
         # Use your own run_inference logic
         request = InferenceRequest(prompt=prompt)
         response = await self.run_inference(request)
 
-        script = response.result
-        video_path = render_manim_script(script)
-        return video_path
+        try:
+            # Scripts manim rejects go back to the model with the error
+            result = await self.render_repair.render(response.result, started)
+        except Exception:
+            # Don't keep serving code that fails to render
+            if self.response_cache is not None:
+                self.response_cache.discard(
+                    prompt, self.llm.model, response.corpus_version
+                )
+            raise
+        if result.attempts and self.response_cache is not None:
+            # Serve the working script, not the one that needed repair
+            self.response_cache.put(
+                prompt, self.llm.model, response.corpus_version, result.script
+            )
+        # It rendered, so it is a known-good example for similar prompts
+        self.add_generated_example(prompt, result.script)
+        return result.video_path
 
     def _get_prompt_template(self) -> PromptTemplate:
-        """Get the prompt template for code generation"""
+        """
+        Build the prompt template for code generation. Called once at startup;
+        requests format the cached ``self.prompt_template``.
+        """
         return PromptTemplate(
             input_variables=["question", "context"],
             template="""
@@ -0,0 +1,141 @@
+"""
+Edits to an existing script by the model.
+
+A follow-up in a chat ("make the circle red") usually changes a line or
+two of the script the chat already has. Instead of generating the whole
+script again, the model is shown the numbered script and answers with
+line-range edits (see ``app.utils.line_edits``), which are applied here.
+The reply is a fraction of the script's tokens, so the new code arrives
+far sooner. The render repair stage uses the same reply format.
+"""
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Iterable
+
+from langchain.prompts import PromptTemplate
+
+from app.services.code_validator import DEFAULT_ALLOWED_IMPORTS, validate_code
+from app.services.context_packer import TokenCounter
+from app.services.llm_client import LLMClient
+from app.services.model_cascade import response_text
+from app.utils.line_edits import (
+    LineEditError,
+    apply_line_edits,
+    has_line_edits,
+    number_lines,
+    parse_line_edits,
+)
+from app.utils.metrics import LatencyRecorder, ValueRecorder
+
+logger = logging.getLogger(__name__)
+
+EDIT_FORMAT = """Reply only with edits, no explanations or Markdown. Each edit is a
+header line "@@ first,last" followed by the lines that replace lines first to
+last (inclusive) of the script; "@@ n,n-1" inserts lines before line n."""
+
+EDIT_TEMPLATE = PromptTemplate(
+    input_variables=["script", "request"],
+    template="""You are changing a Manim Community v0.19 script as the user asks.
+
+Script (line numbers are not part of the code):
+{script}
+
+User request:
+{request}
+
+"""
+    + EDIT_FORMAT
+    + """ Keep
+everything the request does not mention and the script's indentation. Only
+if the user asks for a different animation altogether, reply with the
+complete new script instead of edits.
+""",
+)
+
+
+def apply_reply(
+    script: str,
+    reply: str,
+    allowed_imports: Iterable[str] = DEFAULT_ALLOWED_IMPORTS,
+) -> tuple[str, bool]:
+    """
+    The script after the model's ``reply``: its edits applied, or the
+    reply itself if it is a complete script. Returns (script, whether the
+    reply was edits); raises LineEditError if it is neither.
+    """
+    if has_line_edits(reply):
+        return apply_line_edits(script, parse_line_edits(reply)), True
+    if validate_code(reply, allowed_imports) is None:
+        return reply, False
+    raise LineEditError("reply contains neither edits nor a script")
+
+
+@dataclass
+class EditResult:
+    code: str
+    # False when the model rewrote the script instead
+    patched: bool
+
+
+class CodeEditor:
+    """Applies follow-up requests to a chat's script through model edits"""
+
+    def __init__(
+        self,
+        llm: LLMClient,
+        token_counter: TokenCounter,
+        allowed_imports: Iterable[str] = DEFAULT_ALLOWED_IMPORTS,
+    ):
+        self.llm = llm
+        self.token_counter = token_counter
+        self.allowed_imports = list(allowed_imports)
+
+        self.counts = {"requests": 0, "patched": 0, "rewritten": 0, "failed": 0}
+        self.failures_by_reason: dict[str, int] = {}
+        self.time_to_code = LatencyRecorder()
+        self.completion_tokens = ValueRecorder()
+        # Reply tokens per token of the resulting script; a full generation
+        # would be 1
+        self.output_token_ratio = ValueRecorder()
+
+    async def edit(self, script: str, request: str) -> EditResult:
+        """
+        ``script`` changed as ``request`` asks. Raises LineEditError, or
+        the LLM's error, when that fails; callers fall back to generating.
+        """
+        started = time.perf_counter()
+        self.counts["requests"] += 1
+        prompt = EDIT_TEMPLATE.format(script=number_lines(script), request=request)
+        try:
+            reply = response_text(await self.llm.ainvoke(prompt))
+            code, patched = apply_reply(script, reply, self.allowed_imports)
+            violation = validate_code(code, self.allowed_imports)
+            if violation is not None:
+                raise LineEditError(
+                    f"edited script breaks {violation.rule} at line {violation.line}"
+                )
+        except Exception as e:
+            reason = "edits" if isinstance(e, LineEditError) else "llm"
+            self.counts["failed"] += 1
+            self.failures_by_reason[reason] = self.failures_by_reason.get(reason, 0) + 1
+            raise
+
+        self.counts["patched" if patched else "rewritten"] += 1
+        self.time_to_code.record(time.perf_counter() - started)
+        reply_tokens = self.token_counter.count(reply)
+        self.completion_tokens.record(reply_tokens)
+        self.output_token_ratio.record(
+            reply_tokens / max(1, self.token_counter.count(code))
+        )
+        return EditResult(code, patched)
+
+    def stats(self) -> dict:
+        return {
+            **self.counts,
+            "failures_by_reason": dict(self.failures_by_reason),
+            "time_to_code": self.time_to_code.snapshot(),
+            "completion_tokens": self.completion_tokens.snapshot(),
+            "output_token_ratio": self.output_token_ratio.snapshot(),
+        }
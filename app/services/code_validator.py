@@ -0,0 +1,165 @@
+"""
+Incremental validation of generated Manim code.
+
+The prompt template asks for raw Python that imports only manim and math
+and defines ``GenScene``. Responses that break those rules never render,
+so they are checked while they stream, one complete line at a time: a
+violation is reported as soon as the line containing it ends, and the
+caller can abort the LLM call instead of paying for the rest. Python's own
+incremental compiler (``codeop``) tells a syntax error from code that is
+merely unfinished; since each check recompiles everything so far, it runs
+whenever the code has grown by an eighth, keeping the total cost linear.
+"""
+
+import codeop
+import re
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+DEFAULT_ALLOWED_IMPORTS = ("manim", "math")
+# The scaffold is run by manim, never as a program, so a main guard means
+# the script is over. Fences and imports are no stop: reasoning or prose in
+# front of the code ends with one, and stopping there would lose the code.
+SCAFFOLD_STOP_SEQUENCES = ("\nif __name__",)
+
+_IMPORT_RE = re.compile(r"^\s*import\s+(.+)$")
+_FROM_IMPORT_RE = re.compile(r"^\s*from\s+(\S+)\s+import\b")
+_SCENE_RE = re.compile(r"^class\s+GenScene\s*[(:]", re.MULTILINE)
+# A sentence rather than a statement: three or more plain words
+_PROSE_RE = re.compile(r"^[A-Za-z][A-Za-z']*(?:\s+[A-Za-z'`,.:;!?-]+){2,}$")
+
+
+@dataclass
+class Violation:
+    """A rule the generated code breaks, and the line where it shows"""
+
+    rule: str
+    line: int
+    detail: str
+
+
+def _imported_modules(line: str) -> list[str]:
+    """Top-level module names an import line imports"""
+    match = _FROM_IMPORT_RE.match(line)
+    if match:
+        return [match.group(1).split(".")[0]]
+    match = _IMPORT_RE.match(line)
+    if match:
+        names = match.group(1).split("#")[0].split(",")
+        return [name.split()[0].split(".")[0] for name in names if name.strip()]
+    return []
+
+
+class StreamingCodeValidator:
+    """
+    Validates one response as it streams. ``feed`` every chunk, then call
+    ``finish`` at the end; both return the first violation, if any. Checks
+    that need the whole response (the ``GenScene`` class, a truncated
+    statement) run in ``finish``.
+    """
+
+    def __init__(self, allowed_imports: Iterable[str] = DEFAULT_ALLOWED_IMPORTS):
+        self.allowed_imports = frozenset(allowed_imports)
+        self.source = ""
+        self.violation: Optional[Violation] = None
+        # Length of the prefix of ``source`` made of checked lines, and of
+        # the prefix last compiled
+        self._checked = 0
+        self._compiled = 0
+        self._lines = 0
+
+    def feed(self, chunk: str) -> Optional[Violation]:
+        if self.violation is not None:
+            return self.violation
+        self.source += chunk
+        if "\n" not in chunk:
+            return None
+        end = self.source.rfind("\n") + 1
+        for line in self.source[self._checked : end].splitlines():
+            self._lines += 1
+            self.violation = self._check_line(line, self._lines)
+            if self.violation is not None:
+                return self.violation
+        self._checked = end
+        if end - self._compiled >= end // 8:
+            self._compiled = end
+            self.violation = self._check_syntax(self.source[:end], complete=False)
+        return self.violation
+
+    def finish(self) -> Optional[Violation]:
+        if self.violation is not None:
+            return self.violation
+        if not self.source.endswith("\n"):
+            self.feed("\n")
+        if self.violation is None:
+            self.violation = self._check_syntax(self.source, complete=True)
+        if self.violation is None and not _SCENE_RE.search(self.source):
+            self.violation = Violation(
+                "missing_scene", self._lines, "no GenScene class defined"
+            )
+        return self.violation
+
+    def _check_line(self, line: str, number: int) -> Optional[Violation]:
+        if line.lstrip().startswith("```"):
+            return Violation("markdown_fence", number, line.strip())
+        for module in _imported_modules(line):
+            if module not in self.allowed_imports:
+                return Violation("forbidden_import", number, module)
+        return None
+
+    def _check_syntax(self, source: str, complete: bool) -> Optional[Violation]:
+        try:
+            if complete:
+                compile(source, "<generated>", "exec")
+            else:
+                # None (not an error) while a statement is still unfinished
+                codeop.compile_command(source, "<generated>", "exec")
+        except (SyntaxError, ValueError, OverflowError) as e:
+            number = getattr(e, "lineno", None) or self._lines
+            lines = source.splitlines()
+            text = lines[number - 1].strip() if 0 < number <= len(lines) else ""
+            rule = "prose" if _PROSE_RE.match(text) else "syntax"
+            return Violation(rule, number, text or str(e))
+        return None
+
+
+def validate_code(
+    code: str, allowed_imports: Iterable[str] = DEFAULT_ALLOWED_IMPORTS
+) -> Optional[Violation]:
+    """Check a complete response; the first violation, or None"""
+    validator = StreamingCodeValidator(allowed_imports)
+    validator.feed(code)
+    return validator.finish()
+
+
+class CodeValidationStats:
+    """Outcomes of validating generated code, with rejections per rule"""
+
+    def __init__(self):
+        self.counts = {"validated": 0, "passed": 0, "aborted": 0, "rejected": 0}
+        self.aborts_by_rule: dict[str, int] = {}
+        self.rejections_by_rule: dict[str, int] = {}
+
+    def record(self, violation: Optional[Violation], streaming: bool) -> None:
+        """
+        Count a finished check. A streaming violation is an early abort of
+        the LLM call; otherwise it is code rejected before rendering.
+        """
+        self.counts["validated"] += 1
+        if violation is None:
+            self.counts["passed"] += 1
+            return
+        if streaming:
+            self.counts["aborted"] += 1
+            by_rule = self.aborts_by_rule
+        else:
+            self.counts["rejected"] += 1
+            by_rule = self.rejections_by_rule
+        by_rule[violation.rule] = by_rule.get(violation.rule, 0) + 1
+
+    def stats(self) -> dict:
+        return {
+            **self.counts,
+            "aborts_by_rule": dict(self.aborts_by_rule),
+            "rejections_by_rule": dict(self.rejections_by_rule),
+        }
@@ -0,0 +1,159 @@
+"""
+Token-budgeted packing of retrieved examples into the RAG prompt.
+
+Retrieved examples are added in rank order until the context token budget
+is spent. Near-duplicates of an example already packed are skipped, since
+they cost prompt tokens (and provider latency) without telling the model
+anything new.
+"""
+
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Optional, Sequence
+
+from langchain_core.documents import Document
+
+from app.services.embedding_provider import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Rough token pieces for the fallback counter: words, numbers and single
+# punctuation characters, which tracks BPE counts of Python code closely
+_PIECE_RE = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+
+class TokenCounter:
+    """
+    Count tokens locally with a tiktoken encoding. If the encoding cannot be
+    loaded (tiktoken downloads it on first use), fall back to a regex
+    approximation so packing still works offline.
+    """
+
+    def __init__(self, encoding_name: str = "cl100k_base"):
+        self.encoding_name = encoding_name
+        self._encoding = None
+        try:
+            import tiktoken
+
+            self._encoding = tiktoken.get_encoding(encoding_name)
+        except Exception as e:
+            logger.warning(
+                f"Tokenizer {encoding_name} unavailable, approximating token "
+                f"counts: {e}"
+            )
+
+    @property
+    def exact(self) -> bool:
+        return self._encoding is not None
+
+    def count(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return len(_PIECE_RE.findall(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Longest prefix of whole lines within ``max_tokens``"""
+        kept: list[str] = []
+        used = 0
+        for line in text.splitlines(keepends=True):
+            cost = self.count(line)
+            if used + cost > max_tokens:
+                break
+            kept.append(line)
+            used += cost
+        return "".join(kept).rstrip()
+
+
+def shingles(text: str, size: int = 3) -> frozenset:
+    """Word n-grams of ``text``, insensitive to formatting and naming case"""
+    tokens = tokenize(text)
+    if len(tokens) < size:
+        return frozenset([tuple(tokens)])
+    return frozenset(tuple(tokens[i : i + size]) for i in range(len(tokens) - size + 1))
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int
+    documents: list[Document] = field(default_factory=list)
+    duplicates: int = 0
+    over_budget: int = 0
+    truncated: bool = False
+
+
+class ContextPacker:
+    """
+    Pack ranked documents into at most ``budget_tokens`` context tokens.
+
+    Documents that don't fit are skipped in favour of shorter lower-ranked
+    ones. Only when not even the best document fits is it truncated to whole
+    lines, so the prompt always carries at least one example.
+    """
+
+    def __init__(
+        self,
+        counter: TokenCounter,
+        budget_tokens: int,
+        max_documents: Optional[int] = None,
+        dedup_threshold: float = 0.85,
+        separator: str = "\n\n",
+    ):
+        self.counter = counter
+        self.budget_tokens = budget_tokens
+        self.max_documents = max_documents
+        self.dedup_threshold = dedup_threshold
+        self.separator = separator
+        self._separator_tokens = counter.count(separator)
+
+    def pack(
+        self,
+        documents: Sequence[Document],
+        budget_tokens: Optional[int] = None,
+        max_documents: Optional[int] = None,
+    ) -> PackedContext:
+        budget = self.budget_tokens if budget_tokens is None else budget_tokens
+        max_documents = max_documents or self.max_documents
+        packed = PackedContext(text="", tokens=0)
+        parts: list[str] = []
+        seen: list[frozenset] = []
+
+        for doc in documents:
+            if max_documents and len(parts) >= max_documents:
+                break
+            doc_shingles = shingles(doc.page_content)
+            if any(jaccard(doc_shingles, s) >= self.dedup_threshold for s in seen):
+                packed.duplicates += 1
+                continue
+
+            cost = self.counter.count(doc.page_content)
+            if parts:
+                cost += self._separator_tokens
+            if packed.tokens + cost > budget:
+                packed.over_budget += 1
+                continue
+
+            parts.append(doc.page_content)
+            seen.append(doc_shingles)
+            packed.documents.append(doc)
+            packed.tokens += cost
+
+        if not parts and documents and packed.over_budget:
+            best = documents[0]
+            text = self.counter.truncate(best.page_content, budget)
+            if text:
+                parts.append(text)
+                packed.documents.append(best)
+                packed.tokens = self.counter.count(text)
+                packed.over_budget -= 1
+                packed.truncated = True
+
+        packed.text = self.separator.join(parts)
+        return packed
@@ -0,0 +1,363 @@
+"""
+Self-growing example corpus.
+
+Prompt/code pairs that rendered successfully are queued, embedded in
+batches in the background and appended to the live example index (see
+``ChainManager.add_generated_example``). Entries are deduplicated by code
+hash and capped; when over the cap, the entries retrieved least often are
+evicted first. The curated mapping corpus is never evicted.
+
+Accepted entries and evictions are appended to a JSONL log, so restarts
+and other workers pick the grown corpus up again. Embeddings are kept out
+of the JSON: each logged batch is saved as an ``.npy`` matrix in a sidecar
+directory next to the log, and records point at their file and row.
+Once the log holds more than twice ``max_entries`` records, it is rewritten
+with only the live entries (and their embeddings as one matrix per
+dimension), so it stays bounded as entries come and go.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import ContextManager, Iterator, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.services.embedding_index import content_hash
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_code(code: str) -> str:
+    """Code with trailing whitespace and blank lines removed, for hashing"""
+    lines = (line.rstrip() for line in code.strip().splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+@dataclass
+class GeneratedExample:
+    title: str
+    content: str
+    hash: str
+    added_at: float = field(default_factory=time.time)
+    embedding: Optional[np.ndarray] = None
+    hits: int = 0
+
+    @property
+    def document(self) -> Document:
+        return Document(
+            page_content=self.content,
+            metadata={"title": self.title, "source": "generated", "hash": self.hash},
+        )
+
+
+@contextmanager
+def _file_lock(path: Path, operation: int) -> Iterator[None]:
+    """``flock`` on a lock file for the duration of a ``with`` block"""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT)
+    try:
+        fcntl.flock(fd, operation)
+        yield
+    finally:
+        os.close(fd)
+
+
+class CorpusGrowth:
+    """
+    Bookkeeping for generated examples: the pending queue, the live entries
+    (in index order) and the persistent log. Embedding and index updates are
+    done by the owner, which calls ``take_batch`` and ``commit``.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        provider_identity: str,
+        batch_size: int = 16,
+        log_path: Optional[Path | str] = None,
+        max_title_chars: int = 200,
+    ):
+        self.max_entries = max_entries
+        # Logged embeddings are only reused by the same embedding provider
+        self.provider_identity = provider_identity
+        self.batch_size = batch_size
+        self.log_path = Path(log_path) if log_path else None
+        # One .npy file per logged batch, named in the log records
+        self.vectors_dir = (
+            self.log_path.with_name(f"{self.log_path.name}.vectors")
+            if self.log_path
+            else None
+        )
+        self.max_title_chars = max_title_chars
+
+        self.pending: list[GeneratedExample] = []
+        self.entries: list[GeneratedExample] = []
+        self._lock = threading.Lock()
+        # Records in the log as last seen by this process
+        self._log_records = 0
+        self.stats = {
+            "accepted": 0,
+            "duplicates": 0,
+            "appended": 0,
+            "evicted": 0,
+            "batches": 0,
+            "failures": 0,
+            "compactions": 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def submit(self, prompt: str, code: str, known_hashes: set[str]) -> bool:
+        """
+        Queue a rendered generation. Returns False for duplicates of the
+        corpus, the live entries or the queue.
+        """
+        content = code.strip()
+        digest = content_hash(normalize_code(content))
+        with self._lock:
+            queued = {e.hash for e in self.pending} | {e.hash for e in self.entries}
+            if digest in known_hashes or digest in queued:
+                self.stats["duplicates"] += 1
+                return False
+            title = " ".join(prompt.split())[: self.max_title_chars]
+            self.pending.append(GeneratedExample(title, content, digest))
+            self.stats["accepted"] += 1
+        return True
+
+    def take_batch(self) -> list[GeneratedExample]:
+        with self._lock:
+            batch = self.pending[: self.batch_size]
+            del self.pending[: self.batch_size]
+        return batch
+
+    def commit(
+        self, batch: list[GeneratedExample], log: bool = True
+    ) -> list[GeneratedExample]:
+        """
+        Add embedded entries to the live set and evict down to the cap.
+        Returns the evicted entries.
+        """
+        with self._lock:
+            self.entries.extend(batch)
+            evicted = self._evict()
+            self.stats["appended"] += len(batch)
+            self.stats["evicted"] += len(evicted)
+            self.stats["batches"] += 1
+        if log:
+            self._append_log(batch, evicted)
+        return evicted
+
+    def retain(self, known_hashes: set[str]) -> None:
+        """Drop entries that a reloaded mapping now contains itself"""
+        with self._lock:
+            self.entries = [e for e in self.entries if e.hash not in known_hashes]
+
+    def record_hits(self, hashes: list[str]) -> None:
+        """Count generated examples that made it into a prompt"""
+        if not hashes:
+            return
+        wanted = set(hashes)
+        with self._lock:
+            for entry in self.entries:
+                if entry.hash in wanted:
+                    entry.hits += 1
+
+    def _evict(self) -> list[GeneratedExample]:
+        excess = len(self.entries) - self.max_entries
+        if excess <= 0:
+            return []
+        # Lowest value first: never retrieved, then oldest
+        ranked = sorted(self.entries, key=lambda e: (e.hits, e.added_at))
+        evicted = ranked[:excess]
+        gone = {e.hash for e in evicted}
+        self.entries = [e for e in self.entries if e.hash not in gone]
+        return evicted
+
+    def load(self) -> tuple[list[GeneratedExample], list[GeneratedExample]]:
+        """
+        Replay the log. Returns (entries with usable embeddings, entries to
+        embed again), newest ``max_entries`` only. Embeddings from another
+        provider are discarded.
+        """
+        if self.log_path is None or not self.log_path.exists():
+            return [], []
+
+        with self._log_lock(fcntl.LOCK_SH):
+            newest = self._read_log()
+            ours = [r for r in newest if r.get("provider") == self.provider_identity]
+            embeddings = self._read_vectors(ours)
+        examples = [
+            GeneratedExample(
+                title=record["title"],
+                content=record["content"],
+                hash=record["hash"],
+                added_at=record["added_at"],
+                embedding=embeddings.get(record["hash"]),
+            )
+            for record in newest
+        ]
+        ready = [e for e in examples if e.embedding is not None]
+        stale = [e for e in examples if e.embedding is None]
+        return ready, stale
+
+    def _read_log(self) -> list[dict]:
+        """The newest ``max_entries`` live records of the log, oldest first"""
+        live: dict[str, dict] = {}
+        records = 0
+        try:
+            f = open(self.log_path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return []
+        with f:
+            for line in f:
+                records += 1
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn write from a crashed process
+                if record.get("evicted"):
+                    live.pop(record["hash"], None)
+                else:
+                    live[record["hash"]] = record
+        self._log_records = records
+        return sorted(live.values(), key=lambda r: r["added_at"])[-self.max_entries :]
+
+    def _read_vectors(self, records: list[dict]) -> dict[str, np.ndarray]:
+        """
+        Embeddings of ``records`` by hash. Records whose vectors file is
+        missing or unreadable are left out, so they get embedded again.
+        """
+        matrices: dict[str, Optional[np.ndarray]] = {}
+        embeddings = {}
+        for record in records:
+            name = record.get("vectors")
+            if name is None:
+                continue
+            if name not in matrices:
+                try:
+                    matrices[name] = np.load(self.vectors_dir / name)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Ignoring generated example vectors {name}: {e}")
+                    matrices[name] = None
+            matrix = matrices[name]
+            row = record.get("row", -1)
+            if matrix is not None and 0 <= row < len(matrix):
+                embeddings[record["hash"]] = matrix[row].astype(np.float32)
+        return embeddings
+
+    def _save_vectors(self, embeddings: list[np.ndarray]) -> str:
+        """Save ``embeddings`` as one matrix; returns its file name"""
+        self.vectors_dir.mkdir(parents=True, exist_ok=True)
+        name = f"{uuid.uuid4().hex}.npy"
+        tmp_path = self.vectors_dir / f".{name}"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.vstack(embeddings).astype(np.float32))
+        os.replace(tmp_path, self.vectors_dir / name)
+        return name
+
+    def _log_lock(self, operation: int) -> ContextManager[None]:
+        """
+        Cross-process lock on the log: appends share it, compaction holds it
+        alone, since it replaces the file other workers append to
+        """
+        return _file_lock(
+            self.log_path.with_name(f".{self.log_path.name}.lock"), operation
+        )
+
+    def compact_log(self) -> None:
+        """
+        Rewrite the log with only its live records, and their embeddings
+        with only the live rows. Vectors files are removed only once the new
+        log no longer names them.
+        """
+        with self._log_lock(fcntl.LOCK_EX):
+            records = self._read_log()
+            embeddings = self._read_vectors(records)
+            by_dim: dict[int, list[dict]] = {}
+            for record in records:
+                record.pop("vectors", None)
+                record.pop("row", None)
+                if record["hash"] in embeddings:
+                    dim = len(embeddings[record["hash"]])
+                    by_dim.setdefault(dim, []).append(record)
+            for group in by_dim.values():
+                name = self._save_vectors([embeddings[r["hash"]] for r in group])
+                for row, record in enumerate(group):
+                    record["vectors"] = name
+                    record["row"] = row
+
+            tmp_path = self.log_path.with_name(f".{self.log_path.name}.{os.getpid()}")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(record) + "\n" for record in records)
+            os.replace(tmp_path, self.log_path)
+            self._log_records = len(records)
+
+            live = {record.get("vectors") for record in records}
+            for path in self.vectors_dir.glob("*.npy"):
+                if path.name not in live:
+                    path.unlink(missing_ok=True)
+        self.stats["compactions"] += 1
+        logger.info(f"Compacted generated examples log to {len(records)} records")
+
+    def _append_log(
+        self, batch: list[GeneratedExample], evicted: list[GeneratedExample]
+    ) -> None:
+        if self.log_path is None:
+            return
+        try:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            # The vectors file is written under the lock too, so compaction
+            # never sees (and removes) one whose records aren't logged yet
+            with self._log_lock(fcntl.LOCK_SH):
+                vectors = (
+                    self._save_vectors([e.embedding for e in batch]) if batch else None
+                )
+                lines = [
+                    json.dumps(
+                        {
+                            "title": e.title,
+                            "content": e.content,
+                            "hash": e.hash,
+                            "added_at": e.added_at,
+                            "provider": self.provider_identity,
+                            "vectors": vectors,
+                            "row": row,
+                        }
+                    )
+                    for row, e in enumerate(batch)
+                ]
+                lines += [
+                    json.dumps({"hash": e.hash, "evicted": True}) for e in evicted
+                ]
+                # One O_APPEND write per batch, so concurrent workers don't
+                # interleave
+                fd = os.open(self.log_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND)
+                try:
+                    os.write(fd, ("\n".join(lines) + "\n").encode("utf-8"))
+                finally:
+                    os.close(fd)
+            self._log_records += len(lines)
+            if self._log_records > 2 * self.max_entries:
+                self.compact_log()
+        except OSError as e:
+            logger.warning(f"Failed to persist generated examples: {e}")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            hits = sum(e.hits for e in self.entries)
+            return {
+                "entries": len(self.entries),
+                "pending": len(self.pending),
+                "max_entries": self.max_entries,
+                "hits": hits,
+                **self.stats,
+            }
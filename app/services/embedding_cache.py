@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCT_RE = re.compile(r"[\s.!?,;:]+$")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Canonical form of a prompt: lowercase, single spaces, no end punctuation"""
+    prompt = _WHITESPACE_RE.sub(" ", prompt.strip().lower())
+    return _TRAILING_PUNCT_RE.sub("", prompt)
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded cache of query embeddings keyed on (model id, normalized prompt).
+
+    Entries are evicted least-recently-used once ``max_entries`` is reached
+    and expire ``ttl_seconds`` after insertion. When ``persist_path`` is set
+    the cache is loaded from disk on creation and written back by ``save()``,
+    every ``persist_every`` inserts; on the event loop, in a worker thread.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 4096,
+        ttl_seconds: float = 86400,
+        persist_path: Optional[Path | str] = None,
+        persist_every: int = 64,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persist_path = Path(persist_path) if persist_path else None
+        self.persist_every = persist_every
+
+        # key -> (inserted_at wall-clock seconds, embedding)
+        self._entries: OrderedDict[tuple[str, str], tuple[float, np.ndarray]] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self._saving = False
+        # Saves run one at a time, so an older snapshot never lands last
+        self._save_lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        if self.persist_path:
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, prompt: str, model_id: str) -> Optional[np.ndarray]:
+        key = (model_id, normalize_prompt(prompt))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            inserted_at, embedding = entry
+            if time.time() - inserted_at > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+    def put(self, prompt: str, model_id: str, embedding: np.ndarray) -> None:
+        key = (model_id, normalize_prompt(prompt))
+        embedding = np.asarray(embedding, dtype=np.float32)
+        embedding.setflags(write=False)
+
+        with self._lock:
+            self._entries[key] = (time.time(), embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._unsaved += 1
+            should_save = (
+                self.persist_path
+                and self._unsaved >= self.persist_every
+                and not self._saving
+            )
+            if should_save:
+                self._saving = True
+
+        if should_save:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self.save()
+            else:
+                # Writing thousands of vectors would stall every stream
+                loop.run_in_executor(None, self.save)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def save(self) -> None:
+        """Write live entries to ``persist_path`` atomically"""
+        if not self.persist_path:
+            return
+
+        with self._save_lock:
+            with self._lock:
+                now = time.time()
+                live = [
+                    (key, inserted_at, emb)
+                    for key, (inserted_at, emb) in self._entries.items()
+                    if now - inserted_at <= self.ttl_seconds
+                ]
+                self._unsaved = 0
+                self._saving = False
+            try:
+                self.persist_path.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(
+                    dir=self.persist_path.parent, prefix=".query_cache.", suffix=".npz"
+                )
+                # Embeddings may differ in length across models, so store them
+                # flattened with per-entry lengths instead of as pickled objects
+                embeddings = [emb for _, _, emb in live]
+                with os.fdopen(fd, "wb") as f:
+                    np.savez(
+                        f,
+                        models=np.array([key[0] for key, _, _ in live], dtype=str),
+                        prompts=np.array([key[1] for key, _, _ in live], dtype=str),
+                        inserted_at=np.array([t for _, t, _ in live], dtype=np.float64),
+                        lengths=np.array([len(e) for e in embeddings], dtype=np.int64),
+                        embeddings=(
+                            np.concatenate(embeddings)
+                            if embeddings
+                            else np.empty(0, dtype=np.float32)
+                        ),
+                    )
+                os.replace(tmp_path, self.persist_path)
+            except OSError as e:
+                logger.warning(f"Failed to persist query embedding cache: {e}")
+
+    def load(self) -> None:
+        """Warm the cache from ``persist_path``, dropping expired entries"""
+        if not self.persist_path or not self.persist_path.exists():
+            return
+
+        try:
+            with np.load(self.persist_path) as data:
+                offsets = np.cumsum(data["lengths"])[:-1]
+                rows = zip(
+                    data["models"].tolist(),
+                    data["prompts"].tolist(),
+                    data["inserted_at"].tolist(),
+                    np.split(data["embeddings"], offsets),
+                )
+                now = time.time()
+                with self._lock:
+                    for model_id, prompt, inserted_at, emb in rows:
+                        if now - inserted_at > self.ttl_seconds:
+                            continue
+                        emb = np.asarray(emb, dtype=np.float32)
+                        emb.setflags(write=False)
+                        self._entries[(model_id, prompt)] = (inserted_at, emb)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            logger.info(f"Loaded {len(self._entries)} cached query embeddings")
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Failed to load query embedding cache: {e}")
@@ -0,0 +1,301 @@
+"""
+Offline embedding index for the RAG example corpus.
+
+The corpus in ``cleaned_index_mapping.json`` is embedded once by the build
+command below and stored as a versioned artifact:
+
+    embedding_index/
+        manifest.json                   # provider, model, dim, hashes, version
+        embeddings-<corpus_version>.npy # float32 matrix, one row per entry
+
+Workers load the artifact at startup and only re-embed entries whose content
+hash is not in the manifest.
+
+The optional Manim documentation corpus (``cleaned_manim_doc_mapping.json``)
+is built the same way into ``embedding_index/docs/``.
+
+Usage:
+    python -m app.services.embedding_index build [--force] [--corpus docs]
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+from core.config import config
+
+from app.services.embedding_provider import (
+    EmbeddingProvider,
+    HashingEmbeddingProvider,
+    create_embedding_provider,
+)
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 2
+MANIFEST_FILENAME = "manifest.json"
+
+
+class EmbeddingIndexError(Exception):
+    """Raised when the embedding artifact is missing, corrupt or incompatible"""
+
+    pass
+
+
+@dataclass
+class EmbeddingIndex:
+    """Document embedding matrix plus the manifest that describes it"""
+
+    embeddings: np.ndarray  # shape (n, dim), float32
+    hashes: list[str]
+    provider: str
+    model_id: str
+    corpus_version: str
+    built_at: str
+
+    @property
+    def dim(self) -> int:
+        return int(self.embeddings.shape[1]) if self.embeddings.ndim == 2 else 0
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def check_compatible(self, provider: EmbeddingProvider) -> None:
+        """Raise if this index was not built in ``provider``'s vector space"""
+        if (self.provider, self.model_id) != (provider.name, provider.model_id):
+            raise EmbeddingIndexError(
+                f"Index was built by {self.provider}:{self.model_id}, "
+                f"but the configured provider is {provider.identity}"
+            )
+        if len(self) and self.dim != provider.dim:
+            raise EmbeddingIndexError(
+                f"Index dimension {self.dim} does not match provider "
+                f"dimension {provider.dim}"
+            )
+
+
+def content_hash(text: str) -> str:
+    """Stable hash of a corpus entry's content"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def compute_corpus_version(hashes: list[str]) -> str:
+    """Short digest identifying an ordered set of content hashes"""
+    digest = hashlib.sha256("\n".join(hashes).encode("utf-8")).hexdigest()
+    return digest[:12]
+
+
+def load_corpus(mapping_path: Path | str) -> list[dict]:
+    """Load a corpus mapping (list of {"title", "content"} entries)"""
+    with open(mapping_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def sync_index(
+    texts: list[str],
+    previous: Optional[EmbeddingIndex],
+    provider: EmbeddingProvider,
+) -> tuple[EmbeddingIndex, int]:
+    """
+    Build an index for ``texts``, reusing rows from ``previous`` whose content
+    hash is unchanged. Rows are only reused if ``previous`` was built by the
+    same provider. Returns the index and the number of re-embedded entries.
+    """
+    hashes = [content_hash(t) for t in texts]
+
+    reusable: dict[str, int] = {}
+    if previous is not None:
+        try:
+            previous.check_compatible(provider)
+            reusable = {h: i for i, h in enumerate(previous.hashes)}
+        except EmbeddingIndexError as e:
+            logger.warning(f"Not reusing embedding index: {e}")
+
+    stale = [i for i, h in enumerate(hashes) if h not in reusable]
+    fresh = provider.embed_documents([texts[i] for i in stale]) if stale else None
+
+    embeddings = np.empty((len(texts), provider.dim), dtype=np.float32)
+    for i, h in enumerate(hashes):
+        if h in reusable:
+            embeddings[i] = previous.embeddings[reusable[h]]  # type: ignore[union-attr]
+    if fresh is not None:
+        embeddings[stale] = fresh
+
+    index = EmbeddingIndex(
+        embeddings=embeddings,
+        hashes=hashes,
+        provider=provider.name,
+        model_id=provider.model_id,
+        corpus_version=compute_corpus_version(hashes),
+        built_at=datetime.now(timezone.utc).isoformat(),
+    )
+    return index, len(stale)
+
+
+def save_index(index: EmbeddingIndex, directory: Path | str) -> Path:
+    """
+    Write the artifact. The matrix file is named after the corpus version and
+    the manifest is replaced atomically last, so readers never observe a
+    manifest pointing at a half-written matrix.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    matrix_name = f"embeddings-{index.corpus_version}.npy"
+    _atomic_write(
+        directory / matrix_name,
+        lambda f: np.save(f, np.ascontiguousarray(index.embeddings)),
+    )
+
+    manifest = {
+        "format_version": INDEX_FORMAT_VERSION,
+        "provider": index.provider,
+        "model": index.model_id,
+        "dim": index.dim,
+        "count": len(index),
+        "corpus_version": index.corpus_version,
+        "built_at": index.built_at,
+        "matrix": matrix_name,
+        "hashes": index.hashes,
+    }
+    manifest_path = directory / MANIFEST_FILENAME
+    _atomic_write(
+        manifest_path,
+        lambda f: f.write(json.dumps(manifest, indent=2).encode("utf-8")),
+    )
+
+    # Remove matrices from older versions
+    for old in directory.glob("embeddings-*.npy"):
+        if old.name != matrix_name:
+            try:
+                old.unlink()
+            except OSError as e:
+                logger.warning(f"Failed to remove old matrix {old}: {e}")
+
+    return manifest_path
+
+
+def load_index(directory: Path | str) -> Optional[EmbeddingIndex]:
+    """Load the artifact, or return None if it has not been built yet"""
+    manifest_path = Path(directory) / MANIFEST_FILENAME
+    if not manifest_path.exists():
+        return None
+
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format_version") != INDEX_FORMAT_VERSION:
+            raise EmbeddingIndexError(
+                f"Unsupported index format {manifest.get('format_version')}"
+            )
+        embeddings = np.load(Path(directory) / manifest["matrix"])
+    except (OSError, ValueError, KeyError) as e:
+        raise EmbeddingIndexError(f"Failed to load embedding index: {e}") from e
+
+    if (
+        embeddings.dtype != np.float32
+        or embeddings.ndim != 2
+        or embeddings.shape[0] != len(manifest["hashes"])
+        or embeddings.shape[1] != manifest["dim"]
+    ):
+        raise EmbeddingIndexError("Embedding matrix does not match its manifest")
+
+    return EmbeddingIndex(
+        embeddings=embeddings,
+        hashes=manifest["hashes"],
+        provider=manifest["provider"],
+        model_id=manifest["model"],
+        corpus_version=manifest["corpus_version"],
+        built_at=manifest["built_at"],
+    )
+
+
+def _atomic_write(path: Path, write: Callable) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def corpus_paths(corpus: str) -> tuple[Path, Path]:
+    """(mapping file, index directory) of the "examples" or "docs" corpus"""
+    if corpus == "examples":
+        return config.INDEX_MAPPING_PATH, config.EMBEDDING_INDEX_DIR
+    if corpus == "docs":
+        return config.DOCS_MAPPING_PATH, config.DOCS_EMBEDDING_INDEX_DIR
+    raise ValueError(f"Unknown corpus: {corpus}")
+
+
+def build(
+    force: bool = False,
+    provider_name: Optional[str] = None,
+    corpus: str = "examples",
+) -> EmbeddingIndex:
+    """Embed the corpus (incrementally unless ``force``) and write the artifact"""
+    mapping_path, index_dir = corpus_paths(corpus)
+    entries = load_corpus(mapping_path)
+    texts = [entry["content"] for entry in entries]
+
+    provider = create_embedding_provider(provider_name)
+    if isinstance(provider, HashingEmbeddingProvider):
+        # Weights are always learned from the examples, as at serving time
+        examples = load_corpus(config.INDEX_MAPPING_PATH)
+        provider.fit([entry["content"] for entry in examples])
+
+    previous = None
+    if not force:
+        try:
+            previous = load_index(index_dir)
+        except EmbeddingIndexError as e:
+            logger.warning(f"Ignoring existing index: {e}")
+
+    index, embedded = sync_index(texts, previous, provider)
+    save_index(index, index_dir)
+    logger.info(
+        f"Built {corpus} {provider.identity} index {index.corpus_version}: "
+        f"{len(index)} entries, {embedded} embedded, "
+        f"{len(index) - embedded} reused"
+    )
+    return index
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Manage the RAG embedding index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_parser = sub.add_parser("build", help="Embed the corpus and write it")
+    build_parser.add_argument(
+        "--force", action="store_true", help="Re-embed every entry"
+    )
+    build_parser.add_argument(
+        "--provider", help="Embedding provider (default: EMBEDDING_PROVIDER)"
+    )
+    build_parser.add_argument(
+        "--corpus",
+        choices=["examples", "docs"],
+        default="examples",
+        help="Corpus to embed (default: examples)",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    if args.command == "build":
+        build(force=args.force, provider_name=args.provider, corpus=args.corpus)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
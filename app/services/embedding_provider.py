@@ -0,0 +1,380 @@
+import asyncio
+import hashlib
+import logging
+import re
+import zlib
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import httpx
+import numpy as np
+from core.config import config
+from google import generativeai as genai
+
+logger = logging.getLogger(__name__)
+
+# pyright: reportPrivateImportUsage=false
+
+GEMINI_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
+
+# Output dimension of known Gemini embedding models
+GEMINI_MODEL_DIMS = {
+    "models/embedding-001": 768,
+    "models/text-embedding-004": 768,
+    "models/gemini-embedding-001": 3072,
+}
+
+
+class EmbeddingError(Exception):
+    """Raised when an embedding request fails"""
+
+    pass
+
+
+class EmbeddingProvider(ABC):
+    """
+    Abstract base class for embedding backends.
+
+    ``name`` and ``model_id`` identify the vector space; an index built by one
+    provider must never be searched with query vectors from another.
+    """
+
+    name: str
+    model_id: str
+
+    @property
+    @abstractmethod
+    def dim(self) -> int:
+        """Dimension of the produced vectors"""
+        pass
+
+    @property
+    def identity(self) -> str:
+        return f"{self.name}:{self.model_id}"
+
+    @abstractmethod
+    def embed_documents(self, texts: list[str]) -> np.ndarray:
+        """Embed corpus entries, returning a (n, dim) float32 matrix"""
+        pass
+
+    @abstractmethod
+    def embed_query(self, text: str) -> np.ndarray:
+        """Embed a single query"""
+        pass
+
+    def embed_queries(self, texts: list[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.vstack([self.embed_query(t) for t in texts])
+
+    async def aembed_query(self, text: str) -> np.ndarray:
+        """Query embedding for the request path; inline for in-process backends"""
+        return self.embed_query(text)
+
+    async def aembed_queries(self, texts: list[str]) -> np.ndarray:
+        return self.embed_queries(texts)
+
+    async def aclose(self) -> None:
+        """Release connections or threads held by the provider"""
+        pass
+
+
+class GeminiEmbeddingProvider(EmbeddingProvider):
+    """
+    Gemini embeddings with a non-blocking path for the request handlers.
+
+    ``aembed_query`` never runs the synchronous SDK on the event loop. In
+    "http" mode it calls the REST API through a pooled ``httpx.AsyncClient``
+    with a per-call timeout; in "thread" mode it offloads the SDK call to a
+    bounded thread pool.
+    """
+
+    name = "gemini"
+
+    def __init__(
+        self,
+        model_id: Optional[str] = None,
+        async_mode: Optional[str] = None,
+        timeout: Optional[float] = None,
+        max_connections: Optional[int] = None,
+        max_threads: Optional[int] = None,
+    ):
+        self.model_id = model_id or config.EMBEDDING_MODEL
+        self.async_mode = (async_mode or config.EMBEDDING_ASYNC_MODE).lower()
+        self.timeout = timeout or config.EMBEDDING_TIMEOUT_SECONDS
+        self.max_connections = max_connections or config.EMBEDDING_MAX_CONNECTIONS
+        self.max_threads = max_threads or config.EMBEDDING_THREADS
+
+        if self.async_mode not in ("http", "thread"):
+            raise ValueError(f"Unsupported embedding async mode: {self.async_mode}")
+        if self.model_id not in GEMINI_MODEL_DIMS:
+            raise ValueError(f"Unknown Gemini embedding model: {self.model_id}")
+
+        genai.configure(api_key=config.GEMINI_API_KEY)
+
+        # Created lazily so each forked worker opens its own connections
+        self._client: Optional[httpx.AsyncClient] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def dim(self) -> int:
+        return GEMINI_MODEL_DIMS[self.model_id]
+
+    def embed_documents(self, texts: list[str]) -> np.ndarray:
+        """Blocking, batched corpus embedding through the SDK"""
+        return self._embed_batched(texts, "retrieval_document")
+
+    def embed_queries(self, texts: list[str]) -> np.ndarray:
+        return self._embed_batched(texts, "retrieval_query")
+
+    def embed_query(self, text: str) -> np.ndarray:
+        """Blocking query embedding through the SDK (offline jobs only)"""
+        return self._embed_batched([text], "retrieval_query")[0]
+
+    def _embed_batched(self, texts: list[str], task_type: str) -> np.ndarray:
+        batch_size = config.EMBEDDING_BATCH_SIZE
+        rows: list[list[float]] = []
+        try:
+            for start in range(0, len(texts), batch_size):
+                res = genai.embed_content(
+                    model=self.model_id,
+                    content=texts[start : start + batch_size],
+                    task_type=task_type,
+                    title="RAG chunk" if task_type == "retrieval_document" else None,
+                )
+                rows.extend(res["embedding"])
+                if len(texts) > batch_size:
+                    logger.info(
+                        f"Embedded {min(start + batch_size, len(texts))}/{len(texts)}"
+                    )
+        except Exception as e:
+            raise EmbeddingError(f"Gemini embedding failed: {e}") from e
+        return np.asarray(rows, dtype=np.float32).reshape(len(texts), self.dim)
+
+    async def aembed_query(self, text: str) -> np.ndarray:
+        if self.async_mode == "thread":
+            loop = asyncio.get_running_loop()
+            try:
+                return await asyncio.wait_for(
+                    loop.run_in_executor(self._get_executor(), self.embed_query, text),
+                    self.timeout,
+                )
+            except asyncio.TimeoutError as e:
+                raise EmbeddingError("Gemini embedding timed out") from e
+
+        data = await self._post("embedContent", self._request_body(text))
+        try:
+            return np.array(data["embedding"]["values"], dtype=np.float32)
+        except (KeyError, TypeError) as e:
+            raise EmbeddingError(f"Unexpected embedding response: {e}") from e
+
+    async def aembed_queries(self, texts: list[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, self.dim), dtype=np.float32)
+        if self.async_mode == "thread":
+            rows = await asyncio.gather(*(self.aembed_query(t) for t in texts))
+            return np.vstack(rows)
+
+        values: list[list[float]] = []
+        batch_size = config.EMBEDDING_BATCH_SIZE
+        for start in range(0, len(texts), batch_size):
+            body = {
+                "requests": [
+                    self._request_body(t) for t in texts[start : start + batch_size]
+                ]
+            }
+            data = await self._post("batchEmbedContents", body)
+            values.extend(e["values"] for e in data["embeddings"])
+        return np.asarray(values, dtype=np.float32)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _request_body(self, text: str) -> dict:
+        return {
+            "model": self.model_id,
+            "content": {"parts": [{"text": text}]},
+            "taskType": "RETRIEVAL_QUERY",
+        }
+
+    async def _post(self, method: str, body: dict) -> dict:
+        url = f"{GEMINI_API_BASE}/{self.model_id}:{method}"
+        try:
+            response = await self._get_client().post(url, json=body)
+            response.raise_for_status()
+            return response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            raise EmbeddingError(f"Gemini embedding failed: {e}") from e
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers={"x-goog-api-key": config.GEMINI_API_KEY},
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_threads, thread_name_prefix="embed"
+            )
+        return self._executor
+
+
+_TOKEN_RE = re.compile(r"[A-Za-z]+|\d+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase word tokens; identifiers like MoveToTarget or move_to split"""
+    tokens = []
+    for word in _TOKEN_RE.findall(re.sub(r"([a-z])([A-Z])", r"\1 \2", text)):
+        tokens.append(word.lower())
+    return tokens
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Hashed TF-IDF projection, computed in-process in microseconds.
+
+    Unigrams and bigrams are hashed into ``dim`` signed buckets with
+    sublinear term frequency. ``fit`` learns per-bucket IDF weights from the
+    corpus; the IDF digest is part of ``model_id`` so an index built with
+    different weights is never reused.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: Optional[int] = None):
+        self._dim = dim or config.HASHING_EMBEDDING_DIM
+        self.idf = np.ones(self._dim, dtype=np.float32)
+        self.model_id = f"tfidf-{self._dim}-unfitted"
+
+    @property
+    def dim(self) -> int:
+        return self._dim
+
+    def fit(self, texts: list[str]) -> "HashingEmbeddingProvider":
+        doc_freq = np.zeros(self._dim, dtype=np.float32)
+        for text in texts:
+            buckets, _ = self._hash_features(text)
+            doc_freq[np.unique(buckets)] += 1
+        self.idf = np.log((1 + len(texts)) / (1 + doc_freq)).astype(np.float32) + 1
+        digest = hashlib.sha256(self.idf.tobytes()).hexdigest()[:8]
+        self.model_id = f"tfidf-{self._dim}-{digest}"
+        return self
+
+    def embed_documents(self, texts: list[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, self._dim), dtype=np.float32)
+        return np.vstack([self.embed_query(t) for t in texts])
+
+    def embed_query(self, text: str) -> np.ndarray:
+        buckets, signs = self._hash_features(text)
+        vector = np.zeros(self._dim, dtype=np.float32)
+        if len(buckets):
+            counts = np.zeros(self._dim, dtype=np.float32)
+            np.add.at(counts, buckets, signs)
+            tf = np.sign(counts) * (1 + np.log(np.maximum(np.abs(counts), 1)))
+            vector = np.where(counts != 0, tf, 0).astype(np.float32) * self.idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _hash_features(self, text: str) -> tuple[np.ndarray, np.ndarray]:
+        tokens = tokenize(text)
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        hashes = np.fromiter(
+            (zlib.crc32(f.encode("utf-8")) for f in features),
+            dtype=np.uint32,
+            count=len(features),
+        )
+        buckets = (hashes % self._dim).astype(np.int64)
+        signs = np.where((hashes >> 31) & 1, -1.0, 1.0).astype(np.float32)
+        return buckets, signs
+
+
+class SentenceTransformerEmbeddingProvider(EmbeddingProvider):
+    """
+    Small local transformer (default all-MiniLM-L6-v2, 384-d, the model the
+    shipped FAISS indexes match), optionally through ONNX Runtime.
+    """
+
+    name = "sentence-transformers"
+
+    def __init__(self, model_id: Optional[str] = None, onnx: bool = False):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise EmbeddingError(
+                "Local embeddings require sentence-transformers "
+                "(pip install sentence-transformers)"
+            ) from e
+
+        self.model_id = model_id or config.LOCAL_EMBEDDING_MODEL
+        kwargs = {"backend": "onnx"} if onnx else {}
+        self.model = SentenceTransformer(self.model_id, device="cpu", **kwargs)
+        self._dim = int(self.model.get_sentence_embedding_dimension())
+
+    @property
+    def dim(self) -> int:
+        return self._dim
+
+    def embed_documents(self, texts: list[str]) -> np.ndarray:
+        return self._encode(texts)
+
+    def embed_queries(self, texts: list[str]) -> np.ndarray:
+        return self._encode(texts)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self._encode([text])[0]
+
+    async def aembed_query(self, text: str) -> np.ndarray:
+        # A few ms of CPU; keep it off the loop so other streams keep flowing
+        return await asyncio.to_thread(self.embed_query, text)
+
+    async def aembed_queries(self, texts: list[str]) -> np.ndarray:
+        return await asyncio.to_thread(self.embed_queries, texts)
+
+    def _encode(self, texts: list[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, self._dim), dtype=np.float32)
+        try:
+            vectors = self.model.encode(
+                texts,
+                batch_size=config.EMBEDDING_BATCH_SIZE,
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+            )
+        except Exception as e:
+            raise EmbeddingError(f"Local embedding failed: {e}") from e
+        return np.asarray(vectors, dtype=np.float32)
+
+
+def create_embedding_provider(name: Optional[str] = None) -> EmbeddingProvider:
+    """
+    Create an embedding provider
+
+    Args:
+        name: 'gemini', 'hashing', 'sentence-transformers' or 'onnx'
+            (defaults to config.EMBEDDING_PROVIDER)
+    """
+    name = (name or config.EMBEDDING_PROVIDER).lower()
+    if name == "gemini":
+        return GeminiEmbeddingProvider()
+    elif name == "hashing":
+        return HashingEmbeddingProvider()
+    elif name == "sentence-transformers":
+        return SentenceTransformerEmbeddingProvider()
+    elif name == "onnx":
+        return SentenceTransformerEmbeddingProvider(onnx=True)
+    raise ValueError(f"Unsupported embedding provider: {name}")
@@ -0,0 +1,106 @@
+import logging
+from collections import Counter, defaultdict
+from typing import Optional
+
+import numpy as np
+
+from app.services.embedding_provider import tokenize
+from app.services.vector_store import top_k_indices
+
+logger = logging.getLogger(__name__)
+
+
+class BM25Index:
+    """
+    In-memory BM25 inverted index over example titles and code.
+
+    Postings are stored as compact NumPy arrays (CSR layout), so scoring a
+    query touches only the documents that contain its terms. Title terms are
+    counted ``title_weight`` times, since titles describe what the example
+    draws ("circle", "rotate", "graph") far better than the code does.
+    """
+
+    def __init__(
+        self,
+        contents: list[str],
+        titles: Optional[list[str]] = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+        title_weight: int = 3,
+    ):
+        self.k1 = k1
+        self.b = b
+        titles = titles or [""] * len(contents)
+
+        postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        doc_lengths = np.zeros(len(contents), dtype=np.float32)
+        for doc_id, (title, content) in enumerate(zip(titles, contents)):
+            counts = Counter(tokenize(content))
+            for term in tokenize(title):
+                counts[term] += title_weight
+            doc_lengths[doc_id] = sum(counts.values())
+            for term, tf in counts.items():
+                postings[term].append((doc_id, tf))
+
+        self.n_docs = len(contents)
+        self.avg_length = float(doc_lengths.mean()) if self.n_docs else 0.0
+        self._length_norm = (
+            1 - b + b * doc_lengths / self.avg_length
+            if self.avg_length
+            else doc_lengths
+        )
+
+        self.vocab: dict[str, int] = {}
+        indptr = [0]
+        doc_ids: list[int] = []
+        tfs: list[int] = []
+        for term, entries in postings.items():
+            self.vocab[term] = len(self.vocab)
+            doc_ids.extend(d for d, _ in entries)
+            tfs.extend(tf for _, tf in entries)
+            indptr.append(len(doc_ids))
+        self._indptr = np.asarray(indptr, dtype=np.int64)
+        self._doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        self._tfs = np.asarray(tfs, dtype=np.float32)
+
+        doc_freq = np.diff(self._indptr).astype(np.float32)
+        self._idf = np.log(1 + (self.n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    def __len__(self) -> int:
+        return self.n_docs
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for ``query``"""
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            row = self.vocab.get(term)
+            if row is None:
+                continue
+            start, end = self._indptr[row], self._indptr[row + 1]
+            ids = self._doc_ids[start:end]
+            tf = self._tfs[start:end]
+            denom = tf + self.k1 * self._length_norm[ids]
+            scores[ids] += self._idf[row] * tf * (self.k1 + 1) / denom
+        return scores
+
+    def search(self, query: str, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Top-k (scores, ids), best first; documents without a match are omitted"""
+        scores = self.scores(query)
+        ids = top_k_indices(scores, k)
+        ids = ids[scores[ids] > 0]
+        return scores[ids], ids
+
+
+def reciprocal_rank_fusion(
+    rankings: list[list[int]], k: int = 60, weights: Optional[list[float]] = None
+) -> list[tuple[int, float]]:
+    """
+    Merge ranked id lists with reciprocal rank fusion: each list contributes
+    ``weight / (k + rank)`` per id. Returns (id, score) pairs, best first.
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused: dict[int, float] = defaultdict(float)
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] += weight / (k + rank)
+    return sorted(fused.items(), key=lambda item: (-item[1], item[0]))
@@ -0,0 +1,233 @@
+"""
+Process-wide chat model client.
+
+Each worker keeps one ``ChatOpenAI`` (plus a streaming twin) on top of one
+pooled ``httpx.AsyncClient``, so requests reuse warm keep-alive connections
+to the LLM API instead of paying DNS, TCP and TLS setup before every
+generation. Per-request callbacks are passed at call time through the
+runnable config rather than by building a new model.
+
+Connection reuse and connect/TLS handshake timings are collected with
+httpcore's ``trace`` request extension.
+"""
+
+import logging
+import time
+from typing import Any, Optional
+
+import httpx
+from core.config import config
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_openai import ChatOpenAI
+from pydantic.v1 import SecretStr  # This is from Pydantic v1 compat mode
+
+from app.services.code_validator import SCAFFOLD_STOP_SEQUENCES
+from app.services.reasoning_filter import reasoning_options
+from app.utils.metrics import LatencyRecorder
+
+logger = logging.getLogger(__name__)
+
+
+class LLMClient:
+    """
+    Long-lived chat model client for one worker.
+
+    The HTTP pool and models are created lazily, so each forked worker opens
+    its own connections, and released by ``aclose`` from the app lifespan.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        api_key: str,
+        base_url: str,
+        temperature: float = 0.1,
+        max_connections: int = 20,
+        keepalive_seconds: float = 60.0,
+        connect_timeout: float = 10.0,
+        timeout: float = 120.0,
+        max_tokens: Optional[int] = None,
+        stop: Optional[list[str]] = None,
+        reasoning: Optional[dict] = None,
+    ):
+        """
+        ``max_tokens`` and ``stop`` bound every generation; ``reasoning``
+        is sent as the provider's ``reasoning`` parameter when given.
+        """
+        self.model = model
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.temperature = temperature
+        self.max_connections = max_connections
+        self.keepalive_seconds = keepalive_seconds
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+        self.max_tokens = max_tokens
+        self.stop = stop or []
+        self.reasoning = reasoning or {}
+
+        self._http: Optional[httpx.AsyncClient] = None
+        self._models: dict[tuple[str, float, bool], ChatOpenAI] = {}
+
+        self.counts = {
+            "requests": 0,
+            "new_connections": 0,
+            "reused_connections": 0,
+            "connect_failures": 0,
+        }
+        self.connect_latency = LatencyRecorder()
+        self.tls_handshake_latency = LatencyRecorder()
+
+    def chat(
+        self,
+        streaming: bool = False,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+    ) -> ChatOpenAI:
+        """
+        The shared model, or another ``model`` or ``temperature`` on the same
+        API; all of them, streaming or not, share one connection pool
+        """
+        if temperature is None:
+            temperature = self.temperature
+        key = (model or self.model, temperature, streaming)
+        if key not in self._models:
+            self._models[key] = ChatOpenAI(
+                model=key[0],
+                temperature=temperature,
+                max_tokens=self.max_tokens,
+                model_kwargs=self._request_options(),
+                api_key=SecretStr(self.api_key),
+                base_url=self.base_url,
+                streaming=streaming,
+                http_async_client=self._get_http_client(),
+            )
+        return self._models[key]
+
+    async def ainvoke(
+        self,
+        prompt: str,
+        callbacks: Optional[list[BaseCallbackHandler]] = None,
+        streaming: bool = False,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+    ) -> BaseMessage:
+        """Run one generation, with ``callbacks`` scoped to this call only"""
+        return await self.chat(streaming, model, temperature).ainvoke(
+            prompt, config={"callbacks": callbacks} if callbacks else None
+        )
+
+    def _request_options(self) -> dict:
+        options: dict[str, Any] = {}
+        if self.stop:
+            options["stop"] = self.stop
+        if self.reasoning:
+            # Not an OpenAI parameter, so it goes in the raw request body
+            options["extra_body"] = {"reasoning": self.reasoning}
+        return options
+
+    async def warm_up(self) -> None:
+        """
+        Open a pooled connection ahead of the first request. Any response
+        will do; only the TCP and TLS setup matters.
+        """
+        try:
+            response = await self._get_http_client().head(
+                f"{self.base_url}/models",
+                headers={"Authorization": f"Bearer {self.api_key}"},
+            )
+            logger.info(f"LLM connection warmed up (HTTP {response.status_code})")
+        except httpx.HTTPError as e:
+            logger.warning(f"LLM connection warm-up failed: {e}")
+
+    async def aclose(self) -> None:
+        self._models.clear()
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model,
+            "max_tokens": self.max_tokens,
+            "stop": self.stop,
+            "reasoning": self.reasoning or None,
+            "pool": {
+                "max_connections": self.max_connections,
+                "keepalive_seconds": self.keepalive_seconds,
+            },
+            **self.counts,
+            "connect": self.connect_latency.snapshot(),
+            "tls_handshake": self.tls_handshake_latency.snapshot(),
+        }
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=self.keepalive_seconds,
+                ),
+                event_hooks={"request": [self._on_request]},
+            )
+        return self._http
+
+    async def _on_request(self, request: httpx.Request) -> None:
+        self.counts["requests"] += 1
+        request.extensions["trace"] = self._tracer()
+
+    def _tracer(self):
+        """
+        httpcore trace callback for one request. Connection setup events
+        only fire when the pool has no idle connection to hand out, so a
+        request that reaches its headers without them reused a connection.
+        """
+        started: dict[str, float] = {}
+        connected = False
+
+        async def trace(event: str, info: dict[str, Any]) -> None:
+            nonlocal connected
+            step, _, phase = event.rpartition(".")
+            if phase == "started":
+                started[step] = time.perf_counter()
+                if step.endswith("send_request_headers"):
+                    key = "new_connections" if connected else "reused_connections"
+                    self.counts[key] += 1
+                return
+            elapsed = time.perf_counter() - started.pop(step, time.perf_counter())
+            if phase == "failed" and step == "connection.connect_tcp":
+                self.counts["connect_failures"] += 1
+            elif phase == "complete" and step == "connection.connect_tcp":
+                connected = True
+                self.connect_latency.record(elapsed)
+            elif phase == "complete" and step == "connection.start_tls":
+                self.tls_handshake_latency.record(elapsed)
+
+        return trace
+
+
+def create_llm_client() -> LLMClient:
+    """LLM client configured from the environment"""
+    return LLMClient(
+        model=config.OPENAI_LLM,
+        api_key=config.OPENAI_API_KEY,
+        base_url=config.OPENAI_API_BASE,
+        max_connections=config.LLM_MAX_CONNECTIONS,
+        keepalive_seconds=config.LLM_KEEPALIVE_SECONDS,
+        connect_timeout=config.LLM_CONNECT_TIMEOUT_SECONDS,
+        timeout=config.LLM_TIMEOUT_SECONDS,
+        max_tokens=config.LLM_MAX_TOKENS,
+        stop=(
+            list(SCAFFOLD_STOP_SEQUENCES)
+            if config.LLM_STOP_SEQUENCES is None
+            else config.LLM_STOP_SEQUENCES
+        ),
+        reasoning=reasoning_options(
+            config.LLM_REASONING_EFFORT,
+            config.LLM_REASONING_MAX_TOKENS,
+            config.LLM_REASONING_EXCLUDE,
+        ),
+    )
@@ -0,0 +1,167 @@
+"""
+Model cascade for code generation.
+
+Tiers are tried in order, cheapest and fastest first. A tier's code is
+accepted when it passes validation (and, optionally, a manim dry run);
+otherwise the prompt escalates to the next tier. The last tier, the
+configured ``OPENAI_LLM``, is always accepted: there is nothing left to
+escalate to, and a failing render is handled by the repair stage.
+
+Per tier, the cascade records how often it produced the accepted answer
+and the time from the start of the request to valid code, which includes
+the time spent in the tiers that failed before it.
+"""
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Iterable, Optional
+
+from app.services.code_validator import validate_code
+from app.services.llm_client import LLMClient
+from app.services.reasoning_filter import strip_reasoning
+from app.services.render_service import RenderError, dry_run_manim_script
+from app.utils.metrics import LatencyRecorder
+
+logger = logging.getLogger(__name__)
+
+
+def response_text(response: Any) -> str:
+    """
+    Force extract a string from whatever the model returns, without any
+    reasoning it put in front of the code
+    """
+    if hasattr(response, "content"):
+        text = str(response.content)
+    elif isinstance(response, str):
+        text = response
+    elif isinstance(response, list):
+        text = str(response[0]) if response else ""
+    else:
+        text = str(response)
+    return strip_reasoning(text)
+
+
+async def check_candidate(
+    code: str, allowed_imports: Iterable[str], dry_run_timeout: Optional[float]
+) -> Optional[str]:
+    """
+    The rule generated ``code`` breaks, "dry_run" if manim fails to run it
+    (only checked with a ``dry_run_timeout``), or None if it is acceptable.
+    """
+    violation = validate_code(code, allowed_imports)
+    if violation is not None:
+        return violation.rule
+    if dry_run_timeout is not None:
+        try:
+            await dry_run_manim_script(code, dry_run_timeout)
+        except RenderError:
+            return "dry_run"
+    return None
+
+
+@dataclass
+class CascadeResult:
+    code: str
+    model: str
+    # 0 for the first tier
+    tier: int
+    valid: bool
+
+
+class CascadeTier:
+    """One model of the cascade and what it has produced"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.counts = {"calls": 0, "accepted": 0, "escalated": 0, "errors": 0}
+        self.rejections_by_rule: dict[str, int] = {}
+        self.call_latency = LatencyRecorder()
+        self.time_to_valid_code = LatencyRecorder()
+
+    def reject(self, rule: str) -> None:
+        self.counts["escalated"] += 1
+        self.rejections_by_rule[rule] = self.rejections_by_rule.get(rule, 0) + 1
+
+    def stats(self, requests: int) -> dict:
+        return {
+            "model": self.model,
+            **self.counts,
+            "hit_ratio": (
+                round(self.counts["accepted"] / requests, 3) if requests else None
+            ),
+            "rejections_by_rule": dict(self.rejections_by_rule),
+            "call_latency": self.call_latency.snapshot(),
+            "time_to_valid_code": self.time_to_valid_code.snapshot(),
+        }
+
+
+class ModelCascade:
+    """Generate with the cheapest tier whose code validates"""
+
+    def __init__(
+        self,
+        llm: LLMClient,
+        models: Iterable[str],
+        allowed_imports: Iterable[str],
+        dry_run: bool = False,
+        dry_run_timeout: float = 30.0,
+    ):
+        self.llm = llm
+        self.tiers = [CascadeTier(model) for model in dict.fromkeys(models)]
+        self.allowed_imports = list(allowed_imports)
+        self.dry_run = dry_run
+        self.dry_run_timeout = dry_run_timeout
+        self.requests = 0
+
+    @property
+    def models(self) -> list[str]:
+        return [tier.model for tier in self.tiers]
+
+    async def generate(
+        self, prompt: str, started: Optional[float] = None
+    ) -> CascadeResult:
+        """
+        Code for ``prompt`` from the first tier that produces valid code.
+        Errors of the last tier propagate; earlier ones escalate.
+        """
+        started = started if started is not None else time.perf_counter()
+        self.requests += 1
+        last = len(self.tiers) - 1
+        for index, tier in enumerate(self.tiers):
+            tier.counts["calls"] += 1
+            call_start = time.perf_counter()
+            try:
+                response = await self.llm.ainvoke(prompt, model=tier.model)
+            except Exception as e:
+                tier.counts["errors"] += 1
+                if index == last:
+                    raise
+                logger.warning(f"Cascade tier {tier.model} failed, escalating: {e}")
+                tier.reject("error")
+                continue
+            finally:
+                tier.call_latency.record(time.perf_counter() - call_start)
+
+            code = response_text(response)
+            # The last tier's code is accepted anyway; the render will tell
+            dry_run = self.dry_run and index < last
+            rule = await check_candidate(
+                code, self.allowed_imports, self.dry_run_timeout if dry_run else None
+            )
+            if rule is None or index == last:
+                tier.counts["accepted"] += 1
+                if rule is None:
+                    tier.time_to_valid_code.record(time.perf_counter() - started)
+                return CascadeResult(code, tier.model, index, rule is None)
+
+            logger.info(f"Cascade tier {tier.model} produced {rule}, escalating")
+            tier.reject(rule)
+        raise RuntimeError("Model cascade has no tiers")
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "dry_run": self.dry_run,
+            "tiers": [tier.stats(self.requests) for tier in self.tiers],
+        }
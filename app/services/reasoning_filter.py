@@ -0,0 +1,186 @@
+"""
+Separating reasoning from code in model output.
+
+Reasoning models such as deepseek-r1 may put their chain of thought in
+the response itself, either in a ``<think>...</think>`` block or as prose
+before the code. Both only ever come before the code, so the filter looks
+for them until the first line of code and passes everything after that
+straight through. The preamble is read a line at a time: lines that look
+like the start of the scaffold (imports, a class, a def, a decorator, an
+assignment) begin the code; any other line is reasoning. A comment line
+could be either, a Python comment or a Markdown heading in the reasoning,
+so it goes with the line that decides. When the code was opened with a
+Markdown fence, its closing fence and anything after it are reasoning too.
+"""
+
+import re
+from typing import Any
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+FENCE = "```"
+
+_CODE_START_RE = re.compile(
+    r"^\s*(?:from\s+\S+\s+import\b|import\s+\w|class\s+\w|def\s+\w|@"
+    r"|[A-Za-z_][\w.]*\s*=)"
+)
+_COMMENT_RE = re.compile(r"^\s*#")
+
+_PREAMBLE, _THINKING, _CODE, _EPILOGUE = "preamble", "thinking", "code", "epilogue"
+
+
+def _partial_suffix(text: str, tag: str) -> int:
+    """Length of the longest end of ``text`` that starts ``tag``"""
+    for size in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:size]):
+            return size
+    return 0
+
+
+def _may_be_fence(line: str) -> bool:
+    """Whether the start of a line may still turn out to be a fence"""
+    stripped = line.strip()
+    return stripped.startswith(FENCE) or FENCE.startswith(stripped)
+
+
+class ReasoningFilter:
+    """Splits one response's stream into reasoning and code"""
+
+    def __init__(self):
+        self.state = _PREAMBLE
+        self._buffer = ""
+        # Comment lines of the preamble, until a line shows what they are
+        self._comments: list[str] = []
+        # The code was opened with a Markdown fence, so one will close it
+        self._fenced = False
+        # Whether ``_buffer`` starts a line, in the code
+        self._line_start = True
+
+    @property
+    def in_code(self) -> bool:
+        return self.state == _CODE
+
+    def feed(self, text: str) -> tuple[str, str]:
+        """(code, reasoning) in ``text``; undecided text waits for more"""
+        if self.state == _EPILOGUE:
+            return "", text
+        if self.state == _CODE and not self._fenced:
+            return text, ""
+        self._buffer += text
+        reasoning: list[str] = []
+        if self.state != _CODE:
+            self._read_preamble(reasoning)
+        code = ""
+        if self.state == _CODE:
+            code, epilogue = self._read_code()
+            reasoning.append(epilogue)
+        return code, "".join(reasoning)
+
+    def _read_preamble(self, reasoning: list[str]) -> None:
+        while self._buffer:
+            if self.state == _THINKING:
+                end = self._buffer.find(THINK_CLOSE)
+                if end < 0:
+                    # Hold back what may be the start of the closing tag
+                    keep = _partial_suffix(self._buffer, THINK_CLOSE)
+                    reasoning.append(self._buffer[: len(self._buffer) - keep])
+                    self._buffer = self._buffer[len(self._buffer) - keep :]
+                    return
+                end += len(THINK_CLOSE)
+                reasoning.append(self._buffer[:end])
+                self._buffer = self._buffer[end:]
+                self.state = _PREAMBLE
+                continue
+
+            stripped = self._buffer.lstrip()
+            if stripped.startswith(THINK_OPEN):
+                start = len(self._buffer) - len(stripped) + len(THINK_OPEN)
+                reasoning.extend(self._comments)
+                self._comments.clear()
+                reasoning.append(self._buffer[:start])
+                self._buffer = self._buffer[start:]
+                self.state = _THINKING
+                continue
+            if stripped and THINK_OPEN.startswith(stripped):
+                return
+            newline = self._buffer.find("\n")
+            if newline < 0:
+                return
+            line = self._buffer[: newline + 1]
+            if line.strip() and _CODE_START_RE.match(line):
+                self.state = _CODE
+                self._buffer = "".join(self._comments) + self._buffer
+                self._comments.clear()
+                return
+            if _COMMENT_RE.match(line):
+                self._comments.append(line)
+            else:
+                reasoning.extend(self._comments)
+                self._comments.clear()
+                reasoning.append(line)
+                if line.strip().startswith(FENCE):
+                    self._fenced = True
+            self._buffer = self._buffer[newline + 1 :]
+
+    def _read_code(self) -> tuple[str, str]:
+        """(code, epilogue) of the buffered code, up to a closing fence"""
+        if not self._fenced:
+            code, self._buffer = self._buffer, ""
+            return code, ""
+        code: list[str] = []
+        while self._buffer:
+            newline = self._buffer.find("\n")
+            line = self._buffer if newline < 0 else self._buffer[: newline + 1]
+            if self._line_start and _may_be_fence(line):
+                if newline < 0:
+                    break  # Wait for the rest of the line
+                if line.strip().startswith(FENCE):
+                    epilogue, self._buffer = self._buffer, ""
+                    self.state = _EPILOGUE
+                    return "".join(code), epilogue
+            code.append(line)
+            self._buffer = self._buffer[len(line) :]
+            self._line_start = newline >= 0
+        return "".join(code), ""
+
+    def flush(self) -> tuple[str, str]:
+        """(code, reasoning) still held back, at the end of the response"""
+        rest, self._buffer = self._buffer, ""
+        if self.state == _EPILOGUE:
+            return "", rest
+        if self.state == _CODE:
+            if self._fenced and self._line_start and _may_be_fence(rest):
+                return "", rest
+            return rest, ""
+        held = "".join(self._comments) + rest
+        self._comments.clear()
+        if self.state == _THINKING or not _CODE_START_RE.match(rest):
+            return "", held
+        self.state = _CODE
+        return held, ""
+
+
+def strip_reasoning(text: str) -> str:
+    """The code of a complete response"""
+    reasoning_filter = ReasoningFilter()
+    code, _ = reasoning_filter.feed(text)
+    rest, _ = reasoning_filter.flush()
+    return code + rest
+
+
+def reasoning_options(
+    effort: Any = None, max_tokens: Any = None, exclude: bool = False
+) -> dict:
+    """
+    The OpenRouter-style ``reasoning`` request parameter: less (``effort``
+    "low") or bounded reasoning, and ``exclude`` to keep it out of the
+    response. Empty when nothing is configured.
+    """
+    options: dict[str, Any] = {}
+    if effort:
+        options["effort"] = effort
+    if max_tokens:
+        options["max_tokens"] = max_tokens
+    if exclude:
+        options["exclude"] = True
+    return options
@@ -0,0 +1,244 @@
+"""
+Repair of scripts that fail to render.
+
+When manim rejects a generated script, the error usually points at a line
+or two: a misspelt mobject, a wrong keyword argument, a 2D coordinate.
+Rather than retrying from scratch (retrieval, a full generation and another
+render), the script and a compacted traceback go back to the model, which
+answers with line-range edits (as in ``app.services.code_edit``), and the
+edited script is rendered again. Attempts are bounded in number and by a
+deadline that starts at the first failure.
+"""
+
+import asyncio
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+from langchain.prompts import PromptTemplate
+
+from app.services.code_edit import EDIT_FORMAT, apply_reply
+from app.services.code_validator import (
+    DEFAULT_ALLOWED_IMPORTS,
+    CodeValidationStats,
+    validate_code,
+)
+from app.services.context_packer import TokenCounter
+from app.services.llm_client import LLMClient
+from app.services.model_cascade import response_text
+from app.services.render_service import RenderError, render_manim_script
+from app.utils.line_edits import LineEditError, number_lines
+from app.utils.metrics import LatencyRecorder, ValueRecorder
+
+logger = logging.getLogger(__name__)
+
+_ANSI_RE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+# Frame borders and rules drawn by rich's traceback renderer
+_BORDER_RE = re.compile(r"[─-╿]")
+
+REPAIR_TEMPLATE = PromptTemplate(
+    input_variables=["script", "error"],
+    template="""You are fixing a Manim Community v0.19 script that failed to render.
+
+Script (line numbers are not part of the code):
+{script}
+
+Error:
+{error}
+
+"""
+    + EDIT_FORMAT
+    + """ Change
+only what the error requires and keep the script's indentation.
+""",
+)
+
+
+def compact_traceback(stderr: str, max_lines: int = 30, max_chars: int = 2000) -> str:
+    """
+    The end of a manim error output, without colour codes, frame borders or
+    blank lines; the exception and the frames nearest to it come last.
+    """
+    lines = []
+    for line in _ANSI_RE.sub("", stderr).splitlines():
+        line = _BORDER_RE.sub("", line).rstrip()
+        if line.strip():
+            lines.append(line)
+    text = "\n".join(lines[-max_lines:])
+    return text[-max_chars:]
+
+
+@dataclass
+class RenderResult:
+    video_path: str
+    script: str
+    # Repair attempts made; 0 when the first render worked
+    attempts: int = 0
+    errors: list[str] = field(default_factory=list)
+
+
+class RenderRepairer:
+    """Render a script, repairing it with the LLM when manim rejects it"""
+
+    def __init__(
+        self,
+        llm: LLMClient,
+        token_counter: TokenCounter,
+        max_attempts: int = 2,
+        deadline_seconds: float = 180.0,
+        allowed_imports: Optional[Iterable[str]] = DEFAULT_ALLOWED_IMPORTS,
+        validation: Optional[CodeValidationStats] = None,
+    ):
+        """
+        ``allowed_imports`` of None skips validating scripts before they
+        are rendered; ``validation`` collects the outcomes of those checks.
+        """
+        self.llm = llm
+        self.token_counter = token_counter
+        self.max_attempts = max_attempts
+        self.deadline_seconds = deadline_seconds
+        self.allowed_imports = allowed_imports
+        self.validation = validation
+
+        self.counts = {
+            "renders": 0,
+            "first_try": 0,
+            "repaired": 0,
+            "failed": 0,
+            "attempts": 0,
+            "unusable_edits": 0,
+            "repair_errors": 0,
+            "deadline_exceeded": 0,
+        }
+        self.attempt_latency = LatencyRecorder()
+        self.attempt_prompt_tokens = ValueRecorder()
+        self.attempt_completion_tokens = ValueRecorder()
+        self.time_to_video = {
+            "first_try": LatencyRecorder(),
+            "repaired": LatencyRecorder(),
+        }
+
+    async def render(
+        self, script: str, started: Optional[float] = None
+    ) -> RenderResult:
+        """
+        Render ``script``, repairing it up to ``max_attempts`` times. Raises
+        the last RenderError when no attempt renders within the deadline,
+        chained from whatever ended the repair if that was something else.
+        ``started`` is when the request began, for time-to-video.
+        """
+        started = started if started is not None else time.perf_counter()
+        self.counts["renders"] += 1
+        errors: list[str] = []
+        try:
+            video_path = await self._render(script, None)
+            self.counts["first_try"] += 1
+            self.time_to_video["first_try"].record(time.perf_counter() - started)
+            return RenderResult(video_path, script)
+        except RenderError as e:
+            render_error = error = e
+            errors.append(self._describe(e))
+
+        deadline = time.perf_counter() + self.deadline_seconds
+        for attempt in range(1, self.max_attempts + 1):
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                self.counts["deadline_exceeded"] += 1
+                break
+            self.counts["attempts"] += 1
+            attempt_start = time.perf_counter()
+            try:
+                script = await asyncio.wait_for(
+                    self._repair(script, errors[-1]), remaining
+                )
+                video_path = await self._render(script, deadline - time.perf_counter())
+            except (RenderError, LineEditError) as e:
+                error = e
+                if isinstance(e, RenderError):
+                    render_error = e
+                errors.append(self._describe(e))
+                logger.info(f"Repair attempt {attempt} failed: {errors[-1][-200:]}")
+                continue
+            except asyncio.TimeoutError as e:
+                error = e
+                self.counts["deadline_exceeded"] += 1
+                break
+            except Exception as e:
+                # The LLM failed, not the script: report why the script failed
+                self.counts["repair_errors"] += 1
+                logger.warning(f"Repair attempt {attempt} errored: {e}")
+                error = e
+                break
+            finally:
+                self.attempt_latency.record(time.perf_counter() - attempt_start)
+
+            self.counts["repaired"] += 1
+            self.time_to_video["repaired"].record(time.perf_counter() - started)
+            logger.info(f"Script repaired after {attempt} attempt(s)")
+            return RenderResult(video_path, script, attempt, errors)
+
+        self.counts["failed"] += 1
+        if error is render_error:
+            raise render_error
+        raise render_error from error
+
+    async def _render(self, script: str, timeout: Optional[float]) -> str:
+        if timeout is not None and timeout <= 0:
+            raise asyncio.TimeoutError()
+        if self.allowed_imports is not None:
+            # A script manim cannot run is repaired without spawning it
+            violation = validate_code(script, self.allowed_imports)
+            if self.validation is not None:
+                self.validation.record(violation, streaming=False)
+            if violation is not None:
+                detail = (
+                    f"{violation.rule} at line {violation.line}: {violation.detail}"
+                )
+                raise RenderError(f"Generated code is invalid ({detail})", detail)
+        # manim blocks for seconds; keep the event loop free meanwhile
+        return await asyncio.to_thread(render_manim_script, script, timeout)
+
+    async def _repair(self, script: str, error: str) -> str:
+        prompt = REPAIR_TEMPLATE.format(script=number_lines(script), error=error)
+        response = await self.llm.ainvoke(prompt)
+        reply = response_text(response)
+        self.attempt_prompt_tokens.record(self.token_counter.count(prompt))
+        self.attempt_completion_tokens.record(self.token_counter.count(reply))
+
+        try:
+            repaired, _ = apply_reply(
+                script, reply, self.allowed_imports or DEFAULT_ALLOWED_IMPORTS
+            )
+        except LineEditError:
+            self.counts["unusable_edits"] += 1
+            raise
+        return repaired
+
+    @staticmethod
+    def _describe(error: Exception) -> str:
+        if isinstance(error, RenderError) and error.stderr:
+            return compact_traceback(error.stderr)
+        return str(error)
+
+    def stats(self) -> dict:
+        renders = self.counts["renders"]
+        attempts = self.counts["attempts"]
+        return {
+            **self.counts,
+            "first_try_rate": (
+                round(self.counts["first_try"] / renders, 3) if renders else None
+            ),
+            # Each attempt that renders ends its loop
+            "attempt_success_rate": (
+                round(self.counts["repaired"] / attempts, 3) if attempts else None
+            ),
+            "attempt_latency": self.attempt_latency.snapshot(),
+            "attempt_prompt_tokens": self.attempt_prompt_tokens.snapshot(),
+            "attempt_completion_tokens": self.attempt_completion_tokens.snapshot(),
+            "time_to_video": {
+                name: recorder.snapshot()
+                for name, recorder in self.time_to_video.items()
+            },
+        }
@@ -1,11 +1,21 @@
+import asyncio
 import os
 import shutil
 import subprocess
 import uuid
+from typing import Optional
 
 from core.config import config
 
 
+class RenderError(RuntimeError):
+    """Manim could not render a script; ``stderr`` holds its output"""
+
+    def __init__(self, message: str, stderr: str = ""):
+        super().__init__(message)
+        self.stderr = stderr
+
+
 def cleanup_manim_files(script_filename: str):
     """
     Clean up unnecessary files created during Manim rendering.
@@ -53,7 +63,35 @@ def cleanup_manim_files(script_filename: str):
     print(f"Cleanup completed for script: {script_filename}")
 
 
-def render_manim_script(script: str) -> str:
+def _run_manim(script_path: str, options: list[str], timeout: Optional[float]):
+    """Run manim on the script's GenScene, raising RenderError if it fails"""
+    try:
+        subprocess.run(
+            ["manim", script_path, "GenScene", *options],
+            check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            timeout=timeout,
+        )
+
+    except subprocess.CalledProcessError as e:
+        print("Manim rendering failed:", e.stderr)
+
+        raise RenderError("Rendering failed", e.stderr or "") from e
+
+    except subprocess.TimeoutExpired as e:
+        stderr = e.stderr or ""
+        if isinstance(stderr, bytes):
+            stderr = stderr.decode("utf-8", "replace")
+        raise RenderError(
+            f"Rendering timed out after {timeout:g}s",
+            stderr + f"\nTimeoutError: rendering took longer than {timeout:g}s",
+        ) from e
+
+
+def render_manim_script(script: str, timeout: Optional[float] = None) -> str:
     output_dir = config.GENERATED_DIR
     script_filename = f"script_{uuid.uuid4().hex[:8]}"
     script_path = os.path.join(output_dir, f"{script_filename}.py")
@@ -62,20 +100,8 @@ def render_manim_script(script: str) -> str:
         f.write(script)
 
     try:
-        subprocess.run(
-            [
-                "manim",
-                script_path,
-                "GenScene",
-                "-qk",
-                "--output_file",
-                f"{script_filename}.mp4",
-            ],
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            encoding="utf-8",
+        _run_manim(
+            script_path, ["-qk", "--output_file", f"{script_filename}.mp4"], timeout
         )
 
         # Manim saves to media/videos/<scene_id>/.../output.mp4, so we locate it
@@ -95,10 +121,42 @@ def render_manim_script(script: str) -> str:
 
         raise FileNotFoundError(f"{script_filename}.mp4 not found in media directory.")
 
-    except subprocess.CalledProcessError as e:
-        print("Manim rendering failed:", e.stderr)
+    finally:
+        cleanup_manim_files(script_filename)
 
-        raise RuntimeError("Rendering failed") from e
 
+async def dry_run_manim_script(script: str, timeout: Optional[float] = None) -> None:
+    """
+    Run the scene without writing any video, which catches the errors a
+    render would hit in a fraction of its time. Raises RenderError.
+    Cancelling the call kills manim, so an abandoned check stops at once.
+    """
+    script_filename = f"dryrun_{uuid.uuid4().hex[:8]}"
+    script_path = os.path.join(config.GENERATED_DIR, f"{script_filename}.py")
+
+    with open(script_path, "w") as f:
+        f.write(script)
+
+    process = await asyncio.create_subprocess_exec(
+        "manim",
+        script_path,
+        "GenScene",
+        "--dry_run",
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        _, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError as e:
+        raise RenderError(
+            f"Dry run timed out after {timeout:g}s",
+            f"TimeoutError: the dry run took longer than {timeout:g}s",
+        ) from e
     finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
         cleanup_manim_files(script_filename)
+
+    if process.returncode != 0:
+        raise RenderError("Dry run failed", stderr.decode("utf-8", "replace"))
@@ -0,0 +1,206 @@
+"""
+Cache of generated Manim scripts in front of the LLM.
+
+Generation runs at temperature 0.1, so the same prompt against the same
+model and corpus yields (nearly) the same script. Lookups try an exact tier
+keyed on (model, corpus version, normalized prompt) first, then a semantic
+tier that matches the prompt embedding against cached prompts of the same
+model and corpus version.
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+
+from app.services.embedding_cache import normalize_prompt
+from app.services.embedding_index import content_hash
+
+logger = logging.getLogger(__name__)
+
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+CacheKey = tuple[str, str, str]
+
+
+@dataclass
+class CachedResponse:
+    prompt: str
+    code: str
+    embedding: Optional[np.ndarray] = None
+    created_at: float = field(default_factory=time.time)
+    hits: int = 0
+
+
+class ResponseCache:
+    """
+    Bounded, TTL-expiring cache of generated code.
+
+    Entries are evicted least-recently-used once ``max_entries`` is reached
+    and expire ``ttl_seconds`` after insertion. A semantic match needs a
+    cosine similarity of at least ``semantic_threshold`` and the same
+    numbers in both prompts, since "a square of side 2" and "a square of
+    side 3" embed almost identically. A threshold of None disables the
+    semantic tier.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 86400,
+        semantic_threshold: Optional[float] = 0.97,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.semantic_threshold = semantic_threshold
+
+        self._entries: OrderedDict[CacheKey, CachedResponse] = OrderedDict()
+        self._lock = threading.Lock()
+        # (model, corpus version) -> (keys, unit embedding matrix), rebuilt
+        # lazily after the entries change
+        self._matrices: dict[tuple[str, str], tuple[list[CacheKey], np.ndarray]] = {}
+
+        self.counts = {
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(prompt: str, model: str, corpus_version: str) -> CacheKey:
+        return (model, corpus_version, normalize_prompt(prompt))
+
+    def get(self, prompt: str, model: str, corpus_version: str) -> Optional[str]:
+        """Exact-tier lookup; counts a miss only via ``get_similar``"""
+        key = self.key(prompt, model, corpus_version)
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            entry.hits += 1
+            self.counts["exact_hits"] += 1
+            return entry.code
+
+    def get_similar(
+        self,
+        prompt: str,
+        model: str,
+        corpus_version: str,
+        embedding: Optional[np.ndarray],
+    ) -> Optional[str]:
+        """Semantic-tier lookup, called after ``get`` missed"""
+        if embedding is None or self.semantic_threshold is None:
+            with self._lock:
+                self.counts["misses"] += 1
+            return None
+
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        numbers = _NUMBER_RE.findall(normalize_prompt(prompt))
+        with self._lock:
+            keys, matrix = self._matrix(model, corpus_version)
+            if keys and matrix.shape[1] == query.shape[0]:
+                scores = matrix @ query
+                for i in np.argsort(-scores):
+                    if scores[i] < self.semantic_threshold:
+                        break
+                    entry = self._live(keys[i])
+                    if entry is None:
+                        continue
+                    if _NUMBER_RE.findall(keys[i][2]) != numbers:
+                        continue
+                    self._entries.move_to_end(keys[i])
+                    entry.hits += 1
+                    self.counts["semantic_hits"] += 1
+                    logger.info(
+                        f"Semantic cache hit ({scores[i]:.3f}) for {prompt!r} "
+                        f"via {entry.prompt!r}"
+                    )
+                    return entry.code
+            self.counts["misses"] += 1
+        return None
+
+    def put(
+        self,
+        prompt: str,
+        model: str,
+        corpus_version: str,
+        code: str,
+        embedding: Optional[np.ndarray] = None,
+    ) -> None:
+        key = self.key(prompt, model, corpus_version)
+        if embedding is not None:
+            embedding = np.asarray(embedding, dtype=np.float32)
+            embedding = embedding / (np.linalg.norm(embedding) or 1.0)
+        with self._lock:
+            self._entries[key] = CachedResponse(prompt, code, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counts["evictions"] += 1
+            self._matrices.clear()
+
+    def discard(self, prompt: str, model: str, corpus_version: str) -> None:
+        """Drop an entry whose code turned out not to render"""
+        with self._lock:
+            if self._entries.pop(self.key(prompt, model, corpus_version), None):
+                self._matrices.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.counts["exact_hits"] + self.counts["semantic_hits"]
+            lookups += self.counts["misses"]
+            entries = self._entries.values()
+            hits = sorted(entries, key=lambda e: e.hits, reverse=True)[:5]
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                **self.counts,
+                "hit_rate": (
+                    round((lookups - self.counts["misses"]) / lookups, 4)
+                    if lookups
+                    else 0.0
+                ),
+                # Served by the public metrics route: prompts only as hashes
+                "top_entries": [
+                    {"prompt_hash": content_hash(e.prompt)[:12], "hits": e.hits}
+                    for e in hits
+                ],
+            }
+
+    def _live(self, key: CacheKey) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry.created_at > self.ttl_seconds:
+            del self._entries[key]
+            self._matrices.clear()
+            self.counts["expirations"] += 1
+            return None
+        return entry
+
+    def _matrix(
+        self, model: str, corpus_version: str
+    ) -> tuple[list[CacheKey], np.ndarray]:
+        group = (model, corpus_version)
+        if group not in self._matrices:
+            keys = [
+                key
+                for key, entry in self._entries.items()
+                if key[:2] == group and entry.embedding is not None
+            ]
+            rows = [self._entries[key].embedding for key in keys]
+            matrix = np.vstack(rows) if rows else np.empty((0, 0), np.float32)
+            self._matrices[group] = (keys, matrix)
+        return self._matrices[group]
@@ -0,0 +1,197 @@
+"""
+Retrieval over one or more named corpora (code examples, Manim docs).
+
+Each corpus ranks its documents with hybrid vector + BM25 search and scores
+them on a shared 0-1 scale, so results from different corpora can be merged
+into one list under per-corpus quotas.
+"""
+
+import logging
+import time
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.services.lexical_index import BM25Index, reciprocal_rank_fusion
+from app.services.vector_store import VectorStoreInterface
+from app.utils.metrics import LatencyRecorder
+
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_MODES = ("hybrid", "vector", "lexical")
+
+
+@dataclass
+class ScoredDocument:
+    document: Document
+    score: float
+    corpus: str
+
+
+class RetrievalCorpus:
+    """
+    A searchable corpus: documents plus the vector store and BM25 index over
+    them, with ids being positions in ``documents``.
+
+    Scores are reciprocal rank fusion scores divided by the best score any
+    document could get, which puts every corpus (and every retrieval mode) on
+    the same 0-1 scale: 1.0 means ranked first by every retriever consulted.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documents: Sequence[Document],
+        vector_store: VectorStoreInterface,
+        lexical_index: BM25Index,
+        mode: str = "hybrid",
+        rrf_k: int = 60,
+    ):
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        if len(vector_store) != len(documents) or len(lexical_index) != len(documents):
+            raise ValueError(
+                f"Corpus {name}: {len(documents)} documents but "
+                f"{len(vector_store)} vectors and {len(lexical_index)} "
+                "lexical entries"
+            )
+        self.name = name
+        self.documents = documents
+        self.vector_store = vector_store
+        self.lexical_index = lexical_index
+        self.mode = mode
+        self.rrf_k = rrf_k
+
+        self.search_latency = LatencyRecorder()
+        self.timeouts = 0
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def rank(
+        self, query: str, query_emb: Optional[np.ndarray], k: int
+    ) -> list[tuple[int, float]]:
+        """
+        (document id, score) pairs for ``query``, best first. With an
+        embedding, the vector and BM25 rankings are fused; without one
+        (lexical mode, or the embedding provider failed) BM25 ranks alone.
+        """
+        query_embs = None if query_emb is None else query_emb[np.newaxis, :]
+        return self.rank_batch([query], query_embs, k)[0]
+
+    def rank_batch(
+        self, queries: list[str], query_embs: Optional[np.ndarray], k: int
+    ) -> list[list[tuple[int, float]]]:
+        """
+        ``rank`` for many queries, with one row of ``query_embs`` per query.
+        The vector side is a single search over the whole batch (one matmul
+        for the flat index); BM25 is fused per query.
+        """
+        # Fuse deeper lists than requested so either side can promote a result
+        depth = k if self.mode == "vector" else max(5 * k, 20)
+
+        vector_ids: list[Optional[np.ndarray]] = [None] * len(queries)
+        if query_embs is not None and self.mode != "lexical":
+            _, vector_ids = self.vector_store.search(query_embs, depth)
+
+        results = []
+        for query, ids in zip(queries, vector_ids):
+            rankings: list[list[int]] = []
+            if ids is not None:
+                rankings.append([int(i) for i in ids if i >= 0])
+            if ids is None or self.mode != "vector":
+                _, lexical_ids = self.lexical_index.search(query, depth)
+                rankings.append(lexical_ids.tolist())
+
+            best = len(rankings) / (self.rrf_k + 1)
+            fused = reciprocal_rank_fusion(rankings, k=self.rrf_k)
+            results.append([(doc_id, score / best) for doc_id, score in fused[:k]])
+        return results
+
+    def search(
+        self, query: str, query_emb: Optional[np.ndarray], k: int
+    ) -> list[ScoredDocument]:
+        return [
+            ScoredDocument(self.documents[doc_id], score, self.name)
+            for doc_id, score in self.rank(query, query_emb, k)
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "documents": len(self),
+            "mode": self.mode,
+            "search": self.search_latency.snapshot(),
+            "timeouts": self.timeouts,
+        }
+
+
+class AppendedDocuments(Sequence):
+    """Read-only concatenation of a base document sequence and extra documents"""
+
+    def __init__(self, base: Sequence[Document], extra: list[Document]):
+        self.base = base
+        self.extra = extra
+
+    def __len__(self) -> int:
+        return len(self.base) + len(self.extra)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        if i < len(self.base):
+            return self.base[i]
+        return self.extra[i - len(self.base)]
+
+
+@dataclass
+class CorpusSnapshot:
+    """
+    Every corpus a request retrieves from. Reloads build a new snapshot and
+    swap it in as a unit; requests keep the snapshot they started with.
+    """
+
+    generation: int
+    corpus_version: str
+    corpora: dict[str, RetrievalCorpus]
+    quotas: dict[str, int]
+    # Examples from the mapping alone, before generated examples are appended
+    base_examples: Optional[RetrievalCorpus] = None
+    # Normalized code hashes of base_examples, to deduplicate generations
+    example_hashes: frozenset = frozenset()
+    loaded_at: float = field(default_factory=time.time)
+
+    @property
+    def examples(self) -> RetrievalCorpus:
+        return self.corpora["examples"]
+
+    @property
+    def label(self) -> str:
+        return f"{self.corpus_version} (generation {self.generation})"
+
+
+def merge_by_quota(
+    results: dict[str, list[ScoredDocument]], quotas: dict[str, int]
+) -> list[ScoredDocument]:
+    """
+    Merge per-corpus results. Each corpus first gets up to its quota of
+    slots, ordered together by score; the remaining results follow by score
+    as spares for when packing drops a document.
+    """
+    reserved: list[ScoredDocument] = []
+    spares: list[ScoredDocument] = []
+    for corpus, scored in results.items():
+        quota = quotas.get(corpus, 0)
+        reserved.extend(scored[:quota])
+        spares.extend(scored[quota:])
+
+    def by_score(item: ScoredDocument) -> float:
+        return -item.score
+
+    return sorted(reserved, key=by_score) + sorted(spares, key=by_score)
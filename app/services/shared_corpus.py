@@ -0,0 +1,161 @@
+"""
+Read-only corpus segment shared by every worker process.
+
+The gunicorn master (``preload_app = True``) builds the segment once in a
+shared-memory directory such as ``/dev/shm``. Every process then memory-maps
+the same files, so the embedding matrix and document text exist once in RAM
+no matter how many workers run. Memory-mapped buffers are not Python objects,
+so reference counting in the workers never dirties (copies) these pages.
+
+Layout of a segment directory:
+
+    embeddings.npy          # optional (n, dim) unit-norm float32 matrix
+    <field>.bin             # utf-8 text of every entry, concatenated
+    <field>.offsets.npy     # int64 byte offsets, length n + 1
+"""
+
+import logging
+import mmap
+import os
+import shutil
+import tempfile
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+EMBEDDINGS_FILENAME = "embeddings.npy"
+
+
+class SharedCorpus:
+    """Memory-mapped view over a segment directory written by ``export``"""
+
+    def __init__(self, directory: Path | str):
+        self.directory = Path(directory)
+        self._buffers: dict[str, mmap.mmap | bytes] = {}
+        self._offsets: dict[str, np.ndarray] = {}
+
+        for offsets_path in self.directory.glob("*.offsets.npy"):
+            field = offsets_path.name[: -len(".offsets.npy")]
+            self._offsets[field] = np.load(offsets_path, mmap_mode="r")
+            self._buffers[field] = _map_file(self.directory / f"{field}.bin")
+
+        matrix_path = self.directory / EMBEDDINGS_FILENAME
+        self.embeddings: Optional[np.ndarray] = None
+        if matrix_path.exists():
+            # Plain ndarray view so results of arithmetic aren't memmaps
+            self.embeddings = np.asarray(np.load(matrix_path, mmap_mode="r"))
+
+    def __len__(self) -> int:
+        offsets = next(iter(self._offsets.values()), None)
+        return 0 if offsets is None else len(offsets) - 1
+
+    @property
+    def fields(self) -> list[str]:
+        return list(self._offsets)
+
+    def text(self, field: str, i: int) -> str:
+        offsets = self._offsets[field]
+        start, end = int(offsets[i]), int(offsets[i + 1])
+        return self._buffers[field][start:end].decode("utf-8")
+
+    @classmethod
+    def attach(cls, directory: Path | str) -> Optional["SharedCorpus"]:
+        """Map an existing segment, or return None if it was never exported"""
+        directory = Path(directory)
+        if not directory.is_dir():
+            return None
+        return cls(directory)
+
+    @classmethod
+    def export(
+        cls,
+        directory: Path | str,
+        fields: dict[str, list[str]],
+        embeddings: Optional[np.ndarray] = None,
+    ) -> "SharedCorpus":
+        """
+        Write a segment and map it. The files are written to a temporary sibling
+        directory and renamed into place, so concurrent exporters (workers
+        started without preload) race safely and readers never see a partial
+        segment.
+        """
+        directory = Path(directory)
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(dir=directory.parent, prefix=".export-"))
+
+        try:
+            for field, values in fields.items():
+                encoded = [v.encode("utf-8") for v in values]
+                offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+                np.cumsum([len(b) for b in encoded], out=offsets[1:])
+                with open(tmp_dir / f"{field}.bin", "wb") as f:
+                    f.write(b"".join(encoded))
+                np.save(tmp_dir / f"{field}.offsets.npy", offsets)
+
+            if embeddings is not None:
+                np.save(
+                    tmp_dir / EMBEDDINGS_FILENAME,
+                    np.ascontiguousarray(embeddings, dtype=np.float32),
+                )
+
+            try:
+                os.rename(tmp_dir, directory)
+            except OSError:
+                # Another process exported the same segment first
+                if not directory.is_dir():
+                    raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        logger.info(f"Exported shared corpus segment {directory}")
+        return cls(directory)
+
+    @staticmethod
+    def remove_stale(parent: Path | str, keep: Path | str) -> None:
+        """
+        Delete segments other than ``keep``. Processes that still map an old
+        segment keep their mapping until they drop it.
+        """
+        keep = Path(keep)
+        for path in Path(parent).iterdir():
+            if path.is_dir() and path != keep and not path.name.startswith("."):
+                shutil.rmtree(path, ignore_errors=True)
+
+
+class SharedDocuments(Sequence):
+    """
+    Sequence of ``Document`` built on access from a shared corpus field. The
+    remaining fields of the segment become the document's metadata.
+    """
+
+    def __init__(self, corpus: SharedCorpus, field: str = "content"):
+        self.corpus = corpus
+        self.field = field
+        self.metadata_fields = [f for f in corpus.fields if f != field]
+
+    def __len__(self) -> int:
+        return len(self.corpus)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return Document(
+            page_content=self.corpus.text(self.field, i),
+            metadata={f: self.corpus.text(f, i) for f in self.metadata_fields},
+        )
+
+
+def _map_file(path: Path) -> mmap.mmap | bytes:
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""  # mmap cannot map empty files
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
@@ -0,0 +1,166 @@
+"""
+Single-flight coalescing of identical concurrent generations.
+
+The first request for a key starts the upstream generation; identical
+requests arriving while it runs subscribe to it instead of starting their
+own. Every token is kept in a per-generation buffer, so each subscriber
+reads its own copy from the start: late joiners first get a replay of what
+was produced so far, then follow the live stream. When the last subscriber
+leaves before the end, the upstream generation is cancelled. Subscribers
+are registered when they join, before they start reading, so a generation
+is never cancelled under a request that has joined it.
+"""
+
+import asyncio
+import logging
+from collections.abc import AsyncGenerator, Callable, Hashable
+from contextlib import aclosing
+from typing import Optional
+
+from schemas.stream import StreamMarkers
+
+logger = logging.getLogger(__name__)
+
+
+class SharedGeneration:
+    """One upstream token stream, fanned out to any number of subscribers"""
+
+    def __init__(self, key: Hashable):
+        self.key = key
+        self.tokens: list[str] = []
+        self.done = False
+        self.abandoned = False
+        self.subscribers = 0
+        self.active = 0
+        self._changed = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, source: AsyncGenerator[str, None]) -> asyncio.Task:
+        self._task = asyncio.create_task(self._pump(source))
+        return self._task
+
+    def cancel(self) -> None:
+        """Stop the upstream generation; nobody is reading it any more"""
+        self.abandoned = True
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _pump(self, source: AsyncGenerator[str, None]) -> None:
+        try:
+            # Closing the source on cancellation cancels its LLM call
+            async with aclosing(source):
+                async for token in source:
+                    async with self._changed:
+                        self.tokens.append(token)
+                        self._changed.notify_all()
+        except Exception as e:
+            logger.error(f"Shared generation failed: {e}")
+            async with self._changed:
+                self.tokens.append(f"{StreamMarkers.STREAM_ERROR} {e}")
+        except asyncio.CancelledError:
+            # Anyone still reading must not take the tokens so far as complete
+            async with self._changed:
+                self.tokens.append(
+                    f"{StreamMarkers.STREAM_ERROR} Generation was cancelled"
+                )
+            raise
+        finally:
+            async with self._changed:
+                self.done = True
+                self._changed.notify_all()
+
+    def subscribe(self) -> "Subscription":
+        """Every token of the generation, from the first one"""
+        return Subscription(self)
+
+    def _leave(self) -> None:
+        self.active -= 1
+        if self.active == 0 and not self.done:
+            logger.info("Last subscriber left, cancelling shared generation")
+            self.cancel()
+
+
+class Subscription:
+    """
+    One subscriber's read position in a shared generation. It counts as a
+    subscriber from creation until closed, whether or not it was read.
+    """
+
+    def __init__(self, flight: SharedGeneration):
+        self.flight = flight
+        self.position = 0
+        self.closed = False
+        flight.subscribers += 1
+        flight.active += 1
+
+    def __aiter__(self) -> "Subscription":
+        return self
+
+    async def __anext__(self) -> str:
+        flight = self.flight
+        if not self.closed:
+            async with flight._changed:
+                await flight._changed.wait_for(
+                    lambda: flight.done or self.position < len(flight.tokens)
+                )
+                if self.position < len(flight.tokens):
+                    self.position += 1
+                    return flight.tokens[self.position - 1]
+            await self.aclose()
+        raise StopAsyncIteration
+
+    async def aclose(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.flight._leave()
+
+
+class SingleFlight:
+    """Registry of in-flight shared generations, keyed by request identity"""
+
+    def __init__(self):
+        self._flights: dict[Hashable, SharedGeneration] = {}
+        self.counts = {
+            "started": 0,
+            "joined": 0,
+            "abandoned": 0,
+            "max_subscribers": 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def join(
+        self, key: Hashable, source: Callable[[], AsyncGenerator[str, None]]
+    ) -> Subscription:
+        """
+        A subscription to the in-flight generation for ``key``, or to a new
+        one fed by ``source()`` if none is running. Close it when done.
+        """
+        flight = self._flights.get(key)
+        if flight is not None and not flight.abandoned:
+            self.counts["joined"] += 1
+            subscription = flight.subscribe()
+            self.counts["max_subscribers"] = max(
+                self.counts["max_subscribers"], flight.subscribers
+            )
+            return subscription
+
+        flight = SharedGeneration(key)
+        self._flights[key] = flight
+        self.counts["started"] += 1
+        self.counts["max_subscribers"] = max(self.counts["max_subscribers"], 1)
+        task = flight.start(source())
+        # Finished generations stop accepting joiners; later identical
+        # requests are served by the response cache instead
+        task.add_done_callback(lambda _: self._forget(flight))
+        return flight.subscribe()
+
+    def _forget(self, flight: SharedGeneration) -> None:
+        if flight.abandoned:
+            self.counts["abandoned"] += 1
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._flights), **self.counts}
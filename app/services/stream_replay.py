@@ -0,0 +1,270 @@
+"""
+Resumable code streams.
+
+A message's generation runs in its own task and writes numbered SSE frames
+into a replay buffer; HTTP responses only subscribe to it. A client whose
+connection drops reconnects with ``Last-Event-ID`` and continues after
+that frame, from the same generation, instead of starting a new one.
+
+Buffers are per worker (reconnects need sticky routing to resume) and
+bounded: each keeps at most ``max_stream_bytes`` of frames, the total is
+capped at ``max_total_bytes``, finished streams are kept for
+``ttl_seconds`` and a generation nobody is subscribed to is cancelled
+after ``grace_seconds``. A stream that ended in an error is not kept, so
+trying again generates anew rather than replaying the failure.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from contextlib import aclosing
+from typing import AsyncGenerator, Optional
+
+from app.schemas.stream import StreamEvent
+from app.utils.sse import event_frame
+
+logger = logging.getLogger(__name__)
+
+
+class ResumeError(Exception):
+    """The frames after a client's Last-Event-ID are no longer buffered"""
+
+
+class ReplayStream:
+    """The numbered frames of one message's generation"""
+
+    def __init__(self, message_id: int, corpus_version: Optional[str] = None):
+        self.message_id = message_id
+        self.corpus_version = corpus_version
+        # (event id, encoded frame); ids start at 1 and have no gaps, so
+        # frames[i] has id first_id + i
+        self.frames: list[tuple[int, bytes]] = []
+        self.first_id = 1
+        self.last_id = 0
+        self.nbytes = 0
+        self.done = False
+        self.failed = False
+        self.finished_at: Optional[float] = None
+        self.subscribers = 0
+        self._changed = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+        self._linger: Optional[asyncio.TimerHandle] = None
+
+    def start(self, events: AsyncGenerator[StreamEvent, None]) -> None:
+        self._task = asyncio.create_task(self._pump(events))
+
+    def cancel(self) -> None:
+        if self._task is not None and not self._task.done():
+            logger.info(f"Cancelling unattended generation for {self.message_id}")
+            self._task.cancel()
+
+    async def _pump(self, events: AsyncGenerator[StreamEvent, None]) -> None:
+        try:
+            # Closing the source on cancellation cancels its LLM call
+            async with aclosing(events):
+                async for event in events:
+                    await self._append(event)
+        except Exception as e:
+            logger.error(f"Stream error for message {self.message_id}: {e}")
+            await self._append(
+                StreamEvent(
+                    type="error",
+                    data="Internal Server Error",
+                    message_id=self.message_id,
+                )
+            )
+        finally:
+            async with self._changed:
+                self.done = True
+                self.finished_at = time.time()
+                self._changed.notify_all()
+
+    async def _append(self, event: StreamEvent) -> None:
+        async with self._changed:
+            if event.type == "error":
+                self.failed = True
+            self.last_id += 1
+            frame = event_frame(event, self.last_id)
+            self.frames.append((self.last_id, frame))
+            self.nbytes += len(frame)
+            self._changed.notify_all()
+
+    def resumable(self, after_id: int) -> bool:
+        """Whether every frame after ``after_id`` is still buffered"""
+        return self.first_id <= after_id + 1 <= self.last_id + 1
+
+    def trim(self, max_bytes: int) -> int:
+        """Drop the oldest frames down to ``max_bytes``; returns bytes freed"""
+        freed = 0
+        while self.frames and self.nbytes > max_bytes:
+            _, frame = self.frames.pop(0)
+            self.first_id += 1
+            self.nbytes -= len(frame)
+            freed += len(frame)
+        return freed
+
+    async def subscribe(
+        self, after_id: int = 0, grace_seconds: float = 0
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        Frames with ids after ``after_id``, live until the generation ends.
+        When the last subscriber leaves early, the generation is cancelled
+        ``grace_seconds`` later unless someone resubscribes.
+        """
+        self.subscribers += 1
+        if self._linger is not None:
+            self._linger.cancel()
+            self._linger = None
+        next_id = after_id + 1
+        try:
+            while True:
+                async with self._changed:
+                    await self._changed.wait_for(
+                        lambda: self.done or next_id <= self.last_id
+                    )
+                    if next_id < self.first_id:
+                        # Trimmed while this subscriber lagged behind
+                        return
+                    start = next_id - self.first_id
+                    pending = [frame for _, frame in self.frames[start:]]
+                    finished = self.done
+                next_id += len(pending)
+                for frame in pending:
+                    yield frame
+                if finished and next_id > self.last_id:
+                    return
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                loop = asyncio.get_running_loop()
+                self._linger = loop.call_later(grace_seconds, self.cancel)
+
+
+class StreamReplayRegistry:
+    """Replay buffers of in-progress and recently finished generations"""
+
+    def __init__(
+        self,
+        max_stream_bytes: int = 512 * 1024,
+        max_total_bytes: int = 32 * 1024 * 1024,
+        ttl_seconds: float = 120.0,
+        grace_seconds: float = 30.0,
+    ):
+        self.max_stream_bytes = max_stream_bytes
+        self.max_total_bytes = max_total_bytes
+        self.ttl_seconds = ttl_seconds
+        self.grace_seconds = grace_seconds
+        self._streams: OrderedDict[int, ReplayStream] = OrderedDict()
+        self.counts = {"started": 0, "resumed": 0, "evicted": 0, "trimmed_bytes": 0}
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+    def get(self, message_id: int) -> Optional[ReplayStream]:
+        self.evict()
+        return self._streams.get(message_id)
+
+    def attach(
+        self, message_id: int, last_event_id: Optional[int] = None
+    ) -> Optional[ReplayStream]:
+        """
+        The stream a request for ``message_id`` subscribes to, or None if
+        the message is to be generated anew. With ``last_event_id`` the
+        stream must still hold every frame after it, else ``ResumeError``.
+        Without it, only a generation still in progress whose first frame
+        is buffered is attached to.
+        """
+        stream = self.get(message_id)
+        if last_event_id is not None:
+            if stream is None or not stream.resumable(last_event_id):
+                raise ResumeError(
+                    f"Stream {message_id} cannot resume after {last_event_id}"
+                )
+            return stream
+        if stream is not None and (stream.done or not stream.resumable(0)):
+            return None
+        return stream
+
+    def start(
+        self,
+        message_id: int,
+        events: AsyncGenerator[StreamEvent, None],
+        corpus_version: Optional[str] = None,
+    ) -> ReplayStream:
+        """
+        Run ``events`` in the background, buffering its frames. A generation
+        still running for the message is cancelled; this one replaces it.
+        """
+        previous = self._streams.pop(message_id, None)
+        if previous is not None:
+            previous.cancel()
+        stream = ReplayStream(message_id, corpus_version)
+        self._streams[message_id] = stream
+        self.counts["started"] += 1
+        stream.start(self._bounded(stream, events))
+        return stream
+
+    def subscribe(
+        self, stream: ReplayStream, after_id: int = 0
+    ) -> AsyncGenerator[bytes, None]:
+        if after_id:
+            self.counts["resumed"] += 1
+        return stream.subscribe(after_id, self.grace_seconds)
+
+    async def _bounded(
+        self, stream: ReplayStream, events: AsyncGenerator[StreamEvent, None]
+    ) -> AsyncGenerator[StreamEvent, None]:
+        """Pass ``events`` through, enforcing the caps after every frame"""
+        async with aclosing(events):
+            async for event in events:
+                yield event
+                self.counts["trimmed_bytes"] += stream.trim(self.max_stream_bytes)
+                self.evict()
+
+    def evict(self) -> None:
+        """
+        Drop failed and expired streams, then finished ones (oldest first)
+        over the cap. Subscribers still reading a dropped stream finish it.
+        """
+        now = time.time()
+        for message_id, stream in list(self._streams.items()):
+            if stream.done and (
+                stream.failed or now - stream.finished_at > self.ttl_seconds
+            ):
+                self._drop(message_id)
+
+        total = self.nbytes
+        for message_id, stream in list(self._streams.items()):
+            if total <= self.max_total_bytes:
+                return
+            if stream.done and not stream.subscribers:
+                total -= stream.nbytes
+                self._drop(message_id)
+
+        # Still over: only live generations are left, trim their history
+        for stream in self._streams.values():
+            if total <= self.max_total_bytes:
+                return
+            target = max(0, stream.nbytes - (total - self.max_total_bytes))
+            freed = stream.trim(target)
+            total -= freed
+            self.counts["trimmed_bytes"] += freed
+
+    def _drop(self, message_id: int) -> None:
+        del self._streams[message_id]
+        self.counts["evicted"] += 1
+
+    @property
+    def nbytes(self) -> int:
+        return sum(stream.nbytes for stream in self._streams.values())
+
+    def stats(self) -> dict:
+        live = sum(1 for stream in self._streams.values() if not stream.done)
+        return {
+            "streams": len(self._streams),
+            "in_progress": live,
+            "bytes": self.nbytes,
+            "max_total_bytes": self.max_total_bytes,
+            **self.counts,
+        }
@@ -1,17 +1,23 @@
+import asyncio
 import logging
 import os
 import tempfile
+from contextlib import aclosing
 from datetime import datetime
 from typing import AsyncGenerator, Optional
 
 import aiofiles
+from core.config import config
 from schemas.inference import InferenceRequest
 from services.cloud_service import CloudStorage
 from sqlalchemy.orm import Session
 
-from app.database.models import Code
+from app.database.models import Code, Message
 from app.schemas.stream import ErrorMessages, StreamEvent, StreamMarkers
 from app.services.chain_manager import ChainManager
+from app.services.code_validator import StreamingCodeValidator, Violation
+from app.services.retrieval import CorpusSnapshot
+from app.utils.sse import code_chunk
 
 logger = logging.getLogger(__name__)
 
@@ -24,7 +30,11 @@ class StreamService:
         self.cloud_storage = cloud_storage
 
     async def process_message_stream(
-        self, message_id: int, prompt: str, db: Session
+        self,
+        message_id: int,
+        prompt: str,
+        db: Session,
+        snapshot: Optional[CorpusSnapshot] = None,
     ) -> AsyncGenerator[StreamEvent, None]:
         """
         Main streaming process that handles:
@@ -37,17 +47,28 @@ class StreamService:
         # Save code to file
         file_path = None
         try:
-            # Stream AI response
-            async for event in self._stream_ai_response(message_id, prompt):
-                if event.type == "error":
-                    yield event
-                    return
-                elif event.type == "code_chunk":
-                    code_chunks.append(event.data)
-                    yield event
-                elif event.type == "ai_completed":
-                    yield event
-                    break
+            # A follow-up in a chat that has code patches it when it can
+            previous_code = None
+            if config.EDIT_MODE_ENABLED:
+                previous_code = self._get_previous_code(db, message_id)
+            if previous_code:
+                ai_events = self._stream_edit_response(
+                    message_id, prompt, previous_code, snapshot
+                )
+            else:
+                # Closing the stream (client gone) cancels the LLM call
+                ai_events = self._stream_ai_response(message_id, prompt, snapshot)
+            async with aclosing(ai_events):
+                async for event in ai_events:
+                    if event.type == "error":
+                        yield event
+                        return
+                    elif event.type == "code_chunk":
+                        code_chunks.append(event.data)
+                        yield event
+                    elif event.type == "ai_completed":
+                        yield event
+                        break
 
             # Process the complete code
             full_code = "".join(code_chunks)
@@ -114,36 +135,62 @@ class StreamService:
                 await self._cleanup_temp_file(file_path)
 
     async def _stream_ai_response(
-        self, message_id: int, prompt: str
+        self,
+        message_id: int,
+        prompt: str,
+        snapshot: Optional[CorpusSnapshot] = None,
     ) -> AsyncGenerator[StreamEvent, None]:
-        """Stream AI response and convert to StreamEvent objects"""
+        """
+        Stream AI response and convert to StreamEvent objects. The code is
+        validated as it arrives; on the first violation of the template's
+        rules the stream ends with an error, which cancels the LLM call.
+        """
+        validator = None
+        if config.CODE_VALIDATION_ENABLED:
+            validator = StreamingCodeValidator(config.CODE_ALLOWED_IMPORTS)
         try:
             request = InferenceRequest(prompt=prompt)
-            stream = self.chain_manager.run_inference_stream(request)
-
-            async for chunk in stream:
-                if chunk == StreamMarkers.STREAM_END:
-                    yield StreamEvent(
-                        type="ai_completed",
-                        data="AI streaming completed",
-                        message_id=message_id,
-                    )
-                    break
-                elif chunk.startswith(StreamMarkers.STREAM_ERROR):
-                    error_msg = chunk[
-                        len(StreamMarkers.STREAM_ERROR) :
-                    ]  # Remove "__STREAM_ERROR__" prefix
-                    logger.error(f"AI Error for message {message_id}: {error_msg}")
-                    yield StreamEvent(
-                        type="error",
-                        data=ErrorMessages.GENERAL_ERROR,
-                        message_id=message_id,
-                    )
-                    break
+            stream = self.chain_manager.run_inference_stream(request, snapshot)
+
+            async with aclosing(stream):
+                async for chunk in stream:
+                    if chunk == StreamMarkers.STREAM_END:
+                        yield StreamEvent(
+                            type="ai_completed",
+                            data="AI streaming completed",
+                            message_id=message_id,
+                        )
+                        break
+                    elif chunk.startswith(StreamMarkers.STREAM_ERROR):
+                        error_msg = chunk[
+                            len(StreamMarkers.STREAM_ERROR) :
+                        ]  # Remove "__STREAM_ERROR__" prefix
+                        logger.error(f"AI Error for message {message_id}: {error_msg}")
+                        yield StreamEvent(
+                            type="error",
+                            data=ErrorMessages.GENERAL_ERROR,
+                            message_id=message_id,
+                        )
+                        break
+                    else:
+                        if validator is not None:
+                            violation = validator.feed(chunk)
+                            if violation is not None:
+                                self.chain_manager.code_validation.record(
+                                    violation, streaming=True
+                                )
+                                yield self._invalid_code(message_id, violation)
+                                break
+                        yield code_chunk(chunk, message_id)
                 else:
-                    yield StreamEvent(
-                        type="code_chunk", data=chunk, message_id=message_id
-                    )
+                    # The model finished; check what needs the whole code
+                    if validator is not None:
+                        violation = validator.finish()
+                        self.chain_manager.code_validation.record(
+                            violation, streaming=True
+                        )
+                        if violation is not None:
+                            yield self._invalid_code(message_id, violation)
 
         except Exception as e:
             logger.error(f"AI streaming error: {str(e)}")
@@ -153,6 +200,74 @@ class StreamService:
                 message_id=message_id,
             )
 
+    async def _stream_edit_response(
+        self,
+        message_id: int,
+        prompt: str,
+        previous_code: str,
+        snapshot: Optional[CorpusSnapshot] = None,
+    ) -> AsyncGenerator[StreamEvent, None]:
+        """
+        The chat's previous code changed as ``prompt`` asks, from a patch
+        the model writes instead of a whole script. If the patch cannot be
+        produced or applied, the code is generated from scratch instead.
+        """
+        try:
+            edited = await asyncio.wait_for(
+                self.chain_manager.code_editor.edit(previous_code, prompt),
+                config.EDIT_MODE_TIMEOUT_SECONDS,
+            )
+        except Exception as e:
+            logger.warning(
+                f"Edit failed for message {message_id}, regenerating: {str(e)}"
+            )
+            events = self._stream_ai_response(message_id, prompt, snapshot)
+            async with aclosing(events):
+                async for event in events:
+                    yield event
+            return
+
+        logger.info(
+            f"Message {message_id} {'patched' if edited.patched else 'rewritten'}"
+            " from the chat's previous code"
+        )
+        # Same chunk events as a live generation, like a cache replay
+        for line in edited.code.splitlines(keepends=True):
+            yield code_chunk(line, message_id)
+
+    def _get_previous_code(self, db: Session, message_id: int) -> Optional[str]:
+        """Code of the latest earlier message in the same chat, if any"""
+        try:
+            message = db.query(Message).filter(Message.id == message_id).first()
+            if not message:
+                return None
+            previous = (
+                db.query(Code)
+                .join(Message, Code.message_id == Message.id)
+                .filter(
+                    Message.chat_id == message.chat_id,
+                    Message.id < message_id,
+                    Code.code.isnot(None),
+                    Code.code != "",
+                )
+                .order_by(Message.id.desc())
+                .first()
+            )
+            return previous.code if previous else None
+        except Exception as e:
+            # Without the previous code the message is generated from scratch
+            logger.warning(f"Failed to load previous code for {message_id}: {e}")
+            return None
+
+    def _invalid_code(self, message_id: int, violation: Violation) -> StreamEvent:
+        logger.warning(
+            f"Aborting stream for message {message_id}: {violation.rule} "
+            f"at line {violation.line} ({violation.detail})"
+        )
+        return StreamEvent(
+            type="error", data=ErrorMessages.INVALID_CODE, message_id=message_id
+        )
+
     async def _save_code_to_file(self, code_content: str, message_id: int) -> str:
         """Save code to temporary file"""
         temp_dir = tempfile.gettempdir()
@@ -0,0 +1,351 @@
+import logging
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class VectorStoreError(Exception):
+    """Custom exception for vector store operations"""
+
+    pass
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Return a C-contiguous float32 copy of ``matrix`` with unit-norm rows"""
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0  # leave zero rows as zeros
+    return matrix / norms
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the ``k`` highest scores, best first, without a full sort"""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.shape[0]:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.shape[0])
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class VectorStoreInterface(ABC):
+    """
+    Abstract base class for vector search backends.
+
+    Row ids are positions in the corpus the store was built from, so callers
+    map them back to their own document list.
+    """
+
+    @property
+    @abstractmethod
+    def dim(self) -> int:
+        """Dimension of the stored vectors"""
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    @abstractmethod
+    def search(self, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Cosine-similarity search for a (n_queries, dim) matrix.
+
+        Returns (scores, ids), both shaped (n_queries, k) and best first.
+        Missing results are padded with id -1.
+        """
+        pass
+
+    def set_search_params(self, **params) -> None:
+        """Tune search parameters (e.g. nprobe, efSearch); no-op by default"""
+        pass
+
+    def _check_queries(self, queries: np.ndarray) -> np.ndarray:
+        queries = np.atleast_2d(queries)
+        if queries.shape[1] != self.dim:
+            raise VectorStoreError(
+                f"Query dimension {queries.shape[1]} does not match index "
+                f"dimension {self.dim}"
+            )
+        return normalize_rows(queries)
+
+
+class NumpyVectorStore(VectorStoreInterface):
+    """Exact search over a pre-normalized float32 matrix"""
+
+    def __init__(self, embeddings: np.ndarray, normalized: bool = False):
+        # An already normalized matrix (e.g. a shared memory map) is used
+        # in place rather than copied
+        self.matrix = embeddings if normalized else normalize_rows(embeddings)
+
+    @property
+    def dim(self) -> int:
+        return int(self.matrix.shape[1])
+
+    def __len__(self) -> int:
+        return int(self.matrix.shape[0])
+
+    def search(self, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        queries = self._check_queries(queries)
+        k = min(k, len(self))
+        all_scores = queries @ self.matrix.T  # (n_queries, n_docs)
+
+        ids = np.full((queries.shape[0], k), -1, dtype=np.int64)
+        scores = np.zeros((queries.shape[0], k), dtype=np.float32)
+        for row, row_scores in enumerate(all_scores):
+            top = top_k_indices(row_scores, k)
+            ids[row, : len(top)] = top
+            scores[row, : len(top)] = row_scores[top]
+        return scores, ids
+
+
+class QuantizedVectorStore(VectorStoreInterface):
+    """
+    Compact approximate search with exact re-ranking.
+
+    Vectors are kept as float16 or int8 codes, optionally after a PCA
+    projection to ``pca_dim`` dimensions. A query first scores every code
+    (coarse search), then the best ``rerank_factor * k`` candidates are
+    re-scored exactly against ``rerank_source``. Pass a memory-mapped matrix
+    (e.g. the shared corpus segment) as the re-rank source so only shortlist
+    rows are ever read from it; without one, coarse scores are returned.
+    """
+
+    def __init__(
+        self,
+        embeddings: np.ndarray,
+        dtype: str = "int8",
+        pca_dim: Optional[int] = None,
+        rerank_factor: int = 4,
+        rerank_source: Optional[np.ndarray] = None,
+        normalized: bool = False,
+        chunk_size: int = 4096,
+    ):
+        if dtype not in ("int8", "float16"):
+            raise ValueError(f"Unsupported quantized dtype: {dtype}")
+        matrix = embeddings if normalized else normalize_rows(embeddings)
+        self._dim = int(matrix.shape[1])
+        self.dtype = dtype
+        self.rerank_factor = rerank_factor
+        self.rerank_source = rerank_source
+        self.chunk_size = chunk_size
+
+        # PCA: coarse score (P q) . P(x - mean) ranks documents like q . x,
+        # since the dropped q . mean term is the same for every document
+        self.components: Optional[np.ndarray] = None
+        reduced = np.asarray(matrix, dtype=np.float32)
+        if pca_dim is not None and pca_dim < self._dim:
+            mean = reduced.mean(axis=0)
+            centered = reduced - mean
+            _, _, vt = np.linalg.svd(centered, full_matrices=False)
+            self.components = np.ascontiguousarray(vt[:pca_dim], dtype=np.float32)
+            reduced = centered @ self.components.T
+
+        if dtype == "int8":
+            # Symmetric per-dimension scale; folded into the query at search time
+            peak = np.abs(reduced).max(axis=0)
+            self.scale = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+            self.codes = np.round(reduced / self.scale).astype(np.int8)
+        else:
+            self.scale = np.ones(reduced.shape[1], dtype=np.float32)
+            self.codes = reduced.astype(np.float16)
+
+    @property
+    def dim(self) -> int:
+        return self._dim
+
+    def __len__(self) -> int:
+        return int(self.codes.shape[0])
+
+    @property
+    def nbytes(self) -> int:
+        """Resident size of the compact representation"""
+        extra = 0 if self.components is None else self.components.nbytes
+        return int(self.codes.nbytes + self.scale.nbytes + extra)
+
+    def coarse_scores(self, queries: np.ndarray) -> np.ndarray:
+        """Approximate scores of every document, (n_queries, n_docs)"""
+        if self.components is not None:
+            queries = queries @ self.components.T
+        queries = queries * self.scale
+        scores = np.empty((queries.shape[0], len(self)), dtype=np.float32)
+        # NumPy has no int8/float16 GEMM: widen one chunk at a time so the
+        # float32 working set stays small however large the corpus grows
+        for start in range(0, len(self), self.chunk_size):
+            chunk = self.codes[start : start + self.chunk_size].astype(np.float32)
+            scores[:, start : start + len(chunk)] = queries @ chunk.T
+        return scores
+
+    def search(self, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        queries = self._check_queries(queries)
+        k = min(k, len(self))
+        coarse = self.coarse_scores(queries)
+        shortlist_size = k if self.rerank_source is None else k * self.rerank_factor
+
+        ids = np.full((queries.shape[0], k), -1, dtype=np.int64)
+        scores = np.zeros((queries.shape[0], k), dtype=np.float32)
+        for row, row_scores in enumerate(coarse):
+            top = top_k_indices(row_scores, shortlist_size)
+            if self.rerank_source is None:
+                top_scores = row_scores[top]
+            else:
+                # Ascending ids read (possibly memory-mapped) rows in order
+                shortlist = np.sort(top)
+                exact = self.rerank_source[shortlist] @ queries[row]
+                order = top_k_indices(exact, k)
+                top, top_scores = shortlist[order], exact[order]
+            ids[row, : len(top)] = top
+            scores[row, : len(top)] = top_scores
+        return scores, ids
+
+
+class SegmentedVectorStore(VectorStoreInterface):
+    """
+    A read-only base store plus a small in-memory segment of appended rows.
+
+    Ids ``len(base)`` and up address the appended rows. Each search queries
+    both and merges by score, so rows can be appended (or the segment
+    replaced) without rebuilding or copying the base, which stays shared.
+    """
+
+    def __init__(self, base: VectorStoreInterface, extra: np.ndarray):
+        if extra.ndim != 2 or extra.shape[1] != base.dim:
+            raise VectorStoreError(
+                f"Appended rows must have shape (n, {base.dim}), got {extra.shape}"
+            )
+        self.base = base
+        self.extra = NumpyVectorStore(extra)
+
+    @property
+    def dim(self) -> int:
+        return self.base.dim
+
+    def __len__(self) -> int:
+        return len(self.base) + len(self.extra)
+
+    def search(self, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        queries = self._check_queries(queries)
+        k = min(k, len(self))
+        base_scores, base_ids = self.base.search(queries, k)
+        extra_scores, extra_ids = self.extra.search(queries, k)
+        extra_ids = np.where(extra_ids >= 0, extra_ids + len(self.base), -1)
+
+        all_scores = np.hstack([base_scores, extra_scores])
+        all_ids = np.hstack([base_ids, extra_ids])
+        all_scores[all_ids < 0] = -np.inf
+
+        ids = np.full((queries.shape[0], k), -1, dtype=np.int64)
+        scores = np.zeros((queries.shape[0], k), dtype=np.float32)
+        for row in range(queries.shape[0]):
+            top = top_k_indices(all_scores[row], k)
+            top = top[np.isfinite(all_scores[row, top])]
+            ids[row, : len(top)] = all_ids[row, top]
+            scores[row, : len(top)] = all_scores[row, top]
+        return scores, ids
+
+
+class FaissVectorStore(VectorStoreInterface):
+    """
+    FAISS index opened memory-mapped and read-only, so the OS page cache holds
+    a single copy for every worker. Works with flat, IVF and HNSW indexes.
+    """
+
+    def __init__(
+        self,
+        index_path: Path | str,
+        mmap: bool = True,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+    ):
+        try:
+            import faiss
+        except ImportError as e:
+            raise VectorStoreError(
+                "FAISS backend requires faiss (pip install faiss-cpu)"
+            ) from e
+
+        self._faiss = faiss
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+        try:
+            self.index = faiss.read_index(str(index_path), flags)
+        except RuntimeError as e:
+            raise VectorStoreError(f"Failed to open FAISS index {index_path}: {e}")
+
+        self.inner_product = self.index.metric_type == faiss.METRIC_INNER_PRODUCT
+        self.set_search_params(nprobe=nprobe, ef_search=ef_search)
+        logger.info(
+            f"Opened FAISS index {Path(index_path).name}: "
+            f"{type(self.index).__name__}, {self.index.ntotal} vectors, "
+            f"dim {self.index.d}"
+        )
+
+    @property
+    def dim(self) -> int:
+        return int(self.index.d)
+
+    def __len__(self) -> int:
+        return int(self.index.ntotal)
+
+    def set_search_params(
+        self, nprobe: Optional[int] = None, ef_search: Optional[int] = None
+    ) -> None:
+        """Set nprobe (IVF) and efSearch (HNSW); ignored by flat indexes"""
+        params = {"nprobe": nprobe, "efSearch": ef_search}
+        space = self._faiss.ParameterSpace()
+        for name, value in params.items():
+            if value is None:
+                continue
+            try:
+                space.set_index_parameter(self.index, name, value)
+            except RuntimeError:
+                logger.debug(f"{type(self.index).__name__} has no parameter {name}")
+
+    def search(self, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        queries = self._check_queries(queries)
+        distances, ids = self.index.search(queries, min(k, len(self)))
+        if self.inner_product:
+            scores = distances
+        else:
+            # Squared L2 between unit vectors: d = 2 - 2 * cos
+            scores = 1.0 - distances / 2.0
+        return scores.astype(np.float32), ids.astype(np.int64)
+
+
+def create_vector_store(
+    backend: str,
+    embeddings: Optional[np.ndarray] = None,
+    index_path: Optional[Path | str] = None,
+    normalized: bool = False,
+    **search_params,
+) -> VectorStoreInterface:
+    """
+    Create a vector store
+
+    Args:
+        backend: 'numpy', 'quantized' or 'faiss'
+        embeddings: document matrix for the numpy and quantized backends
+        index_path: FAISS index file for the faiss backend
+        normalized: whether ``embeddings`` rows are already unit-norm
+        **search_params: backend parameters (nprobe, ef_search for faiss;
+            dtype, pca_dim, rerank_factor, rerank_source for quantized)
+    """
+    backend = backend.lower()
+    if backend == "numpy":
+        if embeddings is None:
+            raise ValueError("numpy backend requires embeddings")
+        return NumpyVectorStore(embeddings, normalized=normalized)
+    elif backend == "quantized":
+        if embeddings is None:
+            raise ValueError("quantized backend requires embeddings")
+        return QuantizedVectorStore(embeddings, normalized=normalized, **search_params)
+    elif backend == "faiss":
+        if index_path is None:
+            raise ValueError("faiss backend requires index_path")
+        return FaissVectorStore(index_path, **search_params)
+    raise ValueError(f"Unsupported vector store backend: {backend}")
@@ -0,0 +1,55 @@
+"""Client disconnect detection for streaming responses."""
+
+import asyncio
+import logging
+from typing import AsyncGenerator, Optional, TypeVar
+
+from fastapi import Request
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+async def wait_for_disconnect(request: Request) -> None:
+    """Return once the client has closed the connection"""
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def until_disconnected(
+    request: Request, events: AsyncGenerator[T, None]
+) -> AsyncGenerator[T, None]:
+    """
+    Yield from ``events`` until it ends or the client disconnects.
+
+    On disconnect the pending step of ``events`` is cancelled, so the
+    cancellation travels down to whatever it awaits (ultimately the LLM
+    call). Unlike failing writes, this also notices a client that leaves
+    while nothing is being sent, e.g. before the model's first token.
+    """
+    disconnected = asyncio.create_task(wait_for_disconnect(request))
+    step: Optional[asyncio.Future] = None
+    try:
+        while True:
+            step = asyncio.ensure_future(events.__anext__())
+            await asyncio.wait(
+                {step, disconnected}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not step.done():
+                logger.info("Client disconnected, stream cancelled")
+                return
+            try:
+                event = step.result()
+            except StopAsyncIteration:
+                return
+            yield event
+    finally:
+        disconnected.cancel()
+        if step is not None and not step.done():
+            # Also reached when the caller itself is cancelled mid-step
+            step.cancel()
+            await asyncio.gather(step, return_exceptions=True)
+        await events.aclose()
@@ -0,0 +1,79 @@
+"""
+Line-range edits to a script.
+
+Instead of rewriting a whole script, the model can answer with only the
+lines that change, addressed by the line numbers it was shown::
+
+    @@ 12,13
+    replacement for lines 12 and 13
+    @@ 20,19
+    a line inserted before line 20
+
+Each block replaces lines ``first`` to ``last`` (1-based, inclusive) of the
+original script with the lines below the header; an empty block deletes
+them and ``last = first - 1`` inserts before ``first``.
+"""
+
+import re
+from dataclasses import dataclass
+
+_HEADER_RE = re.compile(r"^@@\s*(\d+)\s*,\s*(\d+)\s*$")
+
+
+class LineEditError(ValueError):
+    """Edits that are malformed or do not fit the script"""
+
+
+@dataclass
+class LineEdit:
+    first: int
+    last: int
+    lines: list[str]
+
+
+def number_lines(script: str) -> str:
+    """The script with right-aligned line numbers, as shown to the model"""
+    lines = script.splitlines()
+    width = len(str(len(lines)))
+    return "\n".join(f"{i:>{width}} | {line}" for i, line in enumerate(lines, 1))
+
+
+def has_line_edits(text: str) -> bool:
+    return any(_HEADER_RE.match(line.strip()) for line in text.splitlines())
+
+
+def parse_line_edits(text: str) -> list[LineEdit]:
+    """The edit blocks in ``text``; anything before the first header is ignored"""
+    edits: list[LineEdit] = []
+    for line in text.splitlines():
+        match = _HEADER_RE.match(line.strip())
+        if match:
+            edits.append(LineEdit(int(match.group(1)), int(match.group(2)), []))
+        elif edits and not line.strip().startswith("```"):
+            edits[-1].lines.append(line)
+    if not edits:
+        raise LineEditError("no edit blocks found")
+    for edit in edits:
+        # Blank lines separating blocks belong to neither
+        while edit.lines and not edit.lines[-1].strip():
+            edit.lines.pop()
+    return edits
+
+
+def apply_line_edits(script: str, edits: list[LineEdit]) -> str:
+    """Apply ``edits``, all addressed against the original ``script``"""
+    lines = script.splitlines()
+    previous_last = 0
+    for edit in sorted(edits, key=lambda e: (e.first, e.last)):
+        if not 1 <= edit.first <= len(lines) + 1:
+            raise LineEditError(f"line {edit.first} is outside the script")
+        if not edit.first - 1 <= edit.last <= len(lines):
+            raise LineEditError(f"bad line range {edit.first},{edit.last}")
+        if edit.first <= previous_last:
+            raise LineEditError(f"edits overlap at line {edit.first}")
+        previous_last = max(previous_last, edit.last)
+
+    # Bottom-up, so earlier line numbers stay valid
+    for edit in sorted(edits, key=lambda e: (e.first, e.last), reverse=True):
+        lines[edit.first - 1 : edit.last] = edit.lines
+    return "\n".join(lines) + "\n"
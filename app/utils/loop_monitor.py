@@ -0,0 +1,61 @@
+"""Event loop blocking monitor."""
+
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from app.utils.metrics import LatencyRecorder
+
+logger = logging.getLogger(__name__)
+
+
+class EventLoopLagMonitor:
+    """
+    Measure how long the event loop is blocked.
+
+    A background task sleeps for ``interval`` seconds and records how late it
+    wakes up. Any synchronous work on the loop (blocking SDK calls, CPU-heavy
+    code) shows up as lag, because no other coroutine can run meanwhile.
+    """
+
+    def __init__(self, interval: float = 0.05, warn_threshold: float = 0.25):
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self.lag = LatencyRecorder()
+        self.blocked_seconds = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - start - self.interval)
+            self.lag.record(lag)
+            self.blocked_seconds += lag
+            if lag > self.warn_threshold:
+                logger.warning(f"Event loop blocked for {lag * 1000:.0f}ms")
+
+    def snapshot(self) -> dict:
+        return {
+            "interval_ms": self.interval * 1000,
+            "blocked_seconds_total": round(self.blocked_seconds, 3),
+            "lag": self.lag.snapshot(),
+        }
+
+
+# One monitor per worker process, started by the app lifespan
+loop_monitor = EventLoopLagMonitor()
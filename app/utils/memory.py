@@ -0,0 +1,44 @@
+"""Process memory reporting utilities."""
+
+import resource
+import sys
+from typing import Dict
+
+# Fields from /proc/<pid>/smaps_rollup, reported in kB
+_SMAPS_FIELDS = {
+    "Rss": "rss_kb",
+    "Pss": "pss_kb",
+    "Shared_Clean": "shared_clean_kb",
+    "Shared_Dirty": "shared_dirty_kb",
+    "Private_Clean": "private_clean_kb",
+    "Private_Dirty": "private_dirty_kb",
+}
+
+
+def get_memory_usage() -> Dict[str, int]:
+    """
+    Get memory usage of the current process.
+
+    On Linux this includes PSS and the private/shared split, which show how
+    much of a worker's RSS is actually shared with the master and siblings.
+    Elsewhere only the peak RSS is available.
+    """
+    try:
+        usage = {}
+        with open("/proc/self/smaps_rollup", "r") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in _SMAPS_FIELDS:
+                    usage[_SMAPS_FIELDS[name]] = int(rest.split()[0])
+        return usage
+    except (OSError, ValueError):
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS and kB on Linux
+        return {"max_rss_kb": max_rss // 1024 if sys.platform == "darwin" else max_rss}
+
+
+def format_memory_usage(usage: Dict[str, int]) -> str:
+    """Format memory usage for logging."""
+    return ", ".join(
+        f"{k.removesuffix('_kb')}={v / 1024:.1f}MB" for k, v in usage.items()
+    )
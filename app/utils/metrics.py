@@ -0,0 +1,63 @@
+"""In-process metric helpers."""
+
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+import numpy as np
+
+
+class ValueRecorder:
+    """
+    Running count/total/max of a value, plus percentiles over a bounded
+    window of the most recent samples.
+    """
+
+    def __init__(self, window: int = 1024):
+        self._samples: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            return float(np.percentile(np.fromiter(self._samples, float), q))
+
+    def snapshot(self) -> Dict[str, Optional[float]]:
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else None,
+            "p50": None if p50 is None else round(p50, 3),
+            "p95": None if p95 is None else round(p95, 3),
+            "max": self.max if self.count else None,
+        }
+
+
+class LatencyRecorder(ValueRecorder):
+    """ValueRecorder for durations in seconds, summarized in milliseconds"""
+
+    def snapshot(self) -> Dict[str, Optional[float]]:
+        """Summary in milliseconds"""
+
+        def ms(value: Optional[float]) -> Optional[float]:
+            return None if value is None else round(value * 1000, 3)
+
+        return {
+            "count": self.count,
+            "mean_ms": ms(self.total / self.count) if self.count else None,
+            "p50_ms": ms(self.percentile(50)),
+            "p95_ms": ms(self.percentile(95)),
+            "p99_ms": ms(self.percentile(99)),
+            "max_ms": ms(self.max) if self.count else None,
+        }
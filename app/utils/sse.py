@@ -0,0 +1,138 @@
+"""
+Server-sent event framing for the code streams.
+
+Frames are encoded straight from the event fields, skipping pydantic's
+``model_dump``, with orjson when it is installed. Consecutive ``code_chunk``
+events can be coalesced into one frame per time window or size, so a
+response costs tens of frames instead of one per token.
+"""
+
+import asyncio
+import json
+from typing import AsyncGenerator, AsyncIterator, Optional
+
+from app.schemas.stream import StreamEvent
+
+try:
+    import orjson
+except ImportError:  # optional: pip install manimato-backend[fast-json]
+    orjson = None
+
+
+def encode_frame(
+    event_type: str,
+    data: Optional[str] = None,
+    message_id: Optional[int] = None,
+    event_id: Optional[int] = None,
+) -> bytes:
+    """
+    One SSE frame with the same JSON fields as ``StreamEvent``. With an
+    ``event_id`` it also carries an ``id:`` line, which clients send back as
+    Last-Event-ID when they reconnect.
+    """
+    payload = {"type": event_type, "data": data, "message_id": message_id}
+    if event_id is not None:
+        payload["id"] = event_id
+    if orjson is not None:
+        body = orjson.dumps(payload)
+    else:
+        body = json.dumps(payload).encode("utf-8")
+    if event_id is None:
+        return b"data: " + body + b"\n\n"
+    return b"id: %d\ndata: %s\n\n" % (event_id, body)
+
+
+def event_frame(event: StreamEvent, event_id: Optional[int] = None) -> bytes:
+    return encode_frame(event.type, event.data, event.message_id, event_id)
+
+
+def code_chunk(data: str, message_id: Optional[int]) -> StreamEvent:
+    """A code_chunk event without validation, for the per-token hot path"""
+    return StreamEvent.model_construct(
+        type="code_chunk", data=data, message_id=message_id
+    )
+
+
+def _merge(events: list[StreamEvent]) -> list[StreamEvent]:
+    """Join runs of consecutive code_chunk events into single events"""
+    merged: list[StreamEvent] = []
+    run: list[str] = []
+    for event in events:
+        if event.type == "code_chunk":
+            run.append(event.data or "")
+            continue
+        if run:
+            merged.append(code_chunk("".join(run), event.message_id))
+            run = []
+        merged.append(event)
+    if run:
+        merged.append(code_chunk("".join(run), events[-1].message_id))
+    return merged
+
+
+async def coalesce_code_chunks(
+    events: AsyncIterator[StreamEvent],
+    window_seconds: float,
+    max_bytes: int,
+) -> AsyncGenerator[StreamEvent, None]:
+    """
+    Merge consecutive ``code_chunk`` events. Buffered code is emitted
+    ``window_seconds`` after its first token, as soon as it holds
+    ``max_bytes``, or together with any other event, which is never
+    delayed. A window of 0 disables merging.
+
+    A reader task buffers events as they arrive, so the per-token cost is a
+    list append; this generator only wakes once per emitted batch.
+    """
+    if window_seconds <= 0:
+        async for event in events:
+            yield event
+        return
+
+    loop = asyncio.get_running_loop()
+    buffered: list[StreamEvent] = []
+    size = 0
+    finished = False
+    flush = asyncio.Event()
+    timer: Optional[asyncio.TimerHandle] = None
+
+    async def read() -> None:
+        nonlocal size, finished, timer
+        try:
+            async for event in events:
+                buffered.append(event)
+                if event.type != "code_chunk":
+                    flush.set()
+                    continue
+                size += len(event.data or "")
+                if size >= max_bytes:
+                    flush.set()
+                elif timer is None:
+                    # The window starts with the first buffered token
+                    timer = loop.call_later(window_seconds, flush.set)
+        finally:
+            finished = True
+            flush.set()
+
+    reader = asyncio.create_task(read())
+    try:
+        while True:
+            await flush.wait()
+            if timer is not None:
+                timer.cancel()
+                timer = None
+            batch = buffered[:]
+            buffered.clear()
+            size = 0
+            flush.clear()
+            for event in _merge(batch):
+                yield event
+            if finished and not buffered:
+                break
+        # Re-raise what ended the source, if it failed
+        await reader
+    finally:
+        if not reader.done():
+            # Cancelling the reader closes the source from inside
+            reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
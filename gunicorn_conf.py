@@ -1,8 +1,11 @@
 """Gunicorn configuration for production deployment."""
 
+import gc
 import multiprocessing
 import os
 
+from app.utils.memory import format_memory_usage, get_memory_usage
+
 # Server socket
 bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
 backlog = 2048
@@ -48,6 +51,15 @@ def on_starting(server):
     server.log.info("Starting Gunicorn server")
 
 
+def when_ready(server):
+    """Called just after the server is started, before workers are forked."""
+    # With preload_app the corpus is already loaded here. Freezing moves every
+    # object into a permanent generation so the GC in workers doesn't write to
+    # (and thereby copy) pages inherited from the master.
+    gc.freeze()
+    server.log.info(f"Master memory: {format_memory_usage(get_memory_usage())}")
+
+
 def on_reload(server):
     """Called to recycle workers during a reload via SIGHUP."""
     server.log.info("Reloading Gunicorn server")
@@ -65,7 +77,18 @@ def pre_fork(server, worker):
 
 def post_fork(server, worker):
     """Called just after a worker has been forked."""
-    server.log.info(f"Worker spawned (pid: {worker.pid})")
+    server.log.info(
+        f"Worker spawned (pid: {worker.pid}), memory before init: "
+        f"{format_memory_usage(get_memory_usage())}"
+    )
+
+
+def post_worker_init(worker):
+    """Called just after a worker has initialized the application."""
+    worker.log.info(
+        f"Worker {worker.pid} memory after init: "
+        f"{format_memory_usage(get_memory_usage())}"
+    )
 
 
 def worker_abort(worker):
@@ -0,0 +1,192 @@
+"""
+Benchmark SSE framing of code streams.
+
+Simulates concurrent streams of code tokens arriving at a fixed rate and
+frames them three ways: the original per-token path (validated StreamEvent,
+model_dump, json.dumps), the pre-encoded per-token path, and the
+pre-encoded path with code_chunk coalescing. Frames are written to a local
+TCP connection, as the server writes them to clients, and drained by a
+separate process whose CPU time is not counted. Reports frames,
+frames/sec, bytes and CPU time per stream.
+
+Usage:
+    python -m scripts.benchmark_sse [--streams 200] [--tokens 400]
+        [--token-interval-ms 10] [--window-ms 20] [--max-bytes 512]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import socket
+import socketserver
+import sys
+import time
+from typing import AsyncGenerator, AsyncIterator, Callable, Optional
+
+from app.schemas.stream import StreamEvent
+from app.utils import sse
+from app.utils.sse import coalesce_code_chunks, code_chunk, event_frame
+
+TOKENS = ["self", ".", "play", "(", "Create", "(", "c", "))", "\n", "        "]
+
+
+async def token_events(
+    message_id: int, n_tokens: int, interval: float, validated: bool
+) -> AsyncGenerator[StreamEvent, None]:
+    """A message's events as process_message_stream yields them"""
+    for i in range(n_tokens):
+        token = TOKENS[i % len(TOKENS)]
+        if validated:
+            yield StreamEvent(type="code_chunk", data=token, message_id=message_id)
+        else:
+            yield code_chunk(token, message_id)
+        if interval:
+            await asyncio.sleep(interval)
+    yield StreamEvent(type="completed", data="done", message_id=message_id)
+
+
+def pydantic_frame(event: StreamEvent) -> bytes:
+    return f"data: {json.dumps(event.model_dump())}\n\n".encode("utf-8")
+
+
+class _DiscardHandler(socketserver.BaseRequestHandler):
+    def handle(self) -> None:
+        while self.request.recv(65536):
+            pass
+
+
+class _SinkServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    # Every stream connects at once
+    request_queue_size = 1024
+
+
+def _serve_sink(port: "multiprocessing.Value") -> None:
+    with _SinkServer(("127.0.0.1", 0), _DiscardHandler) as srv:
+        port.value = srv.server_address[1]
+        srv.serve_forever()
+
+
+def start_sink() -> tuple[multiprocessing.Process, int]:
+    """A client stand-in in another process that reads and discards"""
+    port = multiprocessing.Value("i", 0)
+    process = multiprocessing.Process(target=_serve_sink, args=(port,), daemon=True)
+    process.start()
+    while not port.value:
+        time.sleep(0.01)
+    return process, port.value
+
+
+async def consume(frames: AsyncIterator[bytes], port: int) -> tuple[int, int]:
+    _, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.get_extra_info("socket").setsockopt(
+        socket.IPPROTO_TCP, socket.TCP_NODELAY, 1
+    )
+    count = size = 0
+    async for frame in frames:
+        writer.write(frame)
+        await writer.drain()
+        count += 1
+        size += len(frame)
+    writer.close()
+    await writer.wait_closed()
+    return count, size
+
+
+async def run_variant(
+    streams: int,
+    port: int,
+    make_frames: Callable[[int], AsyncIterator[bytes]],
+) -> dict:
+    wall, cpu = time.perf_counter(), time.process_time()
+    results = await asyncio.gather(
+        *(consume(make_frames(i), port) for i in range(streams))
+    )
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    frames = sum(count for count, _ in results)
+    return {
+        "frames": frames,
+        "frames_per_stream": frames / streams,
+        "frames_per_sec": frames / wall,
+        "kb_per_stream": sum(size for _, size in results) / streams / 1024,
+        "cpu_ms_per_stream": cpu * 1000 / streams,
+        "wall_s": wall,
+    }
+
+
+async def run(
+    streams: int,
+    n_tokens: int,
+    interval: float,
+    window: float,
+    max_bytes: int,
+    port: int,
+) -> dict[str, dict]:
+    async def original(i: int) -> AsyncGenerator[bytes, None]:
+        async for event in token_events(i, n_tokens, interval, validated=True):
+            yield pydantic_frame(event)
+
+    async def pre_encoded(i: int) -> AsyncGenerator[bytes, None]:
+        async for event in token_events(i, n_tokens, interval, validated=False):
+            yield event_frame(event)
+
+    async def coalesced(i: int) -> AsyncGenerator[bytes, None]:
+        events = token_events(i, n_tokens, interval, validated=False)
+        async for event in coalesce_code_chunks(events, window, max_bytes):
+            yield event_frame(event)
+
+    variants = {
+        "per-token pydantic": original,
+        "per-token pre-encoded": pre_encoded,
+        f"coalesced {window * 1000:g}ms/{max_bytes}B": coalesced,
+    }
+    return {
+        name: await run_variant(streams, port, make_frames)
+        for name, make_frames in variants.items()
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--tokens", type=int, default=400)
+    parser.add_argument("--token-interval-ms", type=float, default=10.0)
+    parser.add_argument("--window-ms", type=float, default=20.0)
+    parser.add_argument("--max-bytes", type=int, default=512)
+    args = parser.parse_args(argv)
+
+    encoder = "json" if sse.orjson is None else "orjson"
+    print(
+        f"{args.streams} concurrent streams x {args.tokens} tokens, one token "
+        f"every {args.token_interval_ms:g} ms per stream, {encoder} encoder\n"
+    )
+    print(
+        f"{'framing':<28}{'frames':>9}{'/stream':>9}{'frames/s':>11}"
+        f"{'KB/stream':>11}{'CPU ms/stream':>15}"
+    )
+    sink, port = start_sink()
+    try:
+        rows = asyncio.run(
+            run(
+                args.streams,
+                args.tokens,
+                args.token_interval_ms / 1000,
+                args.window_ms / 1000,
+                args.max_bytes,
+                port,
+            )
+        )
+    finally:
+        sink.terminate()
+    for name, row in rows.items():
+        print(
+            f"{name:<28}{row['frames']:>9}{row['frames_per_stream']:>9.1f}"
+            f"{row['frames_per_sec']:>11.0f}{row['kb_per_stream']:>11.1f}"
+            f"{row['cpu_ms_per_stream']:>15.2f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
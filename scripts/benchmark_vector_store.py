@@ -0,0 +1,169 @@
+"""
+Benchmark the quantized vector store against exact float32 search.
+
+Reports, per configuration, the resident memory of the searchable
+representation, query latency and recall@k relative to NumpyVectorStore.
+Uses a built embedding matrix when given, otherwise a synthetic clustered
+corpus so larger-than-today sizes can be tried.
+
+Usage:
+    python -m scripts.benchmark_vector_store [--n 50000] [--dim 768] [--k 4]
+    python -m scripts.benchmark_vector_store \\
+        --embeddings embedding_index/embeddings-<version>.npy
+"""
+
+import argparse
+import sys
+import time
+from typing import Optional
+
+import numpy as np
+
+from app.services.vector_store import (
+    NumpyVectorStore,
+    QuantizedVectorStore,
+    VectorStoreInterface,
+    normalize_rows,
+)
+
+CONFIGS = [
+    {"dtype": "float16"},
+    {"dtype": "int8"},
+    {"dtype": "int8", "pca_dim": 256},
+    {"dtype": "int8", "pca_dim": 128},
+]
+
+
+def synthetic_corpus(n: int, dim: int, clusters: int = 64, seed: int = 0) -> np.ndarray:
+    """
+    Clustered unit vectors whose variance decays with a power law across
+    random directions, like real sentence embeddings (white noise would make
+    every PCA truncation look equally bad)
+    """
+    rng = np.random.default_rng(seed)
+    basis, _ = np.linalg.qr(rng.standard_normal((dim, dim)))
+    spectrum = 1.0 / np.sqrt(np.arange(1, dim + 1))
+    centers = rng.standard_normal((clusters, dim)) * spectrum
+    labels = rng.integers(0, clusters, n)
+    noise = 0.6 * rng.standard_normal((n, dim)) * spectrum
+    return normalize_rows(((centers[labels] + noise) @ basis.T).astype(np.float32))
+
+
+def make_queries(corpus: np.ndarray, n: int, seed: int = 1) -> np.ndarray:
+    """Perturbed corpus rows, so every query has close neighbours"""
+    rng = np.random.default_rng(seed)
+    rows = corpus[rng.integers(0, len(corpus), n)]
+    noise = rng.standard_normal(rows.shape).astype(np.float32)
+    return normalize_rows(rows + 0.5 * noise / np.sqrt(corpus.shape[1]))
+
+
+def time_queries(
+    store: VectorStoreInterface, queries: np.ndarray, k: int
+) -> tuple[np.ndarray, list[float]]:
+    """Search one query at a time, as the request path does"""
+    latencies = []
+    ids = []
+    for query in queries:
+        start = time.perf_counter()
+        _, row_ids = store.search(query[np.newaxis, :], k)
+        latencies.append(time.perf_counter() - start)
+        ids.append(row_ids[0])
+    return np.vstack(ids), latencies
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def run(
+    corpus: np.ndarray,
+    n_queries: int,
+    k: int,
+    rerank_factor: int,
+    configs: Optional[list[dict]] = None,
+) -> list[dict]:
+    queries = make_queries(corpus, n_queries)
+    exact = NumpyVectorStore(corpus, normalized=True)
+    truth, exact_latencies = time_queries(exact, queries, k)
+
+    rows = [_row("float32 exact", corpus.nbytes, corpus.nbytes, exact_latencies, 1.0)]
+    for params in configs or CONFIGS:
+        for rerank in (False, True):
+            store = QuantizedVectorStore(
+                corpus,
+                normalized=True,
+                rerank_factor=rerank_factor,
+                rerank_source=corpus if rerank else None,
+                **params,
+            )
+            found, latencies = time_queries(store, queries, k)
+            label = params["dtype"]
+            if params.get("pca_dim"):
+                label += f" pca{params['pca_dim']}"
+            if rerank:
+                label += f" +rerank x{rerank_factor}"
+            rows.append(
+                _row(
+                    label,
+                    store.nbytes,
+                    corpus.nbytes,
+                    latencies,
+                    recall_at_k(found, truth),
+                )
+            )
+    return rows
+
+
+def _row(
+    label: str, nbytes: int, baseline: int, latencies: list[float], recall: float
+) -> dict:
+    ms = np.asarray(latencies) * 1000
+    return {
+        "store": label,
+        "memory_mb": nbytes / 2**20,
+        "saved": 1 - nbytes / baseline,
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "recall": recall,
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--embeddings", help="(n, dim) .npy matrix to search")
+    parser.add_argument("--n", type=int, default=50_000, help="Synthetic size")
+    parser.add_argument("--dim", type=int, default=768, help="Synthetic dimension")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    if args.embeddings:
+        corpus = normalize_rows(np.load(args.embeddings))
+    else:
+        corpus = synthetic_corpus(args.n, args.dim)
+
+    print(
+        f"corpus {corpus.shape[0]} x {corpus.shape[1]}, "
+        f"{args.queries} queries, recall@{args.k} vs float32 exact\n"
+    )
+    print(
+        f"{'store':<28}{'memory MB':>10}{'saved':>8}"
+        f"{'p50 ms':>9}{'p95 ms':>9}{'recall':>8}"
+    )
+    for row in run(corpus, args.queries, args.k, args.rerank_factor):
+        print(
+            f"{row['store']:<28}{row['memory_mb']:>10.1f}{row['saved']:>8.0%}"
+            f"{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['recall']:>8.3f}"
+        )
+    print(
+        "\nRe-ranking reads shortlist rows from the float32 matrix, which the "
+        "service memory-maps from the shared corpus segment, so it adds no "
+        "resident memory per worker."
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
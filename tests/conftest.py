@@ -0,0 +1,22 @@
+import os
+import sys
+from pathlib import Path
+
+# The app imports its own packages both as ``app.x`` and, as under uvicorn
+# with PYTHONPATH=app, as top-level ``core``/``schemas``/``services``
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+sys.path.insert(0, str(APP_DIR))
+
+# Settings validate on import; unit tests never reach these services
+for name in (
+    "DATABASE_URL",
+    "OPENAI_API_KEY",
+    "GEMINI_API_KEY",
+    "OPENAI_LLM",
+    "CLOUDINARY_CLOUD_NAME",
+    "CLOUDINARY_API_KEY",
+    "CLOUDINARY_SECRET",
+    "CLOUDINARY_FOLDER_NAME",
+):
+    os.environ.setdefault(name, "test")
+os.environ.setdefault("PYTHONPATH", str(APP_DIR))
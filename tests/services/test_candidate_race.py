@@ -0,0 +1,113 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.candidate_race import Candidate, CandidateRace
+from app.services.code_validator import DEFAULT_ALLOWED_IMPORTS
+
+VALID = """from manim import *
+
+
+class GenScene(Scene):
+    def construct(self):
+        self.play(Create(Circle()))
+"""
+INVALID = "import os\n" + VALID
+
+
+class FakeLLM:
+    """Per model: a reply (or exception) after a delay in seconds"""
+
+    def __init__(self, **replies):
+        self.replies = replies
+        self.calls = []
+        self.cancelled = []
+
+    async def ainvoke(self, prompt, model=None, temperature=None):
+        self.calls.append(model)
+        reply, delay = self.replies[model]
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(model)
+            raise
+        if isinstance(reply, Exception):
+            raise reply
+        return SimpleNamespace(content=reply)
+
+
+def race(llm, *models, max_concurrency=16):
+    candidates = [Candidate.parse(model) for model in models]
+    return CandidateRace(
+        llm,
+        candidates,
+        DEFAULT_ALLOWED_IMPORTS,
+        dry_run=False,
+        max_concurrency=max_concurrency,
+    )
+
+
+def test_candidate_parse():
+    assert Candidate.parse("gpt-4o@0.7") == Candidate("gpt-4o", 0.7)
+    assert str(Candidate.parse("gpt-4o")) == "gpt-4o"
+
+
+def test_first_valid_candidate_wins_and_the_rest_are_cancelled():
+    llm = FakeLLM(
+        slow=(VALID, 10), fast=(VALID, 0.02), faster=(INVALID, 0.01), later=(VALID, 5)
+    )
+    racer = race(llm, "slow", "fast", "faster", "later")
+
+    result = asyncio.run(racer.run("draw a circle"))
+
+    assert (result.model, result.slot, result.valid) == ("fast", 1, True)
+    assert sorted(llm.cancelled) == ["later", "slow"]
+    assert [slot["cancelled"] for slot in racer.slots] == [1, 0, 0, 1]
+    assert racer.slots[2]["invalid"] == 1
+    assert racer.in_flight == 0
+
+
+def test_without_a_valid_candidate_the_lowest_slot_falls_back():
+    llm = FakeLLM(a=(RuntimeError("down"), 0), b=(INVALID, 0.01), c=(INVALID, 0))
+    racer = race(llm, "a", "b", "c")
+
+    result = asyncio.run(racer.run("draw a circle"))
+
+    assert (result.model, result.valid) == ("b", False)
+    assert racer.counts["no_valid_candidate"] == 1
+    assert racer.slots[0]["errors"] == 1
+
+
+def test_every_candidate_failing_raises_the_error():
+    llm = FakeLLM(a=(RuntimeError("down"), 0))
+
+    with pytest.raises(RuntimeError, match="down"):
+        asyncio.run(race(llm, "a").run("draw a circle"))
+
+
+def test_race_narrows_to_the_room_in_the_budget():
+    llm = FakeLLM(a=(VALID, 0), b=(VALID, 0), c=(VALID, 0))
+    racer = race(llm, "a", "b", "c", max_concurrency=2)
+
+    asyncio.run(racer.run("draw a circle"))
+
+    assert [slot["launched"] for slot in racer.slots] == [1, 1, 0]
+    assert [slot["skipped"] for slot in racer.slots] == [0, 0, 1]
+    assert racer.counts["narrowed"] == 1
+
+
+def test_under_load_the_first_slot_waits_and_the_others_are_skipped():
+    llm = FakeLLM(a=(VALID, 0.05), b=(VALID, 0))
+    racer = race(llm, "a", "b", max_concurrency=1)
+
+    async def run():
+        return await asyncio.gather(racer.run("one"), racer.run("two"))
+
+    first, second = asyncio.run(run())
+
+    assert first.valid and second.valid
+    assert llm.calls == ["a", "a"]
+    assert racer.slots[1]["skipped"] == 2
+    assert racer.counts["narrowed"] == 2
+    assert racer.in_flight == 0
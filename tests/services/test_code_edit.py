@@ -0,0 +1,83 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.code_edit import CodeEditor, apply_reply
+from app.utils.line_edits import LineEditError
+
+SCRIPT = """from manim import *
+
+
+class GenScene(Scene):
+    def construct(self):
+        circle = Circle(color=BLUE)
+        self.play(Create(circle))
+"""
+
+
+class FakeLLM:
+    def __init__(self, reply):
+        self.reply = reply
+
+    async def ainvoke(self, prompt, **kwargs):
+        if isinstance(self.reply, Exception):
+            raise self.reply
+        return SimpleNamespace(content=self.reply)
+
+
+class WordCounter:
+    def count(self, text):
+        return len(text.split())
+
+
+def test_apply_reply_with_edits():
+    code, patched = apply_reply(SCRIPT, "@@ 6,6\n        circle = Circle(color=RED)")
+
+    assert patched
+    assert code == SCRIPT.replace("BLUE", "RED")
+
+
+def test_apply_reply_with_a_full_script():
+    code, patched = apply_reply(SCRIPT, SCRIPT.replace("Circle", "Square"))
+
+    assert not patched
+    assert "Square(color=BLUE)" in code
+
+
+def test_apply_reply_with_neither_raises():
+    with pytest.raises(LineEditError):
+        apply_reply(SCRIPT, "I made the circle red.")
+
+
+def test_edit_counts_a_patch_and_its_token_ratio():
+    editor = CodeEditor(
+        FakeLLM("@@ 6,6\n        circle = Circle(color=RED)\n"), WordCounter()
+    )
+
+    result = asyncio.run(editor.edit(SCRIPT, "make it red"))
+
+    assert result.patched
+    assert "RED" in result.code
+    stats = editor.stats()
+    assert stats["patched"] == 1
+    assert stats["output_token_ratio"]["max"] < 0.5
+
+
+def test_edit_that_breaks_the_script_raises():
+    editor = CodeEditor(FakeLLM("@@ 1,1\nimport os\n"), WordCounter())
+
+    with pytest.raises(LineEditError):
+        asyncio.run(editor.edit(SCRIPT, "use os"))
+
+    assert editor.counts["failed"] == 1
+    assert editor.failures_by_reason == {"edits": 1}
+
+
+def test_llm_error_is_counted_and_raised():
+    editor = CodeEditor(FakeLLM(TimeoutError("slow")), WordCounter())
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(editor.edit(SCRIPT, "make it red"))
+
+    assert editor.failures_by_reason == {"llm": 1}
@@ -0,0 +1,111 @@
+from app.services.code_validator import (
+    CodeValidationStats,
+    StreamingCodeValidator,
+    Violation,
+    validate_code,
+)
+
+SCRIPT = """from manim import *
+import math
+
+
+class GenScene(Scene):
+    def construct(self):
+        circle = Circle(radius=math.pi / 3)
+        self.play(Create(circle))
+"""
+
+
+def stream(code: str, size: int = 3) -> tuple[StreamingCodeValidator, int]:
+    """Feed ``code`` in small chunks; the validator and the chunks it took"""
+    validator = StreamingCodeValidator()
+    for fed, start in enumerate(range(0, len(code), size), start=1):
+        if validator.feed(code[start : start + size]) is not None:
+            return validator, fed
+    return validator, fed
+
+
+def test_valid_script_passes():
+    assert validate_code(SCRIPT) is None
+    validator, _ = stream(SCRIPT)
+    assert validator.finish() is None
+
+
+def test_markdown_fence():
+    violation = validate_code("```python\n" + SCRIPT + "```\n")
+
+    assert violation == Violation("markdown_fence", 1, "```python")
+
+
+def test_forbidden_import():
+    violation = validate_code(SCRIPT.replace("import math", "import os, math"))
+
+    assert violation.rule == "forbidden_import"
+    assert violation.detail == "os"
+    assert violation.line == 2
+
+
+def test_allowed_imports_are_configurable():
+    code = SCRIPT.replace("import math", "import numpy as np")
+
+    assert validate_code(code).rule == "forbidden_import"
+    assert validate_code(code, ["manim", "numpy"]) is None
+
+
+def test_prose_before_the_code():
+    violation = validate_code("Here is the animation you asked for:\n" + SCRIPT)
+
+    assert violation.rule == "prose"
+    assert violation.line == 1
+
+
+def test_syntax_error():
+    violation = validate_code(SCRIPT.replace("Circle(radius", "Circle(radius=="))
+
+    assert violation.rule == "syntax"
+    assert violation.line == 7
+
+
+def test_missing_scene():
+    violation = validate_code(SCRIPT.replace("GenScene", "MyScene"))
+
+    assert violation.rule == "missing_scene"
+
+
+def test_truncated_script_fails_at_finish_only():
+    truncated = SCRIPT[: SCRIPT.index("Create")]
+    validator, _ = stream(truncated)
+
+    assert validator.violation is None
+    assert validator.finish().rule == "syntax"
+
+
+def test_stream_stops_at_the_line_that_breaks_a_rule():
+    code = SCRIPT.replace("import math", "import subprocess") + "# " + "x" * 300
+
+    validator, fed = stream(code)
+
+    assert validator.violation.rule == "forbidden_import"
+    assert fed * 3 < code.index("class")
+
+
+def test_violation_is_sticky():
+    validator = StreamingCodeValidator()
+    validator.feed("import os\n")
+
+    assert validator.feed(SCRIPT) == validator.finish()
+    assert validator.violation.rule == "forbidden_import"
+
+
+def test_stats_count_aborts_and_rejections_by_rule():
+    stats = CodeValidationStats()
+    stats.record(None, streaming=True)
+    stats.record(Violation("prose", 1, "x"), streaming=True)
+    stats.record(Violation("syntax", 3, "x"), streaming=False)
+
+    snapshot = stats.stats()
+
+    assert snapshot["validated"] == 3
+    assert snapshot["passed"] == 1
+    assert snapshot["aborted"] == 1
+    assert snapshot["rejected"] == 1
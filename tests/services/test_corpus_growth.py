@@ -0,0 +1,70 @@
+import json
+
+import numpy as np
+
+from app.services.corpus_growth import CorpusGrowth
+
+
+def growth(log_path, provider="provider-a", max_entries=10):
+    return CorpusGrowth(max_entries, provider, log_path=log_path)
+
+
+def commit(corpus, *codes):
+    for code in codes:
+        corpus.submit(f"prompt {code}", code, set())
+    batch = corpus.take_batch()
+    for i, entry in enumerate(batch):
+        entry.embedding = np.full(3, i, dtype=np.float32)
+    return corpus.commit(batch)
+
+
+def test_embeddings_are_logged_as_npy_and_reloaded(tmp_path):
+    log_path = tmp_path / "generated.jsonl"
+    commit(growth(log_path), "a = 1", "b = 2")
+
+    records = [json.loads(line) for line in log_path.read_text().splitlines()]
+    assert all("embedding" not in r for r in records)
+    assert [p.suffix for p in (tmp_path / "generated.jsonl.vectors").iterdir()] == [
+        ".npy"
+    ]
+
+    ready, stale = growth(log_path).load()
+
+    assert [e.content for e in ready] == ["a = 1", "b = 2"]
+    assert np.array_equal(ready[1].embedding, np.full(3, 1))
+    assert stale == []
+
+
+def test_another_providers_embeddings_are_not_reused(tmp_path):
+    log_path = tmp_path / "generated.jsonl"
+    commit(growth(log_path), "a = 1")
+
+    ready, stale = growth(log_path, provider="provider-b").load()
+
+    assert ready == []
+    assert [e.embedding for e in stale] == [None]
+
+
+def test_missing_vectors_file_means_embedding_again(tmp_path):
+    log_path = tmp_path / "generated.jsonl"
+    commit(growth(log_path), "a = 1")
+    for path in (tmp_path / "generated.jsonl.vectors").iterdir():
+        path.unlink()
+
+    ready, stale = growth(log_path).load()
+
+    assert ready == []
+    assert [e.content for e in stale] == ["a = 1"]
+
+
+def test_compaction_keeps_live_rows_and_drops_old_vectors_files(tmp_path):
+    log_path = tmp_path / "generated.jsonl"
+    corpus = growth(log_path, max_entries=1)
+    commit(corpus, "a = 1")
+    commit(corpus, "b = 2")
+
+    assert corpus.stats["compactions"] == 1
+    assert len(log_path.read_text().splitlines()) == 1
+    assert len(list((tmp_path / "generated.jsonl.vectors").iterdir())) == 1
+    ready, _ = growth(log_path, max_entries=1).load()
+    assert [e.content for e in ready] == ["b = 2"]
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+
+import numpy as np
+
+from app.services.embedding_cache import QueryEmbeddingCache, normalize_prompt
+
+
+def test_normalize_prompt():
+    assert normalize_prompt("  Draw a  RED circle!\n") == "draw a red circle"
+
+
+def test_hit_ignores_case_whitespace_and_end_punctuation():
+    cache = QueryEmbeddingCache()
+    cache.put("Draw a circle", "model", np.ones(3))
+
+    assert np.array_equal(cache.get("draw a  circle.", "model"), np.ones(3))
+    assert cache.get("draw a circle", "other-model") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_cached_embeddings_are_read_only():
+    cache = QueryEmbeddingCache()
+    cache.put("p", "model", np.ones(3))
+
+    assert not cache.get("p", "model").flags.writeable
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryEmbeddingCache(max_entries=2)
+    cache.put("a", "model", np.ones(2))
+    cache.put("b", "model", np.ones(2))
+    cache.get("a", "model")
+    cache.put("c", "model", np.ones(2))
+
+    assert cache.get("b", "model") is None
+    assert cache.get("a", "model") is not None
+    assert cache.evictions == 1
+
+
+def test_expired_entry_is_a_miss():
+    cache = QueryEmbeddingCache(ttl_seconds=-1)
+    cache.put("a", "model", np.ones(2))
+
+    assert cache.get("a", "model") is None
+    assert cache.expirations == 1
+    assert len(cache) == 0
+
+
+def test_persisted_entries_survive_a_restart(tmp_path):
+    path = tmp_path / "query_cache.npz"
+    cache = QueryEmbeddingCache(persist_path=path)
+    cache.put("short", "small", np.arange(2, dtype=np.float32))
+    cache.put("long", "large", np.arange(5, dtype=np.float32))
+    cache.save()
+
+    restored = QueryEmbeddingCache(persist_path=path)
+
+    assert len(restored) == 2
+    assert np.array_equal(restored.get("long", "large"), np.arange(5))
+    assert np.array_equal(restored.get("short", "small"), np.arange(2))
+
+
+def test_corrupt_cache_file_is_ignored(tmp_path):
+    path = tmp_path / "query_cache.npz"
+    path.write_bytes(b"not an npz file")
+
+    assert len(QueryEmbeddingCache(persist_path=path)) == 0
+
+
+def test_persisting_from_the_event_loop_runs_in_a_thread(tmp_path, monkeypatch):
+    cache = QueryEmbeddingCache(persist_path=tmp_path / "q.npz", persist_every=2)
+    save = cache.save
+    saved_on = []
+
+    def recording_save():
+        saved_on.append(threading.get_ident())
+        save()
+
+    monkeypatch.setattr(cache, "save", recording_save)
+
+    async def insert():
+        cache.put("a", "model", np.ones(2))
+        cache.put("b", "model", np.ones(2))
+        loop_thread = threading.get_ident()
+        await asyncio.sleep(0.2)
+        return loop_thread
+
+    loop_thread = asyncio.run(insert())
+
+    assert len(saved_on) == 1
+    assert saved_on[0] != loop_thread
+    assert len(QueryEmbeddingCache(persist_path=tmp_path / "q.npz")) == 2
+
+
+def test_persisting_outside_an_event_loop_saves_inline(tmp_path):
+    cache = QueryEmbeddingCache(persist_path=tmp_path / "q.npz", persist_every=1)
+    cache.put("a", "model", np.ones(2))
+
+    assert (tmp_path / "q.npz").exists()
@@ -0,0 +1,68 @@
+import numpy as np
+
+from app.services.lexical_index import BM25Index, reciprocal_rank_fusion
+
+CONTENTS = [
+    "circle = Circle()\nself.play(Create(circle))",
+    "square = Square()\nself.play(Rotate(square))",
+    "graph = axes.plot(lambda x: x**2)",
+]
+TITLES = ["Draw a circle", "Rotate a square", "Plot a parabola"]
+
+
+def test_search_ranks_matching_document_first():
+    index = BM25Index(CONTENTS, TITLES)
+
+    scores, ids = index.search("rotate the square", k=3)
+
+    assert ids[0] == 1
+    assert list(scores) == sorted(scores, reverse=True)
+
+
+def test_documents_without_a_match_are_omitted():
+    index = BM25Index(CONTENTS, TITLES)
+
+    _, ids = index.search("circle", k=3)
+
+    assert list(ids) == [0]
+
+
+def test_unknown_terms_score_zero():
+    index = BM25Index(CONTENTS, TITLES)
+
+    assert not index.scores("hexagon").any()
+    assert len(index.search("hexagon", k=3)[1]) == 0
+
+
+def test_title_terms_outweigh_content_terms():
+    contents = ["plot plot", "plot"]
+    titles = ["", "plot"]
+    index = BM25Index(contents, titles, title_weight=3)
+
+    assert np.argmax(index.scores("plot")) == 1
+
+
+def test_empty_index():
+    index = BM25Index([])
+
+    assert len(index) == 0
+    assert len(index.search("circle", k=5)[1]) == 0
+
+
+def test_rrf_favours_ids_ranked_high_in_both_lists():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [2, 1, 4]], k=60)
+
+    assert [doc_id for doc_id, _ in fused[:2]] == [1, 2]
+    assert fused[0][1] == 1 / 61 + 1 / 62
+
+
+def test_rrf_weights_scale_each_ranking():
+    fused = reciprocal_rank_fusion([[1], [2]], weights=[1.0, 2.0])
+
+    assert [doc_id for doc_id, _ in fused] == [2, 1]
+
+
+def test_rrf_ties_break_on_id():
+    fused = reciprocal_rank_fusion([[5], [3]])
+
+    assert [doc_id for doc_id, _ in fused] == [3, 5]
@@ -0,0 +1,158 @@
+import asyncio
+
+import pytest
+
+from app.services.chain_manager import CodeStreamCallback
+from app.services.code_validator import SCAFFOLD_STOP_SEQUENCES, validate_code
+from app.services.llm_client import LLMClient, create_llm_client
+from app.services.reasoning_filter import (
+    ReasoningFilter,
+    reasoning_options,
+    strip_reasoning,
+)
+
+CODE = """from manim import *
+
+
+class GenScene(Scene):
+    def construct(self):
+        self.play(Create(Circle()))
+"""
+
+PREAMBLES = [
+    "",
+    "<think>\nThe user wants a circle, so Create(Circle()).\n</think>\n\n",
+    "Okay, let me draw a circle.\nI'll use Create.\n\n",
+    "<think>plan</think>\nSure, here it is:\n",
+]
+
+
+def stream(text: str, size: int) -> tuple[str, str]:
+    """(code, reasoning) of ``text`` fed to a filter ``size`` chars at a time"""
+    reasoning_filter = ReasoningFilter()
+    code, reasoning = [], []
+    for start in range(0, len(text), size):
+        chunk_code, chunk_reasoning = reasoning_filter.feed(text[start : start + size])
+        code.append(chunk_code)
+        reasoning.append(chunk_reasoning)
+    rest_code, rest_reasoning = reasoning_filter.flush()
+    return "".join(code) + rest_code, "".join(reasoning) + rest_reasoning
+
+
+@pytest.mark.parametrize("preamble", PREAMBLES)
+@pytest.mark.parametrize("size", [1, 3, 1000])
+def test_preamble_is_split_from_the_code(preamble, size):
+    code, reasoning = stream(preamble + CODE, size)
+
+    assert code == CODE
+    assert reasoning == preamble
+
+
+@pytest.mark.parametrize("size", [1, 4, 1000])
+def test_markdown_heading_in_the_reasoning_is_not_code(size):
+    preamble = "### Plan\nWe draw a circle and animate it.\n\n"
+
+    code, reasoning = stream(preamble + CODE, size)
+
+    assert code == CODE
+    assert reasoning == preamble
+    assert validate_code(strip_reasoning(preamble + CODE)) is None
+
+
+@pytest.mark.parametrize("size", [1, 4, 1000])
+def test_comments_right_before_the_code_are_code(size):
+    code, reasoning = stream("Sure.\n# A circle\n" + CODE, size)
+
+    assert code == "# A circle\n" + CODE
+    assert reasoning == "Sure.\n"
+
+
+@pytest.mark.parametrize("size", [1, 2, 5, 1000])
+def test_fenced_code_loses_both_fences(size):
+    reply = "Here it is:\n```python\n" + CODE + "```\nThis draws a circle.\n"
+
+    code, reasoning = stream(reply, size)
+
+    assert code == CODE
+    assert reasoning == "Here it is:\n```python\n```\nThis draws a circle.\n"
+    assert validate_code(strip_reasoning(reply)) is None
+
+
+def test_fenced_code_without_a_closing_fence():
+    assert strip_reasoning("```python\n" + CODE.rstrip("\n")) == CODE.rstrip("\n")
+
+
+def test_backticks_inside_fenced_code_are_kept():
+    code = CODE + 'label = Text("``x``")\n'
+
+    assert strip_reasoning("```\n" + code + "```") == code
+
+
+def test_everything_after_the_code_starts_passes_through():
+    text = CODE + "\n# Sure, this is a comment\n<think>not reasoning</think>\n"
+
+    assert strip_reasoning(text) == text
+
+
+def test_unclosed_think_block_is_all_reasoning():
+    code, reasoning = stream("<think>\nfrom manim import *\n", 4)
+
+    assert code == ""
+    assert reasoning == "<think>\nfrom manim import *\n"
+
+
+def test_code_without_trailing_newline_is_flushed():
+    assert strip_reasoning("Sure.\nx = 1") == "x = 1"
+
+
+@pytest.mark.parametrize("preamble", PREAMBLES + ["```python\n"])
+def test_default_stop_sequences_do_not_cut_off_the_code(preamble):
+    response = preamble + CODE + "```\n"
+
+    for stop in SCAFFOLD_STOP_SEQUENCES:
+        assert stop not in response
+
+
+def test_default_stop_sequences_end_a_main_guard():
+    response = CODE + '\nif __name__ == "__main__":\n    GenScene().render()\n'
+
+    assert any(stop in response for stop in SCAFFOLD_STOP_SEQUENCES)
+
+
+def test_client_sends_stop_and_reasoning_options():
+    client = LLMClient(
+        "model",
+        "key",
+        "http://localhost",
+        stop=["\nif __name__"],
+        reasoning=reasoning_options("low", None, True),
+    )
+
+    assert client._request_options() == {
+        "stop": ["\nif __name__"],
+        "extra_body": {"reasoning": {"effort": "low", "exclude": True}},
+    }
+    assert LLMClient("model", "key", "http://localhost")._request_options() == {}
+
+
+def test_configured_client_uses_the_scaffold_stops_by_default():
+    assert create_llm_client().stop == list(SCAFFOLD_STOP_SEQUENCES)
+
+
+def test_callback_counts_only_classified_tokens():
+    callback = CodeStreamCallback()
+    tokens = ["<think>", "plan", "</think>\n", "Sure", ", here", ":\n"]
+    tokens += ["from manim", " import *\n", "x = 1\n"]
+
+    async def run():
+        for token in tokens:
+            await callback.on_llm_new_token(token)
+        await callback.on_llm_end(None)
+        return [token async for token in callback.astream()]
+
+    code = asyncio.run(run())
+
+    assert "".join(code) == "from manim import *\nx = 1\n"
+    assert callback.code_tokens == 2
+    # "Sure" and ", here" are held until ":\n" ends the line
+    assert callback.reasoning_tokens == 4
@@ -0,0 +1,164 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import render_repair
+from app.services.render_repair import RenderRepairer, compact_traceback
+from app.services.render_service import RenderError
+from app.utils.line_edits import LineEditError
+
+BROKEN = """from manim import *
+
+
+class GenScene(Scene):
+    def construct(self):
+        self.play(Create(Circl()))
+"""
+FIX = "@@ 6,6\n        self.play(Create(Circle()))\n"
+
+
+class FakeLLM:
+    """Answers every repair request with the next of ``replies``"""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.prompts = []
+
+    async def ainvoke(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return SimpleNamespace(content=reply)
+
+
+class WordCounter:
+    def count(self, text):
+        return len(text.split())
+
+
+@pytest.fixture(autouse=True)
+def fake_manim(monkeypatch):
+    """Scripts render unless they use the misspelt ``Circl``"""
+    rendered = []
+
+    def render(script, timeout=None):
+        rendered.append(script)
+        if "Circl(" in script:
+            stderr = f"NameError: name 'Circl' (render {len(rendered)})"
+            raise RenderError("Rendering failed", stderr)
+        return "/videos/out.mp4"
+
+    monkeypatch.setattr(render_repair, "render_manim_script", render)
+    return rendered
+
+
+def repairer(llm, **kwargs):
+    return RenderRepairer(llm, WordCounter(), **kwargs)
+
+
+def test_first_render_needs_no_repair():
+    llm = FakeLLM()
+    repair = repairer(llm)
+
+    result = asyncio.run(repair.render(BROKEN.replace("Circl(", "Circle(")))
+
+    assert result.attempts == 0
+    assert llm.prompts == []
+    assert repair.counts["first_try"] == 1
+
+
+def test_repair_applies_edits_and_renders_again():
+    llm = FakeLLM(FIX)
+    repair = repairer(llm)
+
+    result = asyncio.run(repair.render(BROKEN))
+
+    assert result.video_path == "/videos/out.mp4"
+    assert result.attempts == 1
+    assert "Create(Circle())" in result.script
+    assert "NameError" in llm.prompts[0]
+    assert "6 |         self.play(Create(Circl()))" in llm.prompts[0]
+    assert repair.counts["repaired"] == 1
+
+
+def test_llm_error_raises_the_original_render_error():
+    repair = repairer(FakeLLM(ConnectionError("upstream down")))
+
+    with pytest.raises(RenderError) as excinfo:
+        asyncio.run(repair.render(BROKEN))
+
+    assert "Circl" in excinfo.value.stderr
+    assert isinstance(excinfo.value.__cause__, ConnectionError)
+    assert repair.counts["repair_errors"] == 1
+    assert repair.counts["failed"] == 1
+
+
+def test_unusable_edits_count_as_failed_attempts():
+    repair = repairer(FakeLLM("Sorry, I can't help", "@@ 40,40\nx\n"))
+
+    with pytest.raises(RenderError) as excinfo:
+        asyncio.run(repair.render(BROKEN))
+
+    assert isinstance(excinfo.value.__cause__, LineEditError)
+    assert repair.counts["attempts"] == 2
+    assert repair.counts["unusable_edits"] == 2
+    assert repair.counts["failed"] == 1
+
+
+def test_invalid_script_is_repaired_without_running_manim(fake_manim):
+    invalid = "import os\n" + BROKEN.replace("Circl(", "Circle(")
+    repair = repairer(FakeLLM("@@ 1,1\n"))
+
+    result = asyncio.run(repair.render(invalid))
+
+    assert result.attempts == 1
+    assert fake_manim == [result.script]
+
+
+def test_a_later_render_error_is_the_one_raised():
+    still_broken = "@@ 6,6\n        self.play(Create(Circl(radius=2)))\n"
+    repair = repairer(FakeLLM(still_broken, "no edits here"), max_attempts=2)
+
+    with pytest.raises(RenderError) as excinfo:
+        asyncio.run(repair.render(BROKEN))
+
+    assert "(render 2)" in excinfo.value.stderr
+    assert isinstance(excinfo.value.__cause__, LineEditError)
+    assert repair.counts["unusable_edits"] == 1
+
+
+def test_no_attempts_after_the_deadline():
+    repair = repairer(FakeLLM(FIX), deadline_seconds=0)
+
+    with pytest.raises(RenderError):
+        asyncio.run(repair.render(BROKEN))
+
+    assert repair.counts["attempts"] == 0
+    assert repair.counts["deadline_exceeded"] == 1
+
+
+def test_compact_traceback_strips_colours_borders_and_blank_lines():
+    stderr = (
+        "\x1b[31m╭──── Traceback ────╮\x1b[0m\n"
+        "│ scene.py:6 in construct │\n"
+        "\n"
+        "╰───────────────────╯\n"
+        "NameError: name 'Circl' is not defined\n"
+    )
+
+    compact = compact_traceback(stderr)
+
+    assert compact.splitlines()[-1] == "NameError: name 'Circl' is not defined"
+    assert "\x1b" not in compact
+    assert "─" not in compact
+    assert "" not in [line.strip() for line in compact.splitlines()]
+
+
+def test_compact_traceback_keeps_the_end():
+    stderr = "\n".join(f"line {i}" for i in range(100))
+
+    compact = compact_traceback(stderr, max_lines=3)
+
+    assert compact == "line 97\nline 98\nline 99"
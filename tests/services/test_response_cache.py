@@ -0,0 +1,98 @@
+import numpy as np
+
+from app.services.response_cache import ResponseCache
+
+
+def test_exact_hit_on_normalized_prompt():
+    cache = ResponseCache()
+    cache.put("Draw a circle.", "model", "v1", "code")
+
+    assert cache.get("draw a  circle", "model", "v1") == "code"
+    assert cache.counts["exact_hits"] == 1
+
+
+def test_entries_are_per_model_and_corpus_version():
+    cache = ResponseCache()
+    cache.put("draw a circle", "model", "v1", "code")
+
+    assert cache.get("draw a circle", "model", "v2") is None
+    assert cache.get("draw a circle", "other", "v1") is None
+
+
+def test_semantic_hit_above_threshold():
+    cache = ResponseCache(semantic_threshold=0.9)
+    cache.put("draw a circle", "model", "v1", "code", np.array([1.0, 0.0]))
+
+    hit = cache.get_similar("draw one circle", "model", "v1", np.array([1.0, 0.1]))
+    miss = cache.get_similar("plot a graph", "model", "v1", np.array([0.0, 1.0]))
+
+    assert hit == "code"
+    assert miss is None
+    assert cache.counts["semantic_hits"] == 1
+    assert cache.counts["misses"] == 1
+
+
+def test_semantic_hit_needs_the_same_numbers():
+    cache = ResponseCache(semantic_threshold=0.9)
+    cache.put("a square of side 2", "model", "v1", "code", np.array([1.0, 0.0]))
+
+    assert (
+        cache.get_similar("a square of side 3", "model", "v1", np.array([1.0, 0.0]))
+        is None
+    )
+
+
+def test_semantic_tier_can_be_disabled():
+    cache = ResponseCache(semantic_threshold=None)
+    cache.put("draw a circle", "model", "v1", "code", np.array([1.0, 0.0]))
+
+    assert (
+        cache.get_similar("draw one circle", "model", "v1", np.array([1.0, 0.0]))
+        is None
+    )
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", "model", "v1", "code a")
+    cache.put("b", "model", "v1", "code b")
+    cache.get("a", "model", "v1")
+    cache.put("c", "model", "v1", "code c")
+
+    assert cache.get("b", "model", "v1") is None
+    assert cache.get("a", "model", "v1") == "code a"
+    assert cache.counts["evictions"] == 1
+
+
+def test_expired_entries_are_dropped():
+    cache = ResponseCache(ttl_seconds=-1)
+    cache.put("a", "model", "v1", "code", np.array([1.0, 0.0]))
+
+    assert cache.get("a", "model", "v1") is None
+    assert cache.get_similar("a", "model", "v1", np.array([1.0, 0.0])) is None
+    assert cache.counts["expirations"] == 1
+
+
+def test_discard_removes_entry_from_both_tiers():
+    cache = ResponseCache(semantic_threshold=0.9)
+    cache.put("draw a circle", "model", "v1", "code", np.array([1.0, 0.0]))
+    cache.get_similar("draw one circle", "model", "v1", np.array([1.0, 0.0]))
+    cache.discard("draw a circle", "model", "v1")
+
+    assert cache.get("draw a circle", "model", "v1") is None
+    assert (
+        cache.get_similar("draw one circle", "model", "v1", np.array([1.0, 0.0]))
+        is None
+    )
+
+
+def test_stats_do_not_expose_prompts():
+    cache = ResponseCache()
+    cache.put("my secret prompt", "model", "v1", "code")
+    cache.get("my secret prompt", "model", "v1")
+
+    stats = cache.stats()
+
+    assert "my secret prompt" not in repr(stats)
+    assert stats["top_entries"][0]["hits"] == 1
+    assert stats["hit_rate"] == 1.0
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from app.services.lexical_index import BM25Index
+from app.services.retrieval import RetrievalCorpus
+from app.services.vector_store import NumpyVectorStore
+
+CONTENTS = [
+    "circle = Circle()\nself.play(Create(circle))",
+    "square = Square()\nself.play(Rotate(square))",
+    "graph = axes.plot(lambda x: x**2)",
+]
+TITLES = ["Draw a circle", "Rotate a square", "Plot a parabola"]
+QUERIES = ["draw a circle", "rotate the square", "plot x squared"]
+
+
+class CountingStore(NumpyVectorStore):
+    def __init__(self, embeddings):
+        super().__init__(embeddings)
+        self.searches = 0
+
+    def search(self, queries, k):
+        self.searches += 1
+        return super().search(queries, k)
+
+
+def corpus(mode):
+    documents = [Document(page_content=c) for c in CONTENTS]
+    store = CountingStore(np.eye(3, dtype=np.float32))
+    return RetrievalCorpus(
+        "examples", documents, store, BM25Index(CONTENTS, TITLES), mode
+    )
+
+
+@pytest.mark.parametrize("mode", ["hybrid", "vector", "lexical"])
+def test_batch_ranking_matches_ranking_one_query_at_a_time(mode):
+    embeddings = np.array([[1, 0, 0], [0, 1, 0], [0, 0.2, 1]], dtype=np.float32)
+    examples = corpus(mode)
+
+    batch = examples.rank_batch(QUERIES, embeddings, k=2)
+
+    assert batch == [examples.rank(q, e, k=2) for q, e in zip(QUERIES, embeddings)]
+
+
+def test_batch_ranking_searches_the_vector_store_once():
+    examples = corpus("hybrid")
+
+    examples.rank_batch(QUERIES, np.eye(3, dtype=np.float32), k=2)
+
+    assert examples.vector_store.searches == 1
+
+
+def test_batch_ranking_without_embeddings_is_lexical():
+    ranked = corpus("hybrid").rank_batch(QUERIES, None, k=1)
+
+    assert [r[0][0] for r in ranked] == [0, 1, 2]
@@ -0,0 +1,100 @@
+import asyncio
+
+from schemas.stream import StreamMarkers
+
+from app.services.single_flight import SingleFlight
+
+
+class Source:
+    """Upstream that yields whatever is put on ``queue``; an exception raises"""
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self.calls = 0
+        self.cancelled = False
+
+    async def stream(self):
+        self.calls += 1
+        try:
+            while (token := await self.queue.get()) is not None:
+                if isinstance(token, Exception):
+                    raise token
+                yield token
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+async def read(subscription):
+    return [token async for token in subscription]
+
+
+def test_late_joiner_gets_the_tokens_so_far_then_the_live_stream():
+    async def run():
+        flights, source = SingleFlight(), Source()
+        first = flights.join("key", source.stream)
+        source.queue.put_nowait("a")
+        source.queue.put_nowait("b")
+        assert [await anext(first), await anext(first)] == ["a", "b"]
+
+        late = flights.join("key", source.stream)
+        source.queue.put_nowait("c")
+        source.queue.put_nowait(None)
+        return source, flights, await read(first), await read(late)
+
+    source, flights, first, late = asyncio.run(run())
+
+    assert first == ["c"]
+    assert late == ["a", "b", "c"]
+    assert source.calls == 1
+    assert flights.counts["joined"] == 1
+    assert len(flights) == 0
+
+
+def test_last_subscriber_leaving_cancels_the_generation():
+    async def run():
+        flights, source = SingleFlight(), Source()
+        first = flights.join("key", source.stream)
+        second = flights.join("key", source.stream)
+        source.queue.put_nowait("a")
+        await anext(first)
+
+        await first.aclose()
+        await asyncio.sleep(0)
+        still_running = not source.cancelled
+        await second.aclose()
+        await asyncio.sleep(0.01)
+        return source, flights, still_running
+
+    source, flights, still_running = asyncio.run(run())
+
+    assert still_running
+    assert source.cancelled
+    assert flights.counts["abandoned"] == 1
+    assert len(flights) == 0
+
+
+def test_joining_an_abandoned_generation_starts_a_new_one():
+    async def run():
+        flights, source = SingleFlight(), Source()
+        await flights.join("key", source.stream).aclose()
+        flights.join("key", source.stream)
+        return flights
+
+    assert asyncio.run(run()).counts["started"] == 2
+
+
+def test_upstream_error_reaches_every_subscriber():
+    async def run():
+        flights, source = SingleFlight(), Source()
+        subscriptions = [flights.join("key", source.stream) for _ in range(3)]
+        source.queue.put_nowait("a")
+        source.queue.put_nowait(RuntimeError("upstream down"))
+        return await asyncio.gather(*(read(s) for s in subscriptions))
+
+    results = asyncio.run(run())
+
+    for tokens in results:
+        assert tokens[0] == "a"
+        assert tokens[1] == f"{StreamMarkers.STREAM_ERROR} upstream down"
+        assert len(tokens) == 2
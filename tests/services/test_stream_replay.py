@@ -0,0 +1,149 @@
+import asyncio
+
+import pytest
+
+from app.schemas.stream import StreamEvent
+from app.services.stream_replay import ResumeError, StreamReplayRegistry
+
+
+class Generation:
+    """Emits a code chunk for each string put on ``queue``; None ends it"""
+
+    def __init__(self, *chunks, end=True):
+        self.queue = asyncio.Queue()
+        for chunk in chunks:
+            self.queue.put_nowait(chunk)
+        if end:
+            self.queue.put_nowait(None)
+        self.cancelled = False
+
+    async def events(self):
+        try:
+            while (chunk := await self.queue.get()) is not None:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield StreamEvent(type="code_chunk", data=chunk, message_id=1)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+async def finished(registry, generation):
+    stream = registry.start(1, generation.events())
+    await stream._task
+    return stream
+
+
+async def read(frames):
+    return [frame async for frame in frames]
+
+
+def test_resume_continues_after_the_last_event_id():
+    async def run():
+        registry = StreamReplayRegistry()
+        await finished(registry, Generation("a", "b", "c"))
+        stream = registry.attach(1, last_event_id=1)
+        return registry, await read(registry.subscribe(stream, 1))
+
+    registry, frames = asyncio.run(run())
+
+    assert [frame.split(b"\n")[0] for frame in frames] == [b"id: 2", b"id: 3"]
+    assert b'"data":"b"' in frames[0].replace(b" ", b"")
+    assert registry.counts["resumed"] == 1
+
+
+def test_resuming_an_unknown_stream_raises():
+    with pytest.raises(ResumeError):
+        StreamReplayRegistry().attach(1, last_event_id=3)
+
+
+def test_resuming_an_expired_stream_raises():
+    async def run():
+        registry = StreamReplayRegistry(ttl_seconds=-1)
+        await finished(registry, Generation("a"))
+        registry.attach(1, last_event_id=1)
+
+    with pytest.raises(ResumeError):
+        asyncio.run(run())
+
+
+def test_resuming_after_trimmed_frames_raises():
+    async def run():
+        registry = StreamReplayRegistry(max_stream_bytes=1)
+        await finished(registry, Generation("a", "b", "c"))
+        assert registry.attach(1, last_event_id=3) is not None
+        registry.attach(1, last_event_id=1)
+
+    with pytest.raises(ResumeError):
+        asyncio.run(run())
+
+
+def test_failed_stream_is_generated_anew():
+    async def run():
+        registry = StreamReplayRegistry()
+        stream = await finished(registry, Generation("a", RuntimeError("down")))
+        return stream, registry.attach(1)
+
+    stream, attached = asyncio.run(run())
+
+    assert stream.failed
+    assert attached is None
+
+
+def test_without_last_event_id_only_a_running_generation_is_attached():
+    async def run():
+        registry = StreamReplayRegistry()
+        generation = Generation("a", end=False)
+        stream = registry.start(1, generation.events())
+        running = registry.attach(1)
+        generation.queue.put_nowait(None)
+        await stream._task
+        return stream, running, registry.attach(1)
+
+    stream, running, after_the_end = asyncio.run(run())
+
+    assert running is stream
+    assert after_the_end is None
+
+
+def test_unattended_generation_is_cancelled_after_the_grace_period():
+    async def run():
+        registry = StreamReplayRegistry(grace_seconds=0.05)
+        generation = Generation("a", end=False)
+        stream = registry.start(1, generation.events())
+        frames = registry.subscribe(stream)
+        await anext(frames)
+        await frames.aclose()
+
+        await asyncio.sleep(0.01)
+        within_grace = generation.cancelled
+        await asyncio.sleep(0.1)
+        return within_grace, generation.cancelled, stream.done
+
+    within_grace, cancelled, done = asyncio.run(run())
+
+    assert not within_grace
+    assert cancelled
+    assert done
+
+
+def test_resubscribing_within_the_grace_period_keeps_the_generation():
+    async def run():
+        registry = StreamReplayRegistry(grace_seconds=0.05)
+        generation = Generation("a", end=False)
+        stream = registry.start(1, generation.events())
+        frames = registry.subscribe(stream)
+        await anext(frames)
+        await frames.aclose()
+
+        resumed = registry.subscribe(registry.attach(1, last_event_id=1), 1)
+        reading = asyncio.create_task(read(resumed))
+        await asyncio.sleep(0.1)
+        generation.queue.put_nowait("b")
+        generation.queue.put_nowait(None)
+        return generation, await reading
+
+    generation, frames = asyncio.run(run())
+
+    assert not generation.cancelled
+    assert [frame.split(b"\n")[0] for frame in frames] == [b"id: 2"]
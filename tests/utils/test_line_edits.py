@@ -0,0 +1,66 @@
+import pytest
+
+from app.utils.line_edits import (
+    LineEdit,
+    LineEditError,
+    apply_line_edits,
+    has_line_edits,
+    number_lines,
+    parse_line_edits,
+)
+
+SCRIPT = "a\nb\nc\nd\n"
+
+
+def test_number_lines_right_aligns_numbers():
+    script = "\n".join(str(i) for i in range(10))
+
+    lines = number_lines(script).splitlines()
+
+    assert lines[0] == " 1 | 0"
+    assert lines[9] == "10 | 9"
+
+
+def test_has_line_edits():
+    assert has_line_edits("@@ 2,3\nx")
+    assert not has_line_edits("from manim import *\n")
+
+
+def test_parse_blocks_ignoring_preamble_fences_and_trailing_blanks():
+    reply = "Here you go:\n```\n@@ 2,2\n  x\n\n@@ 4,3\ny\n```\n"
+
+    assert parse_line_edits(reply) == [LineEdit(2, 2, ["  x"]), LineEdit(4, 3, ["y"])]
+
+
+def test_parse_without_blocks_raises():
+    with pytest.raises(LineEditError):
+        parse_line_edits("from manim import *")
+
+
+def test_replace_insert_and_delete_against_original_numbers():
+    edits = [
+        LineEdit(1, 1, ["A1", "A2"]),
+        LineEdit(3, 2, ["before c"]),
+        LineEdit(4, 4, []),
+    ]
+
+    assert apply_line_edits(SCRIPT, edits) == "A1\nA2\nb\nbefore c\nc\n"
+
+
+def test_insert_after_the_last_line():
+    assert apply_line_edits(SCRIPT, [LineEdit(5, 4, ["e"])]) == "a\nb\nc\nd\ne\n"
+
+
+@pytest.mark.parametrize(
+    "edits",
+    [
+        [LineEdit(6, 6, ["x"])],
+        [LineEdit(0, 1, ["x"])],
+        [LineEdit(3, 1, ["x"])],
+        [LineEdit(2, 9, ["x"])],
+        [LineEdit(1, 2, ["x"]), LineEdit(2, 3, ["y"])],
+    ],
+)
+def test_edits_that_do_not_fit_raise(edits):
+    with pytest.raises(LineEditError):
+        apply_line_edits(SCRIPT, edits)
@@ -0,0 +1,135 @@
+import asyncio
+
+from app.schemas.stream import StreamEvent
+from app.utils.disconnect import until_disconnected
+from app.utils.sse import coalesce_code_chunks, encode_frame
+
+
+def chunk(data):
+    return StreamEvent(type="code_chunk", data=data, message_id=1)
+
+
+async def timed(events, delays):
+    """``events``, each after the matching delay in seconds"""
+    for event, delay in zip(events, delays):
+        await asyncio.sleep(delay)
+        yield event
+
+
+def coalesced(events, delays, window_seconds=0.05, max_bytes=1000):
+    async def run():
+        merged = coalesce_code_chunks(timed(events, delays), window_seconds, max_bytes)
+        return [(e.type, e.data) async for e in merged]
+
+    return asyncio.run(run())
+
+
+def test_chunks_within_the_window_are_merged():
+    events = [chunk("a"), chunk("b"), chunk("c")]
+
+    assert coalesced(events, [0, 0, 0]) == [("code_chunk", "abc")]
+
+
+def test_window_flushes_buffered_chunks():
+    events = [chunk("a"), chunk("b"), chunk("c")]
+
+    merged = coalesced(events, [0, 0, 0.15])
+
+    assert merged == [("code_chunk", "ab"), ("code_chunk", "c")]
+
+
+def test_byte_cap_flushes_before_the_window_ends():
+    events = [chunk("aa"), chunk("bb"), chunk("c")]
+
+    merged = coalesced(events, [0, 0, 0.01], window_seconds=10, max_bytes=4)
+
+    assert merged == [("code_chunk", "aabb"), ("code_chunk", "c")]
+
+
+def test_other_events_flush_at_once_in_order():
+    events = [
+        chunk("a"),
+        StreamEvent(type="error", data="boom", message_id=1),
+        chunk("b"),
+        StreamEvent(type="completed", message_id=1),
+    ]
+
+    async def run():
+        merged = coalesce_code_chunks(timed(events, [0] * 4), 10, 1000)
+        start = asyncio.get_running_loop().time()
+        out = [(e.type, e.data) async for e in merged]
+        return out, asyncio.get_running_loop().time() - start
+
+    merged, elapsed = asyncio.run(run())
+
+    assert merged == [
+        ("code_chunk", "a"),
+        ("error", "boom"),
+        ("code_chunk", "b"),
+        ("completed", None),
+    ]
+    assert elapsed < 1
+
+
+def test_zero_window_passes_events_through():
+    events = [chunk("a"), chunk("b")]
+
+    assert coalesced(events, [0, 0], window_seconds=0) == [
+        ("code_chunk", "a"),
+        ("code_chunk", "b"),
+    ]
+
+
+def test_encode_frame_with_an_event_id():
+    frame = encode_frame("code_chunk", "x", 1, event_id=7)
+
+    assert frame.startswith(b"id: 7\ndata: ")
+    assert frame.endswith(b"\n\n")
+
+
+class FakeRequest:
+    def __init__(self):
+        self.disconnected = asyncio.Event()
+
+    async def receive(self):
+        await self.disconnected.wait()
+        return {"type": "http.disconnect"}
+
+
+def test_disconnect_cancels_the_upstream_generator():
+    state = {"cancelled": False, "closed": False}
+
+    async def upstream():
+        try:
+            yield "first"
+            await asyncio.sleep(10)
+            yield "never"
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+        finally:
+            state["closed"] = True
+
+    async def run():
+        request = FakeRequest()
+        received = []
+        async for item in until_disconnected(request, upstream()):
+            received.append(item)
+            request.disconnected.set()
+        return received
+
+    received = asyncio.run(run())
+
+    assert received == ["first"]
+    assert state == {"cancelled": True, "closed": True}
+
+
+def test_upstream_that_ends_is_passed_through():
+    async def upstream():
+        yield 1
+        yield 2
+
+    async def run():
+        return [item async for item in until_disconnected(FakeRequest(), upstream())]
+
+    assert asyncio.run(run()) == [1, 2]